@@ -0,0 +1,51 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# what_if() (oci_policy_conditions.py) against parsing and evaluating each statement's condition on its own.
+# The synthetic store from policy_store_benchmark.py has tag conditions on about 30% of its statements; a batch
+# of contexts each sets that tag to a different value.  Both ways are checked to select the same statements.
+# No OCI access needed.
+#
+#   python3 benchmarks/policy_conditions_benchmark.py --statements 200000 --contexts 200
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from oci_policy_conditions import Condition, compile_condition, context_of, what_if
+from oci_policy_store import StatementStore
+from policy_store_benchmark import synthetic_statements
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--statements", type=int, default=200000)
+    parser.add_argument("--contexts", type=int, default=200)
+    args = parser.parse_args()
+
+    store = StatementStore(rows=synthetic_statements(args.statements))
+    contexts = [{"target.tag.ns.key": str(n * 7)} for n in range(args.contexts)]
+    conditional = [statement for statement in store if statement.condition]
+    print(f"{len(store)} statements, {len(conditional)} with conditions, {len({s.condition for s in conditional})} distinct")
+
+    tic = time.perf_counter()
+    compiled = what_if(store, contexts)
+    compiled_seconds = time.perf_counter() - tic
+    print(f"what_if:            {compiled_seconds:8.2f}s ({compile_condition.cache_info().currsize} conditions compiled)")
+
+    # Each statement parsed on its own, every statement evaluated for every context
+    tic = time.perf_counter()
+    parsed = [(Condition(statement.condition), statement) for statement in conditional]
+    plain = [[statement for condition, statement in parsed if condition(context_of(context))] for context in contexts]
+    plain_seconds = time.perf_counter() - tic
+    print(f"per statement:      {plain_seconds:8.2f}s")
+
+    same = [list(map(id, result)) for result in compiled] == [list(map(id, result)) for result in plain]
+    print(f"{sum(map(len, compiled))} statements selected over {len(contexts)} contexts, same: {same}")
@@ -0,0 +1,217 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Side-by-side benchmark of the thread engine and the asyncio crawler (oci_policy_crawler.py) - needs the OCI SDK.
+# A fake Identity endpoint runs locally, injecting latency (and optionally 429s with Retry-After) so
+# the numbers reflect waiting on the network rather than the speed of the fake.  No OCI access needed.
+#
+#   python3 benchmarks/policy_crawler_benchmark.py --compartments 3000 --latency 0.05 --threads 8 --concurrency 200
+
+import argparse
+import asyncio
+import datetime
+import http.client
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from oci_compartment_tree import CompartmentTree
+from oci_policy_crawler import AsyncIdentityCrawler
+
+PAGE_SIZE = 1000
+
+
+def to_model(data: dict) -> SimpleNamespace:
+    """Identity JSON (camelCase) to an object with the SDK's snake_case attribute names"""
+
+    attributes = {}
+    for key, value in data.items():
+        name = re.sub(r'(?<!^)(?=[A-Z])', '_', key).lower()
+        if name.startswith("time_") and isinstance(value, str):
+            value = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        attributes[name] = value
+    return SimpleNamespace(**attributes)
+
+
+class NoSigner:
+    """The fake endpoint doesn't check signatures"""
+
+    def __call__(self, request, enforce_content_headers=True):
+        return request
+
+########################################
+# Fake Identity endpoint
+########################################
+
+
+class FakeIdentity:
+    """Synthetic tenancy served over HTTP/1.1 keep-alive with injected latency and throttling"""
+
+    def __init__(self, compartments: int, policy_ratio: float, latency: float, throttle: float, seed: int = 7):
+        rnd = random.Random(seed)
+        self.latency = latency
+        self.throttle = throttle
+        self.rnd = rnd
+        self.requests = 0
+        self.tenancy = "ocid1.tenancy.oc1..bench"
+        self.compartments = [{"id": self.tenancy, "name": "bench", "compartmentId": None, "lifecycleState": "ACTIVE",
+                              "timeCreated": "2020-01-01T00:00:00.000Z"}]
+        for i in range(compartments):
+            parent = rnd.choice(self.compartments[-200:])
+            self.compartments.append({"id": f"ocid1.compartment.oc1..c{i:06d}", "name": f"comp-{i}",
+                                      "compartmentId": parent["id"], "lifecycleState": "ACTIVE",
+                                      "timeCreated": "2020-01-01T00:00:00.000Z"})
+        self.by_id = {c["id"]: c for c in self.compartments}
+        self.policies = {}
+        for c in self.compartments:
+            if c["id"] == self.tenancy or rnd.random() < policy_ratio:
+                self.policies[c["id"]] = [{"id": f"ocid1.policy.oc1..{c['id'][-7:]}-{n}", "name": f"{c['name']}-policy-{n}",
+                                           "compartmentId": c["id"], "lifecycleState": "ACTIVE",
+                                           "timeCreated": "2021-06-01T12:00:00.000Z",
+                                           "statements": [f"Allow group team-{rnd.randint(1, 50)} to {rnd.choice(['inspect', 'read', 'use', 'manage'])} "
+                                                          f"{rnd.choice(['instance-family', 'buckets', 'vaults', 'all-resources'])} in compartment {c['name']}"
+                                                          for _ in range(rnd.randint(1, 8))]}
+                                          for n in range(rnd.randint(1, 3))]
+
+    def route(self, target: str):
+        """(status, headers, body) for a request target"""
+
+        url = urlsplit(target)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path.replace("/20160918", "", 1)
+        offset = int(query.get("page", 0))
+        if path.startswith("/compartments/"):
+            compartment = self.by_id.get(path.rsplit("/", 1)[1])
+            return (200, {}, compartment) if compartment else (404, {}, {"code": "NotAuthorizedOrNotFound"})
+        if path == "/compartments":
+            items = self.compartments[1:]
+        elif path == "/policies":
+            items = self.policies.get(query.get("compartmentId"), [])
+        else:
+            return 404, {}, {"code": "NotFound"}
+        page = items[offset:offset + PAGE_SIZE]
+        headers = {"opc-next-page": str(offset + PAGE_SIZE)} if offset + PAGE_SIZE < len(items) else {}
+        return 200, headers, page
+
+    async def handle(self, reader, writer):
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            self.requests += 1
+            await asyncio.sleep(self.latency)
+            if self.throttle and self.rnd.random() < self.throttle:
+                status, headers, payload = 429, {"retry-after": "0.05"}, {"code": "TooManyRequests"}
+            else:
+                status, headers, payload = self.route(request_line.split()[1].decode())
+            body = json.dumps(payload).encode()
+            head = [f"HTTP/1.1 {status} X", f"content-length: {len(body)}", "content-type: application/json"]
+            head += [f"{k}: {v}" for k, v in headers.items()]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+            await writer.drain()
+        writer.close()
+
+    def start(self) -> int:
+        """Serve on a background event loop, return the port"""
+
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        async def serve():
+            self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0, backlog=1024)
+            started.set()
+            await self.server.serve_forever()
+
+        threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True).start()
+        started.wait()
+        return self.server.sockets[0].getsockname()[1]
+
+########################################
+# Thread engine (as the SDK loaders work today - one blocking call per thread)
+########################################
+
+
+def thread_engine(port: int, tenancy: str, threads: int):
+    local = threading.local()
+
+    def get(resource, params=None):
+        if not hasattr(local, "conn"):
+            local.conn = http.client.HTTPConnection("127.0.0.1", port)
+        target = f"/20160918{resource}" + (f"?{urlencode(params)}" if params else "")
+        while True:
+            local.conn.request("GET", target)
+            response = local.conn.getresponse()
+            body = response.read()
+            if response.status == 429:
+                time.sleep(float(response.getheader("retry-after", "0.1")))
+                continue
+            return json.loads(body), response.getheader("opc-next-page")
+
+    def get_all(resource, params):
+        items, page = [], None
+        while True:
+            data, page = get(resource, dict(params, **({"page": page} if page else {})))
+            items.extend(to_model(d) for d in data)
+            if not page:
+                return items
+
+    root = to_model(get(f"/compartments/{tenancy}")[0])
+    compartments = [root] + get_all("/compartments", {"compartmentId": tenancy, "compartmentIdInSubtree": "true", "limit": 1000})
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = executor.map(lambda c: get_all("/policies", {"compartmentId": c.id, "limit": 1000}), compartments)
+    return compartments, {c.id: r for c, r in zip(compartments, results)}
+
+
+def statement_list(compartments, policies_by_compartment) -> list:
+    """Sorted (hierarchy, policy, statement) - what both engines must agree on"""
+
+    tree = CompartmentTree(compartments)
+    return sorted((tree.path(cid), p.name, st) for cid, policies in policies_by_compartment.items()
+                  for p in policies for st in p.statements)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--compartments", type=int, default=3000)
+    parser.add_argument("--policy-ratio", type=float, default=0.2, help="Fraction of compartments holding policies")
+    parser.add_argument("--latency", type=float, default=0.05, help="Injected seconds per request")
+    parser.add_argument("--throttle", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    fake = FakeIdentity(args.compartments, args.policy_ratio, args.latency, args.throttle)
+    port = fake.start()
+    print(f"Fake Identity on :{port} - {len(fake.compartments)} compartments, latency {args.latency * 1000:.0f}ms, throttle {args.throttle:.0%}")
+
+    tic = time.perf_counter()
+    thread_result = statement_list(*thread_engine(port, fake.tenancy, args.threads))
+    thread_time = time.perf_counter() - tic
+
+    from oci.identity import IdentityClient
+    client = IdentityClient({"region": "us-ashburn-1"}, signer=NoSigner(), service_endpoint=f"http://127.0.0.1:{port}")
+    crawler = AsyncIdentityCrawler(client, concurrency=args.concurrency)
+    tic = time.perf_counter()
+    async_result = statement_list(*crawler.run(fake.tenancy))
+    async_time = time.perf_counter() - tic
+
+    print(f"{'engine':<28}{'seconds':>10}{'statements':>12}")
+    print(f"{f'thread ({args.threads} threads)':<28}{thread_time:>10.2f}{len(thread_result):>12}")
+    print(f"{f'async ({args.concurrency} in flight)':<28}{async_time:>10.2f}{len(async_result):>12}")
+    print(f"Speed-up: {thread_time / async_time:.1f}x, async retries: {crawler.retries}, identical statements: {thread_result == async_result}")
+    sys.exit(0 if thread_result == async_result else 1)
@@ -0,0 +1,72 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# SQLite backend (oci_policy_database.py) against the in-memory store and compiled filter.
+# Stores several synthetic tenancies as snapshots, then runs the filter benchmark queries on one snapshot
+# (checked to return the same statements as the in-memory filter) and across all of them.
+# Peak Python memory of a query is reported for both.  No OCI access needed.
+#
+#   python3 benchmarks/policy_database_benchmark.py --statements 200000 --tenancies 5
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from oci_policy_database import DatabaseStore, StatementDatabase
+from oci_policy_query import StatementQuery
+from oci_policy_store import StatementStore
+from policy_filter_benchmark import FILTER_NAMES, QUERIES
+from policy_store_benchmark import synthetic_statements
+
+
+def measured(run):
+    """(result, seconds, peak MB) of run() - timed without tracemalloc, which slows it down, then traced"""
+
+    tic = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - tic
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--statements", type=int, default=200000)
+    parser.add_argument("--tenancies", type=int, default=5)
+    args = parser.parse_args()
+
+    store = StatementStore(rows=synthetic_statements(args.statements))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "statements.db")
+        database = StatementDatabase(path)
+        tic = time.perf_counter()
+        for n in range(args.tenancies):
+            snapshot_id = database.add_snapshot(f"tenancy-{n}", store, loaded="synthetic")
+        print(f"Stored {args.tenancies} x {len(store)} statements in {time.perf_counter() - tic:.2f}s, "
+              f"database {os.path.getsize(path) / 1e6:.1f} MB")
+        snapshot = DatabaseStore(database, snapshot_id)
+
+        print(f"{'query':20} {'matches':>8} {'memory s':>9} {'SQL s':>8} {'memory MB':>10} {'SQL MB':>7} {'all tenancies s':>16}  same")
+        for label, filters in QUERIES.items():
+            query = StatementQuery(**dict(zip(FILTER_NAMES, filters)))
+            query.run(store)
+            expected, memory_seconds, memory_peak = measured(lambda: query.run(store))
+            actual, sql_seconds, sql_peak = measured(lambda: snapshot.filter(query))
+            _, all_seconds, _ = measured(lambda: sum(1 for _ in database.filter(query, database.latest_snapshots())))
+            same = [s.to_list() for s in actual] == [s.to_list() for s in expected]
+            print(f"{label:20} {len(actual):>8} {memory_seconds:>9.4f} {sql_seconds:>8.4f} {memory_peak:>10.1f} {sql_peak:>7.1f} "
+                  f"{all_seconds:>16.4f}  {same}")
+        database.close()
@@ -0,0 +1,102 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Combined query filter (oci_policy_query.py) against the eight-pass filter it replaced in
+# PolicyAnalysis.filter_policy_statements.  Both run over the synthetic store from policy_store_benchmark.py;
+# results are checked to be the same statements (the old filter could repeat a statement matching two
+# alternatives, the new one returns it once, in store order).  The same queries then run through the trigram
+# index (oci_policy_index.py), which is also saved and loaded back to time persistence.  No OCI access needed.
+#
+#   python3 benchmarks/policy_filter_benchmark.py --statements 500000 --repeat 5
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from oci_policy_index import TrigramIndex
+from oci_policy_query import FILTER_COLUMNS, StatementQuery
+from oci_policy_store import StatementStore
+from policy_store_benchmark import synthetic_statements
+
+# subject, verb, resource, location, hierarchy, condition, text, policy
+QUERIES = {
+    "no filters": ("", "", "", "", "", "", "", ""),
+    "one subject": ("group-12", "", "", "", "", "", "", ""),
+    "verb alternatives": ("", "manage|use", "", "", "", "", "", ""),
+    "tenancy location": ("", "", "", "tenancy|c1", "", "", "", ""),
+    "combined": ("group-1", "manage|use", "resource-1", "", "team1", "", "", "policy-1"),
+    "condition and text": ("", "", "", "", "", "ns.key", "domain2", ""),
+    "rare text": ("", "", "", "", "", "", "key = '4242'", ""),
+    "short needles": ("p-1", "", "", "", "", "", "", ""),
+}
+FILTER_NAMES = ("subject", "verb", "resource", "location", "hierarchy", "condition", "text", "policy")
+
+
+def eight_pass(statements, *filters) -> list:
+    """The original filter - one pass per filter and per '|' alternative"""
+
+    fields = ((lambda s: s[7][1]), (lambda s: s[8]), (lambda s: s[9]), None, (lambda s: s[3]), (lambda s: s[13]),
+              (lambda s: s[4]), (lambda s: s[0]))
+    current = statements
+    for position, value in enumerate(filters):
+        filtered = []
+        for filt in value.split(sep='|'):
+            if position == 3:
+                field = (lambda s: s[11]) if "tenancy" == filt else (lambda s: s[12])
+            else:
+                field = fields[position]
+            filtered.extend(list(filter(lambda statement: filt.casefold() in field(statement).casefold(), current)))
+        current = filtered
+    return current
+
+
+def timed(run, repeat: int):
+    result = run()
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        run()
+    return result, (time.perf_counter() - tic) / repeat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--statements", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    store = StatementStore(rows=synthetic_statements(args.statements))
+    tic = time.perf_counter()
+    StatementQuery(subject="x", verb="x", resource="x", location="tenancy|x", hierarchy="x", condition="x", text="x",
+                   policy="x").run(store)
+    print(f"{len(store)} statements, folded columns built in {time.perf_counter() - tic:.3f}s")
+
+    tic = time.perf_counter()
+    index = TrigramIndex.build(store, FILTER_COLUMNS.values())
+    print(f"Trigram index built in {time.perf_counter() - tic:.2f}s")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "index.dat")
+        tic = time.perf_counter()
+        index.save(path)
+        save_seconds = time.perf_counter() - tic
+        tic = time.perf_counter()
+        index = TrigramIndex.load_or_build(path, store, FILTER_COLUMNS.values())
+        print(f"Index saved in {save_seconds:.2f}s ({os.path.getsize(path) / 1e6:.1f} MB), loaded in {time.perf_counter() - tic:.2f}s")
+
+    print(f"{'query':20} {'matches':>8} {'8-pass s':>9} {'query s':>11} {'indexed s':>10}  same")
+    for label, filters in QUERIES.items():
+        expected, old_seconds = timed(lambda: eight_pass(store.records, *filters), args.repeat)
+        query = StatementQuery(**dict(zip(FILTER_NAMES, filters)))
+        actual, new_seconds = timed(lambda: query.run(store), args.repeat)
+        indexed, index_seconds = timed(lambda: query.run(store, index), args.repeat)
+        matched = set(map(id, expected))
+        same = [id(s) for s in actual] == [id(s) for s in store.records if id(s) in matched] and indexed == actual
+        print(f"{label:20} {len(actual):>8} {old_seconds:>9.4f} {new_seconds:>11.4f} {index_seconds:>10.4f}  {same}")
@@ -0,0 +1,65 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# StatementParser.parse_bulk (oci_policy_parser.py) on 1 to N worker processes.
+# The corpus is built from the statements of policy_parser_benchmark.py with numbered group and compartment
+# names, so about --distinct of it are texts seen once (a large tenancy's policies are mostly unique).
+# Each run uses a fresh parser (cold cache) and its results are checked against an in-process parse.
+# No OCI access needed.
+#
+#   python3 benchmarks/policy_parse_scaling_benchmark.py --statements 1000000 --workers 1 2 4 8
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from oci_policy_parser import StatementParser
+from policy_parser_benchmark import corpus
+
+
+def scaling_corpus(count: int, distinct: float, seed: int = 5) -> list:
+    """count statements - a share of them made unique by numbering their names"""
+
+    rnd = random.Random(seed)
+    base = corpus(min(count, 20000))
+    statements = []
+    for n in range(count):
+        statement = rnd.choice(base)
+        if rnd.random() < distinct:
+            statement = statement.replace("group ", f"group g{n}-", 1).replace("compartment ", f"compartment c{n}:", 1)
+        statements.append(statement)
+    return statements
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--statements", type=int, default=1000000)
+    parser.add_argument("--distinct", type=float, default=0.9, help="share of statements that are unique texts")
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="process counts to time (def 1 to cpu count, doubling)")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    # 1 (in-process) always runs first - it is the baseline and the reference results
+    workers = sorted({1, *(args.workers or [2 ** n for n in range(1, 8) if 2 ** n <= cpus] + [cpus])})
+    statements = scaling_corpus(args.statements, args.distinct)
+    print(f"{len(statements)} statements, {len(set(statements))} distinct, {cpus} CPUs")
+
+    reference = None
+    baseline = None
+    for count in workers:
+        tic = time.perf_counter()
+        results = StatementParser().parse_bulk(statements, workers=count)
+        seconds = time.perf_counter() - tic
+        if reference is None:
+            reference, baseline = results, seconds
+        same = results == reference
+        print(f"{count:3} workers: {seconds:8.2f}s  speedup {baseline / seconds:5.2f}x  same: {same}")
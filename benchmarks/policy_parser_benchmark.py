@@ -0,0 +1,133 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# POLICY_REGEX vs the linear-time statement parser (oci_policy_parser.py).
+# Part 1 parses a corpus of realistic statements with both and checks every named group is identical, then
+# runs it through the shared StatementParser, whose cache parses each distinct text once.
+# Part 2 grows pathological statements (long whitespace runs, runaway subjects) and times both - the regex
+# runs in a child process so a catastrophic case can be cut off at --timeout.  No OCI access needed.
+#
+#   python3 benchmarks/policy_parser_benchmark.py --statements 50000 --timeout 10
+
+import argparse
+import multiprocessing
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from oci_policy_parser import GROUPS, POLICY_REGEX, StatementParser, match_statement
+
+POLICY_PATTERN = re.compile(POLICY_REGEX, re.IGNORECASE | re.MULTILINE)
+
+########################################
+# Corpus
+########################################
+
+SUBJECTS = ["group admins", "group 'default'/'net-admins'", "group domain1/ops, domain1/dba", "dynamic-group fn-dg",
+            "dynamic-group 'default'/'oke-nodes'", "any-user", "any-group", "service objectstorage-us-ashburn-1",
+            "service blockstorage, objectstorage-eu-frankfurt-1", "resource workload oke-cluster"]
+PERMISSIONS = ["manage all-resources", "read buckets", "use virtual-network-family", "inspect compartments",
+               "manage object-family", "{INSTANCE_READ, VNIC_ATTACH}", "{BUCKET_READ}", "read secret-bundles"]
+LOCATIONS = ["tenancy", "compartment apps", "compartment apps:dev:web", "compartment id ocid1.compartment.oc1..aaaaaaaaxyz",
+             "any-tenancy"]
+CONDITIONS = ["", " where target.bucket.name = 'logs'", " where any {request.permission = 'VCN_READ', request.user.id = 'x'}",
+              " where request.principal.type = 'workload' // added by ops", " // temporary"]
+
+
+def corpus(count: int, seed: int = 11) -> list:
+    rnd = random.Random(seed)
+    statements = []
+    for _ in range(count):
+        statements.append(f"allow {rnd.choice(SUBJECTS)} to {rnd.choice(PERMISSIONS)} in {rnd.choice(LOCATIONS)}{rnd.choice(CONDITIONS)}".casefold())
+    # Some that don't match at all
+    statements.extend(["define tenancy other as ocid1.tenancy.oc1..aaa", "admit group x of tenancy other to read buckets in tenancy",
+                       "allow group to in tenancy", "endorse group a to manage b in any-tenancy"])
+    return statements
+
+
+PATHOLOGICAL = {
+    "whitespace after subject type": lambda n: "allow group" + " " * n + "(",
+    "whitespace after subject": lambda n: "allow group a" + " " * n + "(",
+    "whitespace after location": lambda n: "allow group a to manage x in tenancy" + " " * n + "(",
+    "long subject list": lambda n: "allow group " + ", ".join(f"d/g{i}" for i in range(n)) + " to manage x in tenancy",
+    "repeated clauses": lambda n: "allow group a " + "to read x in tenancy " * n + "(",
+}
+
+########################################
+# Timing
+########################################
+
+
+def regex_groups(statement: str):
+    result = POLICY_PATTERN.search(statement)
+    return {g: result.group(g) for g in GROUPS} if result else None
+
+
+def _regex_child(statement: str, conn):
+    tic = time.perf_counter()
+    groups = regex_groups(statement)
+    conn.send((time.perf_counter() - tic, groups))
+
+
+def time_regex(statement: str, timeout: float):
+    """(seconds, groups) for the regex, or (None, None) if it didn't finish within timeout"""
+
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_regex_child, args=(statement, child))
+    process.start()
+    if parent.poll(timeout):
+        result = parent.recv()
+    else:
+        result = (None, None)
+        process.terminate()
+    process.join()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--statements", type=int, default=50000)
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds before a regex case is abandoned")
+    parser.add_argument("--sizes", default="10,100,1000,4000", help="Comma-separated pathological sizes")
+    args = parser.parse_args()
+
+    # Part 1 - realistic corpus
+    statements = corpus(args.statements)
+    tic = time.perf_counter()
+    expected = [regex_groups(s) for s in statements]
+    regex_time = time.perf_counter() - tic
+    tic = time.perf_counter()
+    actual = [match_statement(s) for s in statements]
+    lexer_time = time.perf_counter() - tic
+    mismatches = sum(1 for e, a in zip(expected, actual) if e != a)
+    print(f"Corpus of {len(statements)} statements: regex {regex_time:.3f}s, lexer {lexer_time:.3f}s, {mismatches} mismatches")
+    statement_parser = StatementParser()
+    tic = time.perf_counter()
+    for s in statements:
+        statement_parser.parse(s)
+    print(f"Through the parse cache: {time.perf_counter() - tic:.3f}s, {statement_parser.cache_info()}")
+
+    # Part 2 - pathological statements
+    print(f"{'case':32} {'size':>6} {'length':>7} {'regex s':>10} {'lexer s':>10}  same")
+    for name, build in PATHOLOGICAL.items():
+        abandoned = False
+        for size in (int(s) for s in args.sizes.split(",")):
+            statement = build(size)
+            tic = time.perf_counter()
+            groups = match_statement(statement)
+            lexer_seconds = time.perf_counter() - tic
+
+            # Once the regex has blown the timeout, bigger inputs will too
+            seconds, expected_groups = (None, None) if abandoned else time_regex(statement, args.timeout)
+            abandoned = seconds is None
+            regex_column = f">{args.timeout:.0f}" if seconds is None else f"{seconds:.4f}"
+            same = "-" if seconds is None else str(groups == expected_groups)
+            print(f"{name:32} {size:>6} {len(statement):>7} {regex_column:>10} {lexer_seconds:>10.5f}  {same}")
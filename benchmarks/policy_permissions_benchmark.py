@@ -0,0 +1,74 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Permission engine (oci_policy_permissions.py) lookups against scanning every grant with the same rules.
+# Builds the engine over the synthetic store from policy_store_benchmark.py, then answers random
+# "can subject do verb on resource in compartment" and "who can" questions both ways and checks they agree.
+# No OCI access needed.
+#
+#   python3 benchmarks/policy_permissions_benchmark.py --statements 200000 --questions 500
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from oci_policy_permissions import VERB_RANK, VERBS, PermissionEngine, compartment_path
+from oci_policy_store import StatementStore
+from policy_store_benchmark import synthetic_statements
+
+
+def scan_can(engine, subject, verb, resource, compartment) -> list:
+    """The grants allowing it, by checking every grant"""
+
+    path = compartment_path(compartment)
+    subjects, resources = engine.subjects_for(subject), engine.resources_for(resource)
+    return [grant for grant in engine.grants if path.startswith(grant.scope) and grant.subject in subjects
+            and grant.resource in resources and grant.rank >= VERB_RANK[verb]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--statements", type=int, default=200000)
+    parser.add_argument("--questions", type=int, default=500)
+    args = parser.parse_args()
+
+    store = StatementStore(rows=synthetic_statements(args.statements))
+    tic = time.perf_counter()
+    engine = PermissionEngine.build(store)
+    print(f"{len(engine.grants)} grants, {len(engine.closures)} compartments, built in {time.perf_counter() - tic:.2f}s")
+
+    random.seed(1)
+    compartments = list(engine.closures)
+    subjects = list({grant.subject for grant in engine.grants})
+    resources = list({grant.resource for grant in engine.grants})
+    questions = [(random.choice(subjects), random.choice(VERBS), random.choice(resources), random.choice(compartments))
+                 for _ in range(args.questions)]
+
+    tic = time.perf_counter()
+    indexed = [engine.can(*question) for question in questions]
+    can_seconds = time.perf_counter() - tic
+    tic = time.perf_counter()
+    who = [engine.who_can(verb, resource, compartment) for _, verb, resource, compartment in questions]
+    who_seconds = time.perf_counter() - tic
+    tic = time.perf_counter()
+    scanned = [scan_can(engine, *question) for question in questions]
+    scan_seconds = time.perf_counter() - tic
+
+    same = indexed == scanned and all(
+        [grant for grant in who_grants.get(subject, []) if grant.subject == subject] ==
+        [grant for grant in scan if grant.subject == subject]
+        for (subject, *_), who_grants, scan in zip(questions, who, scanned))
+    n = len(questions)
+    print(f"can():     {can_seconds / n * 1e6:10.1f} us per question ({sum(map(bool, indexed))} of {n} allowed)")
+    print(f"who_can(): {who_seconds / n * 1e6:10.1f} us per question")
+    print(f"scan:      {scan_seconds / n * 1e6:10.1f} us per question")
+    print(f"Same grants: {same}")
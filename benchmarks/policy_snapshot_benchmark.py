@@ -0,0 +1,68 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# JSON cache vs binary snapshot (oci_policy_snapshot.py) for the UI statement cache.
+# Times writing both, then a UI start from each: open the cache, run a filter and decode the rows it shows.
+# Checks the snapshot gives back exactly the statements that were written.  No OCI access needed.
+#
+#   python3 benchmarks/policy_snapshot_benchmark.py --statements 200000
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from oci_policy_query import FILTER_COLUMNS, StatementQuery
+from oci_policy_snapshot import dump_json, load_json, load_table, open_snapshot, write_snapshot
+from oci_policy_store import PolicyStatement, StatementStore
+from policy_store_benchmark import synthetic_statements
+
+
+def timed(label: str, run):
+    tic = time.perf_counter()
+    result = run()
+    print(f"{label:44} {time.perf_counter() - tic:8.3f}s")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--statements", type=int, default=200000)
+    args = parser.parse_args()
+
+    store = StatementStore(rows=synthetic_statements(args.statements))
+    query = StatementQuery(subject="group-1", verb="manage|use")
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "cache.dat")
+        snapshot_path = os.path.join(directory, "snapshot.dat")
+        timed("Write JSON cache", lambda: dump_json(json_path, store))
+        timed("Write snapshot", lambda: write_snapshot(snapshot_path, "tenancy", {"statement": (store, FILTER_COLUMNS.values())}))
+        print(f"Sizes: JSON {os.path.getsize(json_path) / 1e6:.1f} MB, snapshot {os.path.getsize(snapshot_path) / 1e6:.1f} MB")
+
+        # UI start from JSON - everything is parsed before the first filter
+        tic = time.perf_counter()
+        json_store = timed("JSON: load + store", lambda: StatementStore(rows=load_json(json_path)))
+        shown = timed("JSON: first filter", lambda: query.run(json_store))
+        timed("JSON: rows for the grid", lambda: [s.to_list() for s in shown])
+        print(f"{'JSON: total':44} {time.perf_counter() - tic:8.3f}s")
+
+        # UI start from the snapshot - only the filtered statements are decoded
+        tic = time.perf_counter()
+        snapshot_store = timed("Snapshot: open", lambda: load_table(open_snapshot(snapshot_path, "tenancy"), "statement", PolicyStatement))
+        shown = timed("Snapshot: first filter", lambda: query.run(snapshot_store))
+        rows = timed("Snapshot: rows for the grid", lambda: [s.to_list() for s in shown])
+        print(f"{'Snapshot: total':44} {time.perf_counter() - tic:8.3f}s")
+        decoded = sum(1 for record in snapshot_store.records.cache if record is not None)
+        print(f"Decoded {decoded} of {len(snapshot_store)} statements")
+
+        same = timed("Snapshot: decode everything", lambda: snapshot_store.to_lists()) == store.to_lists()
+        print(f"Snapshot round trip identical: {same}")
@@ -0,0 +1,94 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Memory of the statement store (oci_policy_store.py) against the plain list-of-lists it replaced.
+# A synthetic tenancy is written to JSON and loaded back the way the cache file is, so every string is a
+# fresh object (no accidental sharing), then held once as lists and once in a StatementStore.
+# Memory is measured with tracemalloc.  No OCI access needed.
+#
+#   python3 benchmarks/policy_store_benchmark.py --statements 200000
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from oci_policy_store import StatementStore
+
+VERBS = ["inspect", "read", "use", "manage"]
+SUBJECT_TYPES = ["group", "group", "group", "dynamic-group", "service", "any-user"]
+
+
+def synthetic_statements(count: int, statements_per_policy: int = 8, seed: int = 3) -> list:
+    """16-field statements with realistic cardinality - a few thousand compartments and groups,
+    a hundred resource types, ~8 statements per policy"""
+
+    rnd = random.Random(seed)
+    compartments = [f"ocid1.compartment.oc1..aaaaaaaa{rnd.getrandbits(200):050x}" for _ in range(3000)]
+    hierarchies = [f"apps/team{i % 60}/env{i % 5}/c{i}/" for i in range(3000)]
+    groups = [(f"domain{i % 4}", f"group-{i}") for i in range(400)]
+    resources = [f"resource-{i}-family" for i in range(100)]
+    rows = []
+    policy = 0
+    while len(rows) < count:
+        c = rnd.randrange(len(compartments))
+        policy_id = f"ocid1.policy.oc1..aaaaaaaa{rnd.getrandbits(200):050x}"
+        created = f"0{rnd.randint(1, 9)}/{rnd.randint(10, 28)}/2023 1{rnd.randint(0, 9)}:00:00"
+        for _ in range(statements_per_policy):
+            subject_type = rnd.choice(SUBJECT_TYPES)
+            domain, name = rnd.choice(groups)
+            verb, resource = rnd.choice(VERBS), rnd.choice(resources)
+            location = hierarchies[rnd.randrange(len(hierarchies))].split("/")[-2]
+            condition = f"target.tag.ns.key = '{rnd.randrange(5000)}'" if rnd.random() < 0.3 else ""
+            text = f"allow {subject_type} {domain}/{name} to {verb} {resource} in compartment {location}" + (f" where {condition}" if condition else "")
+            rows.append([f"policy-{policy % 6000}", policy_id, compartments[c], hierarchies[c], text, True, subject_type,
+                         [domain, name], verb, resource, None, "compartment", location, condition, "", created])
+        policy += 1
+    return rows[:count]
+
+
+def measure(build):
+    """(result, bytes allocated and still held, seconds) - timed on a second run without tracing"""
+
+    tracemalloc.start()
+    result = build()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    tic = time.perf_counter()
+    build()
+    return result, held, time.perf_counter() - tic
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--statements", type=int, default=200000)
+    args = parser.parse_args()
+
+    cache = json.dumps(synthetic_statements(args.statements))
+    print(f"Synthetic cache: {args.statements} statements, {len(cache) / 1e6:.1f} MB of JSON")
+
+    lists, list_bytes, list_seconds = measure(lambda: json.loads(cache))
+    print(f"List of lists:   {list_bytes / 1e6:8.1f} MB  (load {list_seconds:.2f}s)")
+    del lists
+
+    store, store_bytes, store_seconds = measure(lambda: StatementStore(rows=json.loads(cache)))
+    print(f"StatementStore:  {store_bytes / 1e6:8.1f} MB  (load {store_seconds:.2f}s, {len(store.strings)} interned values)")
+    print(f"Reduction:       {list_bytes / store_bytes:8.1f}x")
+
+    # Scan costs - positional (compatibility view) vs attribute access
+    rows = store.to_lists()
+    for label, scan in (("list  statement[7][1]", lambda: sum(1 for s in rows if "group-1" in s[7][1])),
+                        ("store statement[7][1]", lambda: sum(1 for s in store if "group-1" in s[7][1])),
+                        ("store statement.subject[1]", lambda: sum(1 for s in store if "group-1" in s.subject[1]))):
+        tic = time.perf_counter()
+        matches = scan()
+        print(f"Scan {label:28} {time.perf_counter() - tic:.3f}s ({matches} matches)")
@@ -0,0 +1,98 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Startup time of every entry point, with a budget for each.
+# Each script runs with --help under python -X importtime (best of --repeat runs).  Its wall time is checked
+# against the budget, and the import log is checked for modules that --help must not load (the OCI SDK, the
+# UI toolkits).  The slowest top-level imports are listed so a regression points at its cause.
+# Exits 1 if any entry point is over budget or loads a forbidden module.  No OCI access needed.
+#
+#   python3 benchmarks/startup_benchmark.py --repeat 5 --top 5
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry point (relative to the repo) -> (arguments, budget in seconds)
+BUDGETS = {
+    "oci_policy_analysis.py": (["--help"], 0.3),
+    "oci-dynamic-group-analysis.py": (["--help"], 0.3),
+    "oci-adb-convert-scale-license-backup.py": (["--help"], 0.2),
+    "oci-adw-convert-threaded.py": (["--help"], 0.2),
+    "oci-atp-scale-down-threaded.py": (["--help"], 0.2),
+    "oci-drg-find-cidr.py": (["--help"], 0.2),
+    "oci-clean-old-datasafe.py": (["--help"], 0.2),
+    "oci-delete-stackmon-resources.py": (["--help"], 0.2),
+    "oci-detect-stale-logging-analytics.py": (["--help"], 0.2),
+    "oci-find-unused-vcn.py": (["--help"], 0.2),
+    "oci-get-public-ip.py": (["--help"], 0.2),
+    "oci-threaded-delete-dbsystems.py": (["--help"], 0.2),
+    "oci-threaded-disable-dbm.py": (["--help"], 0.2),
+    "tkinter/oci_policy_analysis_tkinter.py": (["--help"], 0.2),
+    "oci_policy_database.py": (["--help"], 0.3),
+    "oci_policy_permissions.py": (["--help"], 0.3),
+    "oci_policy_conditions.py": (["--help"], 0.3),
+    "oci_policy_snapshot.py": (["--help"], 0.3),
+}
+
+# Never loaded for --help
+FORBIDDEN = ("oci", "circuitbreaker", "ttkbootstrap", "tksheet", "tkinterweb", "tkinter")
+
+# "import time:       self [us] |  cumulative | imported package"
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run(script: str, arguments: list):
+    """(wall seconds, [(cumulative us, depth, module)]) for one run"""
+
+    tic = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", os.path.join(ROOT, script), *arguments],
+                            cwd=os.path.dirname(os.path.join(ROOT, script)), capture_output=True, text=True)
+    seconds = time.perf_counter() - tic
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            imports.append((int(match.group(2)), (len(match.group(3)) - 1) // 2, match.group(4)))
+    return seconds, imports, result.returncode
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="runs per entry point (the fastest counts)")
+    parser.add_argument("--top", type=int, default=3, help="slowest top-level imports to list")
+    parser.add_argument("--only", nargs="+", help="entry points to run (def: all)")
+    args = parser.parse_args()
+
+    failures = 0
+    for script, (arguments, budget) in BUDGETS.items():
+        if args.only and script not in args.only:
+            continue
+        runs = [run(script, arguments) for _ in range(args.repeat)]
+        seconds, imports, returncode = min(runs, key=lambda r: r[0])
+        forbidden = sorted({module.split(".")[0] for _, _, module in imports if module.split(".")[0] in FORBIDDEN})
+        top = sorted((entry for entry in imports if entry[1] == 0), reverse=True)[:args.top]
+
+        status = "ok"
+        if returncode != 0:
+            status = f"exit {returncode}"
+        elif seconds > budget:
+            status = "OVER BUDGET"
+        elif forbidden:
+            status = f"LOADS {', '.join(forbidden)}"
+        failures += status != "ok"
+        print(f"{script:42} {seconds * 1000:7.1f} ms  budget {budget * 1000:5.0f} ms  {len(imports):4} modules  {status}")
+        for cumulative, _, module in top:
+            print(f"{'':44}{cumulative / 1000:7.1f} ms  {module}")
+
+    sys.exit(1 if failures else 0)
@@ -17,18 +17,8 @@ import time
 import datetime
 import json
 
-# OCI Imports
-from oci import config
-from oci import database
-from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
-from oci.database.models import UpdateAutonomousDatabaseDetails
-from oci.resource_search import ResourceSearchClient
-from oci.resource_search.models import StructuredSearchDetails, ResourceSummary
-from oci.exceptions import ServiceError
-from oci.exceptions import MaximumWaitTimeExceeded
-from oci.exceptions import ConfigFileNotFound
-
-import oci
+# Streaming JSON output (this directory)
+from oci_json_writer import FORMATS as JSON_FORMATS, RecordWriter, output_name
 
 # Constants
 DEFAULT_SCHEDULE = "0,0,0,0,0,0,0,*,*,*,*,*,*,*,*,*,*,0,0,0,0,0,0,0"
@@ -91,7 +81,7 @@ def return_to_initial(db_id: str, initial:str):
         logger.debug(f"Kicked off STOP Autonomous for DB: {db.display_name} (Not Waiting)")
 
 # Helper function - given an ADB OCID, perfrom the given update it
-def perform_work(db_id: str, updates: UpdateAutonomousDatabaseDetails):
+def perform_work(db_id: str, updates: "UpdateAutonomousDatabaseDetails"):
     wait_for_available(db_id=db_id, start=True)
     # Say what we are doing
     logger.info(f'---Perform Work on {db_id}---')
@@ -283,8 +273,22 @@ if __name__ == "__main__":
     parser.add_argument("-t", "--threads", help="Concurrent Threads (def=5)", type=int, default=5)
     parser.add_argument("-r", "--retention", help="Days of backup retention (def=14)", type=int, default=14)
     parser.add_argument("-w", "--writejson", help="output json", action="store_true")
+    parser.add_argument("-jf", "--jsonformat", help="output json as one result per line or a JSON array (def=ndjson)", choices=JSON_FORMATS, default="ndjson")
 
     args = parser.parse_args()
+
+    # OCI Imports - after argument parsing, so --help and argument errors return without loading the SDK
+    from oci import config
+    from oci import database
+    from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
+    from oci.database.models import UpdateAutonomousDatabaseDetails
+    from oci.resource_search import ResourceSearchClient
+    from oci.resource_search.models import StructuredSearchDetails, ResourceSummary
+    from oci.exceptions import ServiceError
+    from oci.exceptions import MaximumWaitTimeExceeded
+    from oci.exceptions import ConfigFileNotFound
+    import oci
+
     verbose = args.verbose
     profile = args.profile
     use_instance_principals = args.instanceprincipal
@@ -366,10 +370,10 @@ if __name__ == "__main__":
     # Write to file if desired, else just print
     if output_json:
         datestring = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M")
-        filename = f'oci-atp-scale-down-{region}-{datestring}.json'
-        with open(filename,"w") as outfile:
-            # Take the entire JSON and dump with indent
-            outfile.write(json.dumps(list(results), indent=2))
+        filename = output_name(f'oci-atp-scale-down-{region}-{datestring}', args.jsonformat)
+        # One result at a time - no string of the whole document
+        with RecordWriter(filename, args.jsonformat) as writer:
+            writer.write_all(results)
 
         logging.info(f"Script complete - wrote JSON to {filename}.")
     else:
@@ -13,20 +13,9 @@ from concurrent.futures import ThreadPoolExecutor
 from concurrent.futures import wait
 import time
 import datetime
-import json
 
-# OCI Imports
-from oci import config
-from oci import database
-from oci import identity
-from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
-from oci.database.models import UpdateAutonomousDatabaseDetails
-from oci.resource_search import ResourceSearchClient
-from oci.resource_search.models import StructuredSearchDetails, ResourceSummary
-from oci.exceptions import ServiceError
-from oci.exceptions import ConfigFileNotFound
-
-import oci
+# Streaming JSON output (this directory)
+from oci_json_writer import FORMATS as JSON_FORMATS, RecordWriter, output_name
 
 # Constants
 DEFAULT_SCHEDULE = "0,0,0,0,0,0,0,*,*,*,*,*,*,*,*,*,*,0,0,0,0,0,0,0"
@@ -293,8 +282,22 @@ if __name__ == "__main__":
     parser.add_argument("-t", "--threads", help="Concurrent Threads (def=5)", type=int, default=5)
     parser.add_argument("-r", "--retention", help="Days of backup retention (def=14)", type=int, default=14)
     parser.add_argument("-w", "--writejson", help="output json", action="store_true")
+    parser.add_argument("-jf", "--jsonformat", help="output json as one result per line or a JSON array (def=ndjson)", choices=JSON_FORMATS, default="ndjson")
 
     args = parser.parse_args()
+
+    # OCI Imports - after argument parsing, so --help and argument errors return without loading the SDK
+    from oci import config
+    from oci import database
+    from oci import identity
+    from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
+    from oci.database.models import UpdateAutonomousDatabaseDetails
+    from oci.resource_search import ResourceSearchClient
+    from oci.resource_search.models import StructuredSearchDetails, ResourceSummary
+    from oci.exceptions import ServiceError
+    from oci.exceptions import ConfigFileNotFound
+    import oci
+
     verbose = args.verbose
     profile = args.profile
     use_instance_principals = args.instanceprincipal
@@ -366,11 +369,10 @@ if __name__ == "__main__":
     # Write to file if desired, else just print
     if output_json:
         datestring = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M")
-        filename = f'oci-atp-scale-down-{datestring}.json'
-        with open(filename,"w") as outfile:
-
-            for result in results:
-                outfile.write(json.dumps(result, indent=2))
+        filename = output_name(f'oci-atp-scale-down-{datestring}', args.jsonformat)
+        # One result at a time - no string of the whole document
+        with RecordWriter(filename, args.jsonformat) as writer:
+            writer.write_all(results)
 
         logging.info(f"Script complete - wrote JSON to {filename}.")
     else:
@@ -1,9 +1,3 @@
-from oci.exceptions import ServiceError
-from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
-from oci.data_safe import DataSafeClient
-from oci.data_safe.models import UserAssessment, SecurityAssessment
-from oci import config, pagination
-from oci.exceptions import ServiceError
 import argparse
 import logging
 import json
@@ -15,7 +9,7 @@ sa_delete_count = 0
 ua_delete_count = 0
 
 # Threaded function
-def ua_function(assessment: UserAssessment) -> bool:
+def ua_function(assessment: "UserAssessment") -> bool:
 
     logging.debug(f"UA: {assessment}")
     logging.info(f"UA Found {assessment.display_name} / {assessment.time_created} / {assessment.lifecycle_state} / {assessment.type} / {assessment.id}")
@@ -38,7 +32,7 @@ def ua_function(assessment: UserAssessment) -> bool:
     return True
 
 # Threaded function
-def sa_function(assessment: SecurityAssessment) -> bool:
+def sa_function(assessment: "SecurityAssessment") -> bool:
 
     logging.debug(f"SA: {assessment}")
     logging.info(f"SA Found {assessment.display_name} / {assessment.time_created} / {assessment.lifecycle_state} / {assessment.type} / {assessment.id}")
@@ -73,6 +67,14 @@ if __name__ == "__main__":
     parser.add_argument("-t", "--threads", help="Concurrent Threads (def=5)", type=int, default=5)
 
     args = parser.parse_args()
+
+    # OCI Imports - after argument parsing, so --help and argument errors return without loading the SDK
+    from oci.exceptions import ServiceError
+    from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
+    from oci.data_safe import DataSafeClient
+    from oci.data_safe.models import UserAssessment, SecurityAssessment
+    from oci import config, pagination
+
     verbose = args.verbose
     profile = args.profile
     dryrun = args.dryrun
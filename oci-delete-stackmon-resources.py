@@ -14,18 +14,6 @@
 # -pr/--profile for using a non-DEFAULT named OCI Profile
 # -t/--threads for how many concurrent threads to run.  Don't go above 8 or the API may throw errors
 
-# Only import required code from OCI
-from oci import config
-from oci import pagination
-from oci.exceptions import ClientError,ServiceError
-from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
-from oci import retry
-
-# OCI Clients and models (import as necessary)
-from oci.identity import IdentityClient
-from oci.identity.models import Compartment
-from oci.stack_monitoring import StackMonitoringClient
-
 # Additional imports
 import argparse   # Argument Parsing
 import logging    # Python Logging
@@ -33,7 +21,7 @@ from concurrent.futures import ThreadPoolExecutor, Future
 from concurrent import futures
 
 # Threaded function
-def work_function(comp: Compartment):
+def work_function(comp: "Compartment"):
     # Compartment Example - allow exceptions 
 
     logger.debug(f"Compartment Name: {comp.name}")
@@ -67,6 +55,17 @@ if __name__ == "__main__":
     parser.add_argument("-t", "--threads", help="Concurrent Threads (def=5)", type=int, default=5)
 
     args = parser.parse_args()
+
+    # OCI Imports - after argument parsing, so --help and argument errors return without loading the SDK
+    from oci import config
+    from oci import pagination
+    from oci.exceptions import ClientError,ServiceError
+    from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
+    from oci import retry
+    from oci.identity import IdentityClient
+    from oci.identity.models import Compartment
+    from oci.stack_monitoring import StackMonitoringClient
+
     verbose = args.verbose  # Boolean
     profile = args.profile  # String
     use_instance_principals = args.instanceprincipal # Attempt to use instance principals (OCI VM)
@@ -1,13 +1,3 @@
-from oci.resource_search import ResourceSearchClient
-from oci.resource_search.models import StructuredSearchDetails
-from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
-from oci.database import DatabaseClient
-from oci.resource_search import ResourceSearchClient
-from oci.resource_search.models import StructuredSearchDetails
-from oci import config, pagination
-from oci.exceptions import ServiceError
-from oci.log_analytics import LogAnalyticsClient
-from oci.core import VirtualNetworkClient
 import argparse
 import logging
 import json
@@ -23,6 +13,17 @@ parser.add_argument("-ip", "--instanceprincipal", help="Use Instance Principal A
 parser.add_argument("-o", "--ocid", help="OCID of compartment (if not passed, will use tenancy OCID from profile)", default="TENANCY")
 
 args = parser.parse_args()
+
+# OCI Imports - after argument parsing, so --help and argument errors return without loading the SDK
+from oci.resource_search import ResourceSearchClient
+from oci.resource_search.models import StructuredSearchDetails
+from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
+from oci.database import DatabaseClient
+from oci import config, pagination
+from oci.exceptions import ServiceError
+from oci.log_analytics import LogAnalyticsClient
+from oci.core import VirtualNetworkClient
+
 verbose = args.verbose
 profile = args.profile
 dryrun = args.dryrun
@@ -6,18 +6,6 @@
 
 # Usage: python oci-python-xxx-yyy.py
 
-# Only import required code from OCI
-from oci import config
-from oci.exceptions import ClientError,ServiceError
-from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
-from oci import retry, pagination
-
-# OCI Clients and models (import as necessary)
-from oci.core import VirtualNetworkClient
-from oci.core.models import DrgAttachment
-from oci.identity import IdentityClient
-from oci.identity.models import Compartment
-
 # Additional imports
 import argparse   # Argument Parsing
 import logging    # Python Logging
@@ -25,7 +13,7 @@ from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 
 # Threaded function - get attachments
-def get_attachments_compartment(comp: Compartment) -> list[DrgAttachment]:
+def get_attachments_compartment(comp: "Compartment") -> "list[DrgAttachment]":
     
     try:
         attachments = vn_client.list_drg_attachments(
@@ -45,7 +33,7 @@ def get_attachments_compartment(comp: Compartment) -> list[DrgAttachment]:
         return []
 
 # Threaded function - get attachments
-def get_attachment_cidr(attachment: DrgAttachment) -> tuple:
+def get_attachment_cidr(attachment: "DrgAttachment") -> tuple:
     
     try:
         vcn = vn_client.get_vcn(
@@ -80,6 +68,17 @@ if __name__ == "__main__":
     parser.add_argument("-t", "--threads", help="Concurrent Threads (def=5)", type=int, default=5)
 
     args = parser.parse_args()
+
+    # OCI Imports - after argument parsing, so --help and argument errors return without loading the SDK
+    from oci import config
+    from oci.exceptions import ClientError,ServiceError
+    from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
+    from oci import retry, pagination
+    from oci.core import VirtualNetworkClient
+    from oci.core.models import DrgAttachment
+    from oci.identity import IdentityClient
+    from oci.identity.models import Compartment
+
     verbose = args.verbose  # Boolean
     profile = args.profile  # String
     use_instance_principals = args.instanceprincipal # Attempt to use instance principals (OCI VM)
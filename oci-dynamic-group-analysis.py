@@ -13,16 +13,6 @@
 # Policies come from the other script - oci-policy-analysis.py - this script writes out its statements into a JSON-based cache file
 # Please run this first so that the local cache is populated.
 
-from oci import config
-from oci.identity import IdentityClient
-from oci.identity.models import UpdateDynamicGroupDetails
-from oci.core import ComputeClient
-from oci.retry import DEFAULT_RETRY_STRATEGY
-from oci.database import DatabaseClient
-from oci.auth.signers import InstancePrincipalsSecurityTokenSigner, ResourcePrincipalsFederationSigner
-from oci import pagination 
-from oci.exceptions import ServiceError
-
 import argparse
 import json
 import os
@@ -31,6 +21,9 @@ import re
 
 # Use Policy Analysis
 import oci_policy_analysis
+from oci_policy_snapshot import load_json, load_table, open_snapshot
+from oci_policy_store import StatementStore, StatementSummary
+from oci_ocid_cache import OcidCache
 
 # Lists
 dynamic_group_statements = []
@@ -49,7 +42,7 @@ logger = logging.getLogger('oci-dynamic-group-analysis')
 
 # OCID Validator
 def validate_ocid(ocid: str) -> bool:
-    '''Check the OCID and return False if it isn't a thing any more'''
+    '''Check the OCID and return False if it isn't a thing any more (None if it can't tell)'''
 
     # Parse the OCID into pieces - compartments are missing a region - we also only care about some parts
     garb1, ocid_type, garb2, ocid_region, garb3 = ocid.split('.')
@@ -69,11 +62,16 @@ def validate_ocid(ocid: str) -> bool:
         else:
             logger.warning(f"Type of OCID not supported: {ocid_type}")
     except ServiceError as exc:
+        # Only a 404 says it is gone - throttling, server and auth errors are unknown, so not cached
+        if exc.status != 404:
+            logger.warning(f"Unable to determine {ocid}: {exc.status} {exc.message}")
+            return None
         logger.debug(f"Caught error: {exc.message}")
         return False
     except KeyError as exc:
+        # No client for the region - unknown, so not cached
         logger.debug(f"Caught error - unable to determine: {exc}")
-        return True
+        return None
 
 
     return True
@@ -89,6 +87,18 @@ if __name__ == "__main__":
     parser.add_argument("-ip", "--instanceprincipal", help="Use Instance Principal Auth - negates --profile", action="store_true")
 
     args = parser.parse_args()
+
+    # OCI Imports - after argument parsing, so --help and argument errors return without loading the SDK
+    from oci import config
+    from oci.identity import IdentityClient
+    from oci.identity.models import UpdateDynamicGroupDetails
+    from oci.core import ComputeClient
+    from oci.retry import DEFAULT_RETRY_STRATEGY
+    from oci.database import DatabaseClient
+    from oci.auth.signers import InstancePrincipalsSecurityTokenSigner, ResourcePrincipalsFederationSigner
+    from oci import pagination
+    from oci.exceptions import ServiceError
+
     verbose = args.verbose
     profile = args.profile
     use_instance_principals = args.instanceprincipal
@@ -128,10 +138,11 @@ if __name__ == "__main__":
     # Use the cache for policies
     logger.info('Attempting to load all policies from cache')
 
-    if os.path.isfile(f'./.policy-dg-cache-{tenancy_ocid}.dat'):
-        with open(f'./.policy-dg-cache-{tenancy_ocid}.dat', 'r') as filehandle:
-            dynamic_group_statements = json.load(filehandle)
-    else:
+    # Snapshot written by oci-policy-analysis.py, else its JSON cache
+    dynamic_group_statements = load_table(open_snapshot(f'.policy-snapshot-{tenancy_ocid}.dat', tenancy_ocid), "dg", StatementSummary)
+    if dynamic_group_statements is None and os.path.isfile(f'./.policy-dg-cache-{tenancy_ocid}.dat'):
+        dynamic_group_statements = StatementStore(StatementSummary, load_json(f'./.policy-dg-cache-{tenancy_ocid}.dat'))
+    if dynamic_group_statements is None:
         # Call Policy analysis as module
         # Lists
 
@@ -145,6 +156,9 @@ if __name__ == "__main__":
         dynamic_group_statements = oci_policy_analysis.dynamic_group_statements
         logger.info("---Finished Loaded from Policy Module---")
 
+    # Known-deleted OCIDs and recently checked live ones aren't checked again
+    ocid_cache = OcidCache(f'.ocid-cache-{tenancy_ocid}.dat')
+
     # Load DGs
     dynamic_groups = []
 
@@ -174,7 +188,7 @@ if __name__ == "__main__":
         match = re.findall(r'ocid1.[a-z]+.oc1.[a-z0-9|-]*.[a-z0-9]+',dg.matching_rule)
         is_valid = True
         for oc in match:
-            if not validate_ocid(oc):
+            if not ocid_cache.check(oc, validate_ocid):
                 is_valid = False
         if not is_valid:
             logger.info(f"Valid : {is_valid} Dynamic Group: {dg.name} Rule: {dg.matching_rule}")
@@ -200,4 +214,5 @@ if __name__ == "__main__":
                                                 )
                                             )
 
+    ocid_cache.save()
     logger.info(f"Finished. Out of {len(dynamic_groups)} in tenancy, there are {total_invalid} with invalid OCIDs and {total_unused} not in any statements.")
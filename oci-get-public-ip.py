@@ -6,19 +6,6 @@
 
 # Usage: python oci-python-xxx-yyy.py
 
-# Only import required code from OCI
-from oci import config
-from oci.exceptions import ClientError,ServiceError
-from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
-from oci import retry, pagination
-
-# OCI Clients and models (import as necessary)
-from oci.core import VirtualNetworkClient
-from oci.resource_search import ResourceSearchClient
-from oci.resource_search.models import StructuredSearchDetails
-from oci.identity.models import Compartment
-from oci.identity import IdentityClient
-
 # Additional imports
 import argparse   # Argument Parsing
 import logging    # Python Logging
@@ -36,7 +23,7 @@ def finish(future: Future):
     pass
 
 # Threaded function - Network - public IP
-def work_function(comp: Compartment) -> int:
+def work_function(comp: "Compartment") -> int:
     # ADB Example
     try:
         ips = vcn_client.list_public_ips(
@@ -66,6 +53,18 @@ if __name__ == "__main__":
     parser.add_argument("-t", "--threads", help="Concurrent Threads (def=5)", type=int, default=8)
 
     args = parser.parse_args()
+
+    # OCI Imports - after argument parsing, so --help and argument errors return without loading the SDK
+    from oci import config
+    from oci.exceptions import ClientError,ServiceError
+    from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
+    from oci import retry, pagination
+    from oci.core import VirtualNetworkClient
+    from oci.resource_search import ResourceSearchClient
+    from oci.resource_search.models import StructuredSearchDetails
+    from oci.identity.models import Compartment
+    from oci.identity import IdentityClient
+
     verbose = args.verbose  # Boolean
     profile = args.profile  # String
     use_instance_principals = args.instanceprincipal # Attempt to use instance principals (OCI VM)
@@ -6,23 +6,11 @@
 
 # Usage: python oci-python-xxx-yyy.py
 
-# Only import required code from OCI
-from oci import config
-from oci.exceptions import ClientError,ServiceError
-from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
-from oci import retry
-
-# OCI Clients and models (import as necessary)
-from oci.database import DatabaseClient
-from oci.resource_search import ResourceSearchClient
-from oci.resource_search.models import StructuredSearchDetails
-
 # Additional imports
 import argparse   # Argument Parsing
 import logging    # Python Logging
 from concurrent.futures import ThreadPoolExecutor, Future
 from concurrent import futures
-import circuitbreaker
 
 global total
 total = 0
@@ -74,6 +62,17 @@ if __name__ == "__main__":
     parser.add_argument("-t", "--threads", help="Concurrent Threads (def=5)", type=int, default=5)
 
     args = parser.parse_args()
+
+    # OCI Imports - after argument parsing, so --help and argument errors return without loading the SDK
+    from oci import config
+    from oci.exceptions import ClientError,ServiceError
+    from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
+    from oci import retry
+    from oci.database import DatabaseClient
+    from oci.resource_search import ResourceSearchClient
+    from oci.resource_search.models import StructuredSearchDetails
+    import circuitbreaker
+
     verbose = args.verbose  # Boolean
     profile = args.profile  # String
     use_instance_principals = args.instanceprincipal # Attempt to use instance principals (OCI VM)
@@ -0,0 +1,96 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Regional OCI clients shared by worker threads, one per (service, region).
+# Clients are made on first use under a lock, so threads that miss together still get the same client.
+# Later lookups are a dictionary read without the lock.  Every client is made with the same signer - the
+# instance principal signer, or one made from the profile once instead of reading the key for each client - and
+# its own copy of the config with the region set.  Each client's HTTPS connection pool holds as many
+# connections as there are workers, so threads reuse connections and TLS sessions instead of queuing.
+#
+#   pool = ClientPool(config, signer, size=THREADS)
+#   pool.get("compute", "iad").get_instance(instance_id=ocid)
+
+import importlib
+import logging
+from threading import Lock
+
+logger = logging.getLogger('oci-client-pool')
+
+# Service -> (module, client class)
+SERVICES = {
+    "compute": ("oci.core", "ComputeClient"),
+    "database": ("oci.database", "DatabaseClient"),
+    "functions": ("oci.functions", "FunctionsManagementClient"),
+    "apigateway": ("oci.apigateway", "GatewayClient"),
+    "search": ("oci.resource_search", "ResourceSearchClient"),
+}
+POOL_SIZE = 8
+
+
+def profile_signer(config: dict):
+    """One API key signer for a profile config, or None if the profile doesn't use an API key"""
+
+    from oci.signer import Signer
+
+    if not config.get("user") or not (config.get("key_file") or config.get("key_content")):
+        return None
+    return Signer(tenancy=config["tenancy"], user=config["user"], fingerprint=config["fingerprint"],
+                  private_key_file_location=config.get("key_file"), pass_phrase=config.get("pass_phrase"),
+                  private_key_content=config.get("key_content"))
+
+
+def size_connection_pool(client, size: int):
+    """Let up to size threads hold a connection of client's session at once"""
+
+    session = getattr(getattr(client, "base_client", None), "session", None)
+    if session is None:
+        return
+    try:
+        from oci._vendor.requests.adapters import HTTPAdapter
+    except ImportError:
+        # SDK versions that use the installed requests
+        from requests.adapters import HTTPAdapter
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=size))
+
+
+class ClientPool:
+    """Thread-safe, lazily filled map of (service, region) -> client"""
+
+    def __init__(self, config: dict, signer=None, size: int = POOL_SIZE):
+        from oci.retry import DEFAULT_RETRY_STRATEGY
+
+        self.retry_strategy = DEFAULT_RETRY_STRATEGY
+        self.config = dict(config)
+        self.signer = signer if signer is not None else profile_signer(self.config)
+        self.size = size
+        self.clients = {}
+        self.lock = Lock()
+
+    def get(self, service: str, region: str):
+        """Client for a service (a SERVICES key) in a region, made on first use"""
+
+        key = (service, region)
+        client = self.clients.get(key)
+        if client is not None:
+            return client
+        with self.lock:
+            # Another thread may have made it while this one waited
+            client = self.clients.get(key)
+            if client is None:
+                module, name = SERVICES[service]
+                client_class = getattr(importlib.import_module(module), name)
+                kwargs = {"signer": self.signer} if self.signer is not None else {}
+                client = client_class(config=dict(self.config, region=region), retry_strategy=self.retry_strategy, **kwargs)
+                size_connection_pool(client, self.size)
+                self.clients[key] = client
+                logger.info(f"Created {name} for {region} ({len(self.clients)} clients)")
+        return client
+
+    def __len__(self):
+        return len(self.clients)
@@ -0,0 +1,168 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Compartment tree index shared by the policy loaders (oci_policy_analysis.py and tkinter/policy.py).
+# It is built once from the list_compartments(compartment_id_in_subtree=True) result that the loaders
+# already hold, so the hierarchy path of a compartment never needs another get_compartment call.
+# When compartments are streamed page by page, add() them as they arrive and call complete() at the end.
+
+import logging
+from threading import Event, Lock
+
+logger = logging.getLogger('oci-compartment-tree')
+
+
+class CompartmentTree:
+    """Index of a compartment listing - path, depth, ancestors and name lookups resolved in one pass"""
+
+    def __init__(self, compartments: list = None, fetch_compartment=None):
+        """Build the index from compartment objects (anything with id, name and compartment_id).
+        fetch_compartment is an optional callable(ocid) used only when a parent is missing from the list.
+        Without compartments, the tree is filled with add() and lookups wait until complete() is called"""
+
+        self.fetch_compartment = fetch_compartment
+        self.lock = Lock()
+        self.ready = Event()
+
+        # OCID -> compartment, and parent OCID -> child OCIDs
+        self.compartments = {}
+        self.children = {}
+        self.root_id = None
+
+        # Resolved per compartment
+        self.paths = {}
+        self.depths = {}
+        self.ancestor_ids = {}
+
+        # Lookups - casefolded name -> [OCID] (names are only unique among siblings), path -> OCID
+        self.names = {}
+        self.path_ids = {}
+
+        if compartments is not None:
+            for compartment in compartments:
+                self.add(compartment)
+            self.complete()
+
+    def add(self, compartment) -> bool:
+        """Register a single compartment (resolved on complete). Returns False if it was already known"""
+
+        if compartment.id in self.compartments:
+            return False
+        self.compartments[compartment.id] = compartment
+        if not compartment.compartment_id:
+            self.root_id = compartment.id
+        else:
+            self.children.setdefault(compartment.compartment_id, []).append(compartment.id)
+        self.names.setdefault(compartment.name.casefold(), []).append(compartment.id)
+        return True
+
+    def complete(self):
+        """Resolve every registered compartment and release any waiting lookups"""
+
+        with self.lock:
+            for ocid in list(self.compartments):
+                self._resolve(ocid)
+        self.ready.set()
+        logger.debug(f"Indexed {len(self.compartments)} compartments")
+
+    def _resolve(self, ocid: str):
+        """Resolve path, depth and ancestors for an OCID, walking up only until a resolved parent is found"""
+
+        # Collect the unresolved chain bottom-up
+        chain = []
+        current = ocid
+        while current not in self.paths:
+            compartment = self.compartments.get(current)
+            if compartment is None:
+                compartment = self._fetch(current)
+                if compartment is None:
+                    # Unknown parent - treat as the top of what we can see
+                    break
+            chain.append(compartment)
+            if not compartment.compartment_id:
+                break
+            current = compartment.compartment_id
+
+        # Unwind top-down so every parent is resolved before its child
+        for compartment in reversed(chain):
+            parent_id = compartment.compartment_id
+            if not parent_id:
+                path, depth, ancestors = "", 0, ()
+            elif parent_id in self.paths:
+                path = f"{self.paths[parent_id]}{compartment.name}/"
+                depth = self.depths[parent_id] + 1
+                ancestors = self.ancestor_ids[parent_id] + (parent_id,)
+            else:
+                path, depth, ancestors = f"{compartment.name}/", 1, ()
+            self.paths[compartment.id] = path
+            self.depths[compartment.id] = depth
+            self.ancestor_ids[compartment.id] = ancestors
+            self.path_ids[path.casefold()] = compartment.id
+
+    def _fetch(self, ocid: str):
+        """Fall back to the API for a compartment that wasn't in the listing"""
+
+        if not self.fetch_compartment:
+            return None
+        try:
+            compartment = self.fetch_compartment(ocid)
+        except Exception as exc:
+            logger.warning(f"Unable to fetch compartment {ocid}: {exc}")
+            return None
+        logger.debug(f"Fetched missing compartment {compartment.name}: {ocid}")
+        self.add(compartment)
+        return compartment
+
+    def _ensure(self, ocid: str):
+        """Resolve an OCID on demand (thread safe) if it wasn't part of the original listing"""
+
+        self.ready.wait()
+        if ocid not in self.paths:
+            with self.lock:
+                if ocid not in self.paths:
+                    self._resolve(ocid)
+
+    def path(self, ocid: str) -> str:
+        """Hierarchy path relative to the root, eg 'parent/child/' - root is an empty string"""
+
+        self._ensure(ocid)
+        return self.paths.get(ocid, "")
+
+    def depth(self, ocid: str) -> int:
+        """Levels below the root (root is 0)"""
+
+        self._ensure(ocid)
+        return self.depths.get(ocid, 0)
+
+    def ancestors(self, ocid: str) -> tuple:
+        """Ancestor OCIDs from the root down to the direct parent"""
+
+        self._ensure(ocid)
+        return self.ancestor_ids.get(ocid, ())
+
+    def is_ancestor(self, ancestor_ocid: str, ocid: str) -> bool:
+        """True if ancestor_ocid is above ocid in the tree"""
+
+        return ancestor_ocid in self.ancestors(ocid)
+
+    def ocids_for_name(self, name: str) -> list:
+        """All compartment OCIDs with this name (case-insensitive)"""
+
+        return self.names.get(name.casefold(), [])
+
+    def ocid_for_path(self, path: str):
+        """Compartment OCID for a hierarchy path such as 'parent/child' (None if unknown)"""
+
+        path = path.strip("/")
+        return self.path_ids.get(f"{path}/".casefold() if path else "")
+
+    def __len__(self):
+        return len(self.compartments)
+
+    def __contains__(self, ocid):
+        return ocid in self.compartments
@@ -0,0 +1,117 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Concurrent loader for the dynamic resource groups of every identity domain (DynamicGroupAnalysis.load_all_dynamic_groups).
+# Domains load in parallel on a thread pool, one IdentityDomainsClient per domain endpoint.  Each domain is
+# paged with SCIM startIndex/count until totalResults is reached, so large domains aren't cut off at the
+# first page, and every page is handed to a callback as it arrives.  A domain that fails is logged and
+# reported without stopping the others.  The SDK is imported by the functions that call it.
+#
+#   crawler = DomainCrawler(config, signer)
+#   loads = crawler.crawl(domains, lambda domain, groups: ...)
+#   for load in loads: logger.info(load.describe())
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import NamedTuple
+
+logger = logging.getLogger('oci-domain-crawler')
+
+WORKERS = 8
+# SCIM page size - the Identity Domains service caps count at 1000
+PAGE_SIZE = 1000
+
+
+class DomainLoad(NamedTuple):
+    """What was loaded from one domain"""
+
+    domain: str
+    groups: int
+    pages: int
+    seconds: float
+    error: str = None
+
+    def describe(self) -> str:
+        if self.error:
+            return f"Domain {self.domain}: failed after {self.groups} groups in {self.pages} pages ({self.seconds:.2f}s): {self.error}"
+        return f"Domain {self.domain}: {self.groups} dynamic groups in {self.pages} pages ({self.seconds:.2f}s)"
+
+
+def dynamic_resource_group_pages(client, page_size: int = PAGE_SIZE):
+    """Yield each page (list of DynamicResourceGroup) of a domain, following SCIM startIndex/count"""
+
+    start = 1
+    while True:
+        data = client.list_dynamic_resource_groups(attribute_sets=["all"], start_index=start, count=page_size).data
+        resources = data.resources or []
+        if resources:
+            yield resources
+        start += len(resources)
+        # totalResults is the domain's count - stop there, or on an empty page
+        if not resources or start > (data.total_results or 0):
+            return
+
+
+class DomainCrawler:
+    """Loads the dynamic resource groups of many domains at once"""
+
+    def __init__(self, config: dict, signer=None, workers: int = WORKERS, page_size: int = PAGE_SIZE):
+        from oci.retry import DEFAULT_RETRY_STRATEGY
+
+        self.retry_strategy = DEFAULT_RETRY_STRATEGY
+        self.config = config
+        self.signer = signer
+        self.workers = workers
+        self.page_size = page_size
+        # Domain endpoint -> client
+        self.clients = {}
+        self.lock = Lock()
+
+    def client(self, url: str):
+        """IdentityDomainsClient for a domain endpoint, made on first use"""
+
+        from oci.identity_domains import IdentityDomainsClient
+
+        with self.lock:
+            client = self.clients.get(url)
+            if client is None:
+                kwargs = {"signer": self.signer} if self.signer is not None else {}
+                client = IdentityDomainsClient(self.config, retry_strategy=self.retry_strategy, service_endpoint=url, **kwargs)
+                self.clients[url] = client
+        return client
+
+    def load_domain(self, domain, on_page) -> DomainLoad:
+        """Page through one domain, calling on_page(domain, groups) for each page"""
+
+        tic = time.perf_counter()
+        groups = pages = 0
+        try:
+            for page in dynamic_resource_group_pages(self.client(domain.url), self.page_size):
+                on_page(domain, page)
+                groups += len(page)
+                pages += 1
+        except Exception as exc:
+            load = DomainLoad(domain.display_name, groups, pages, time.perf_counter() - tic, str(exc))
+            logger.error(load.describe())
+            return load
+        load = DomainLoad(domain.display_name, groups, pages, time.perf_counter() - tic)
+        logger.info(load.describe())
+        return load
+
+    def crawl(self, domains: list, on_page) -> list:
+        """Load every domain in parallel - on_page(domain, groups) may be called from several threads at once.
+        Returns a DomainLoad per domain, in the order given"""
+
+        tic = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="domain") as executor:
+            loads = list(executor.map(lambda domain: self.load_domain(domain, on_page), domains))
+        logger.info(f"Loaded {sum(load.groups for load in loads)} dynamic groups from {len(domains)} domains "
+                    f"on {self.workers} threads in {time.perf_counter() - tic:.2f}s")
+        return loads
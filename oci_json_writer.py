@@ -0,0 +1,81 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Streaming JSON output for the report scripts - each record is serialized and written as it is produced,
+# so memory doesn't grow with the output.
+#   ndjson - one compact JSON document per line (default)
+#   array  - one well-formed JSON array, records indented as json.dumps(..., indent=2) would
+#
+#   with RecordWriter("out.json", "array") as writer:
+#       writer.write_all(records)
+
+import json
+import logging
+
+logger = logging.getLogger('oci-json-writer')
+
+FORMATS = ("ndjson", "array")
+EXTENSIONS = {"ndjson": "ndjson", "array": "json"}
+
+
+def output_name(base: str, format: str) -> str:
+    """File name for a report - .ndjson or .json by format"""
+
+    return f"{base}.{EXTENSIONS[format]}"
+
+
+class RecordWriter:
+    """Writes JSON records one at a time to a path (or an open text file, which is left open)"""
+
+    def __init__(self, output, format: str = "ndjson", indent: int = 2):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown JSON format {format} - one of {', '.join(FORMATS)}")
+        self.format = format
+        self.indent = indent
+        self.owned = isinstance(output, str)
+        self.file = open(output, "w", encoding="utf-8") if self.owned else output
+        self.count = 0
+        if format == "array":
+            self.file.write("[")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, record):
+        if self.format == "ndjson":
+            self.file.write(json.dumps(record))
+            self.file.write("\n")
+        else:
+            # Nested one level deeper than json.dumps would put a top-level record
+            text = json.dumps(record, indent=self.indent)
+            if self.indent:
+                text = text.replace("\n", "\n" + " " * self.indent)
+                self.file.write(("," if self.count else "") + "\n" + " " * self.indent + text)
+            else:
+                self.file.write(("," if self.count else "") + text)
+        self.count += 1
+
+    def write_all(self, records) -> int:
+        """Write every record of an iterable - returns how many"""
+
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def close(self):
+        if self.file is None:
+            return
+        if self.format == "array":
+            self.file.write("\n]\n" if self.count and self.indent else "]\n")
+        if self.owned:
+            self.file.close()
+        self.file = None
+        logger.debug(f"Wrote {self.count} records ({self.format})")
@@ -0,0 +1,196 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Streaming uploader for OCI Logging (custom logs).
+# Entries are added one at a time as they are produced and cut into put_logs requests that stay under a byte
+# and an entry limit (one entry type per request).  Full requests are uploaded on a small thread pool while
+# more entries are added - if uploads fall behind, add() blocks, so memory stays bounded.  Throttling (429),
+# server errors and connection failures are retried with exponential backoff (Retry-After wins); a request
+# that is too large is split in half.  Entries that still fail, or are too large on their own, are counted
+# as rejected in the summary.  The SDK is only imported when a shipper is made.
+#
+#   with LogShipper(loggingingestion_client, log_ocid) as shipper:
+#       shipper.add("regular-statement", "...")
+#   logger.info(shipper.summary().describe())
+
+import datetime
+import itertools
+import logging
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from typing import NamedTuple
+
+logger = logging.getLogger('oci-log-shipper')
+
+SOURCE = "oci-policy-analysis"
+WORKERS = 4
+# Kept well under the service's per-request payload limit - JSON framing is estimated per entry
+MAX_REQUEST_BYTES = 2 * 1024 * 1024
+MAX_REQUEST_ENTRIES = 5000
+ENTRY_OVERHEAD = 100
+MAX_RETRIES = 6
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class ShipSummary(NamedTuple):
+    """What a LogShipper uploaded"""
+
+    entries: int
+    requests: int
+    bytes: int
+    retries: int
+    rejected: int
+    seconds: float
+
+    def describe(self) -> str:
+        rate = self.entries / self.seconds if self.seconds else 0.0
+        return (f"Shipped {self.entries} log entries ({self.bytes / 1e6:.2f} MB) in {self.requests} requests over {self.seconds:.2f}s "
+                f"({rate:.0f} entries/s), {self.retries} retries, {self.rejected} rejected")
+
+
+class LogShipper:
+    """Batches entries for one log and uploads them concurrently - add() from one producer thread, then close()"""
+
+    def __init__(self, client, log_id: str, source: str = SOURCE, workers: int = WORKERS,
+                 max_bytes: int = MAX_REQUEST_BYTES, max_entries: int = MAX_REQUEST_ENTRIES, max_retries: int = MAX_RETRIES):
+        from oci.loggingingestion.models import LogEntry
+
+        self.log_entry = LogEntry
+        self.client = client
+        self.log_id = log_id
+        self.source = source
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_retries = max_retries
+
+        # Entry ids - one random prefix and a counter, instead of a uuid per entry
+        self.id_prefix = uuid.uuid4().hex
+        self.id_counter = itertools.count()
+
+        # entry type -> (entries, estimated bytes) not yet submitted
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="logship")
+        self.slots = BoundedSemaphore(workers * 2)
+        self.closed = False
+
+        self.lock = Lock()
+        self.entries = 0
+        self.requests = 0
+        self.bytes = 0
+        self.retries = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, entry_type: str, data: str):
+        """Queue one entry - submits the pending request of its type once it is full"""
+
+        size = len(data.encode(errors="replace")) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            logger.warning(f"Rejected a {entry_type} entry of {size} bytes (limit {self.max_bytes})")
+            with self.lock:
+                self.rejected += 1
+            return
+        entries, pending_bytes = self.pending.get(entry_type, ([], 0))
+        if entries and (pending_bytes + size > self.max_bytes or len(entries) >= self.max_entries):
+            self._submit(entry_type, entries, pending_bytes)
+            entries, pending_bytes = [], 0
+        entries.append(self.log_entry(id=f"{self.id_prefix}-{next(self.id_counter)}", data=data))
+        self.pending[entry_type] = (entries, pending_bytes + size)
+
+    def flush(self):
+        """Submit every pending request"""
+
+        for entry_type, (entries, pending_bytes) in self.pending.items():
+            if entries:
+                self._submit(entry_type, entries, pending_bytes)
+        self.pending = {}
+
+    def close(self) -> ShipSummary:
+        """Submit what is pending and wait for every upload"""
+
+        if not self.closed:
+            self.closed = True
+            self.flush()
+            self.executor.shutdown(wait=True)
+            self.finished = time.perf_counter()
+            logger.info(self.summary().describe())
+        return self.summary()
+
+    def summary(self) -> ShipSummary:
+        with self.lock:
+            return ShipSummary(self.entries, self.requests, self.bytes, self.retries, self.rejected,
+                               (self.finished or time.perf_counter()) - self.started)
+
+    def _submit(self, entry_type: str, entries: list, size: int):
+        # Blocks while workers * 2 requests are queued or uploading
+        self.slots.acquire()
+        future = self.executor.submit(self._upload, entry_type, entries, size)
+        future.add_done_callback(lambda _: self.slots.release())
+
+    def _upload(self, entry_type: str, entries: list, size: int):
+        """One put_logs request with retries - split in half if the service says it is too large"""
+
+        from oci.exceptions import RequestException, ServiceError
+        from oci.loggingingestion.models import PutLogsDetails, LogEntryBatch
+
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.client.put_logs(
+                    log_id=self.log_id,
+                    put_logs_details=PutLogsDetails(
+                        specversion="1.0",
+                        log_entry_batches=[LogEntryBatch(defaultlogentrytime=datetime.datetime.now(datetime.timezone.utc),
+                                                         source=self.source,
+                                                         type=entry_type,
+                                                         entries=entries)]))
+                with self.lock:
+                    self.requests += 1
+                    self.entries += len(entries)
+                    self.bytes += size
+                return
+            except ServiceError as exc:
+                error, status, headers = exc, exc.status, exc.headers or {}
+            except (RequestException, ConnectionError, TimeoutError) as exc:
+                # Connection errors and timeouts from the SDK's transport
+                error, status, headers = exc, None, {}
+            except Exception as exc:
+                # Anything else won't get better by retrying
+                error, status, headers = exc, 0, {}
+
+            if status == 413 and len(entries) > 1:
+                half = len(entries) // 2
+                logger.debug(f"Request of {len(entries)} {entry_type} entries too large, splitting")
+                self._upload(entry_type, entries[:half], size // 2)
+                self._upload(entry_type, entries[half:], size - size // 2)
+                return
+            if (status is not None and status not in RETRY_STATUS) or attempt == self.max_retries:
+                break
+
+            with self.lock:
+                self.retries += 1
+            try:
+                delay = float(headers.get("retry-after"))
+            except (TypeError, ValueError):
+                delay = min(30.0, 0.5 * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            logger.debug(f"put_logs failed ({status or error}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+        logger.error(f"Rejected {len(entries)} {entry_type} entries: {error}")
+        with self.lock:
+            self.rejected += len(entries)
@@ -0,0 +1,140 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# On-disk OCID status cache for the dynamic-group OCID checks (tkinter/dynamic.py and oci-dynamic-group-analysis.py).
+# Each OCID maps to [state, last checked (epoch seconds), TTL seconds].  A deleted OCID never comes back, so it
+# is kept with no TTL and not checked again - which is why only a definitive 404 from the per-type GET is
+# recorded as deleted.  Results the checks can't determine (throttling, server or auth errors) aren't recorded.  An active one is re-checked once its type's TTL has passed -
+# compartments change rarely, instances come and go.  Only types with a TTL are cached; others (types the
+# checks can't handle) are always checked.  Delete the file to start over.
+#
+#   cache = OcidCache(f".ocid-cache-{tenancy_ocid}.dat")
+#   known, stale = cache.split(ocids)     - {ocid: exists} still fresh, [ocid] to check
+#   cache.update(results); cache.save()
+
+import json
+import logging
+import os
+import time
+from threading import Lock
+
+logger = logging.getLogger('oci-ocid-cache')
+
+ACTIVE = "active"
+DELETED = "deleted"
+
+DAY = 24 * 60 * 60
+# OCID type -> seconds an active OCID is trusted before it is checked again
+TTLS = {
+    "tenancy": 30 * DAY,
+    "compartment": 7 * DAY,
+    "dbsystem": 3 * DAY,
+    "autonomousdatabase": 3 * DAY,
+    "cloudvmcluster": 3 * DAY,
+    "dbnode": 3 * DAY,
+    "fnapp": 3 * DAY,
+    "apigateway": 3 * DAY,
+    "fnfunc": DAY,
+    "instance": DAY,
+}
+
+
+def ocid_type(ocid: str) -> str:
+    parts = ocid.split('.')
+    return parts[1] if len(parts) == 5 else ""
+
+
+class OcidCache:
+    """OCID -> (state, checked, TTL) loaded from and saved to one JSON file.  Thread-safe"""
+
+    def __init__(self, path: str, ttls: dict = TTLS):
+        self.path = path
+        self.ttls = ttls
+        self.entries = {}
+        self.lock = Lock()
+        self.changed = False
+        self.hits = 0
+        self.misses = 0
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r') as filehandle:
+                    self.entries = json.load(filehandle)
+            except (OSError, ValueError) as exc:
+                logger.warning(f"Ignoring unreadable OCID cache {path}: {exc}")
+        logger.info(f"Loaded {len(self.entries)} OCIDs from {path}")
+
+    def get(self, ocid: str, now: float = None):
+        """True (active) or False (deleted) if the cached state is still current, else None"""
+
+        entry = self.entries.get(ocid)
+        if entry is not None:
+            state, checked, ttl = entry
+            if state == DELETED or (now or time.time()) - checked < ttl:
+                with self.lock:
+                    self.hits += 1
+                return state == ACTIVE
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, ocid: str, exists: bool, now: float = None):
+        """Record a check - exists is False only for a 404.  Ignored for types without a TTL"""
+
+        ttl = self.ttls.get(ocid_type(ocid))
+        if ttl is None:
+            return
+        with self.lock:
+            self.entries[ocid] = [ACTIVE, now or time.time(), ttl] if exists else [DELETED, now or time.time(), None]
+            self.changed = True
+
+    def split(self, ocids, now: float = None) -> tuple:
+        """({ocid: exists} answered by the cache, [ocid] new or expired) for the distinct OCIDs"""
+
+        now = now or time.time()
+        known = {}
+        stale = []
+        for ocid in dict.fromkeys(ocids):
+            state = self.get(ocid, now)
+            if state is None:
+                stale.append(ocid)
+            else:
+                known[ocid] = state
+        logger.info(f"OCID cache: {len(known)} current, {len(stale)} new or expired")
+        return known, stale
+
+    def update(self, results: dict, now: float = None):
+        """put() every {ocid: exists}"""
+
+        now = now or time.time()
+        for ocid, exists in results.items():
+            self.put(ocid, exists, now)
+
+    def check(self, ocid: str, validate) -> bool:
+        """Cached state, else validate(ocid) and remember it.  validate returns None if it can't tell - reported
+        as valid and not remembered"""
+
+        state = self.get(ocid)
+        if state is None:
+            state = validate(ocid)
+            if state is None:
+                return True
+            self.put(ocid, state)
+        return state
+
+    def save(self):
+        """Write the file if anything changed (to a temporary file first, so a failed write keeps the old one)"""
+
+        with self.lock:
+            if not self.changed:
+                return
+            temporary = f"{self.path}.tmp"
+            with open(temporary, 'w') as filehandle:
+                json.dump(self.entries, filehandle)
+            os.replace(temporary, self.path)
+            self.changed = False
+        logger.info(f"Saved {len(self.entries)} OCIDs to {self.path} ({self.hits} hits, {self.misses} checked)")
@@ -0,0 +1,177 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Bulk existence check for the OCIDs in dynamic-group matching rules (DynamicGroupAnalysis.run_deep_analysis).
+# The same compartment or instance is often named by many groups, so the OCIDs are collected from every rule
+# and each distinct one is checked once.  They are grouped by region (Resource Search only sees its own
+# region; compartments have none and are searched in the home region) and checked with structured searches
+# of up to BATCH_SIZE "identifier = '...'" clauses each - an OCID is valid if the search returns it and it
+# isn't terminated or deleted.  Search is only trusted to say yes: a miss can be index lag or a missing inspect
+# permission, so OCIDs it doesn't return (or returns as gone) are confirmed with the per-type GET (the fallback),
+# and only a 404 from that makes one invalid.  Types search doesn't cover, and batches whose search fails, go
+# straight to the fallback.  Anything that can't be determined is reported valid and listed in unchecked, so
+# callers don't cache it.  Batches run on a thread pool.
+# The SDK is imported by the functions that call it.
+#
+#   validator = OcidValidator(lambda region: pool.get("search", region), home_region, fallback=validate_ocid)
+#   valid = validator.validate(ocids)    - {ocid: bool}, validator.unchecked - those it couldn't determine
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import NamedTuple
+
+logger = logging.getLogger('oci-ocid-validator')
+
+# OCID types (ocid1.<type>.<realm>.<region>.<id>) Resource Search indexes - others use the fallback
+SEARCH_TYPES = ("compartment", "instance", "dbsystem", "autonomousdatabase", "cloudvmcluster", "fnfunc", "fnapp", "apigateway")
+# Found by search but gone
+GONE_STATES = ("TERMINATED", "DELETED")
+# Identifier clauses per search - keeps the query well under the service's length limit
+BATCH_SIZE = 50
+WORKERS = 8
+
+
+def ocid_parts(ocid: str):
+    """(type, region) of an OCID, or None if it isn't one - region is "" for compartments and the tenancy"""
+
+    parts = ocid.split('.')
+    if len(parts) != 5 or parts[0] != "ocid1":
+        return None
+    return parts[1], parts[3]
+
+
+def search_query(ocids: list) -> str:
+    """Structured query for the resources with any of these OCIDs"""
+
+    return "query all resources where " + " || ".join(f"identifier = '{ocid}'" for ocid in ocids)
+
+
+class ValidationSummary(NamedTuple):
+    """What an OcidValidator.validate call checked and how"""
+
+    ocids: int
+    invalid: int
+    searches: int
+    lookups: int
+    seconds: float
+
+    def describe(self) -> str:
+        return (f"Validated {self.ocids} distinct OCIDs ({self.invalid} invalid) with {self.searches} searches "
+                f"and {self.lookups} single lookups in {self.seconds:.2f}s")
+
+
+class OcidValidator:
+    """Checks many OCIDs with batched Resource Search per region, and a per-OCID fallback"""
+
+    def __init__(self, search_client, home_region: str, fallback, workers: int = WORKERS, batch_size: int = BATCH_SIZE):
+        """search_client(region) gives a ResourceSearchClient for a region; fallback(ocid) checks one OCID -
+        True, False (a 404) or None (can't tell)"""
+
+        self.search_client = search_client
+        self.home_region = home_region
+        self.fallback = fallback
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lock = Lock()
+        self.searches = 0
+        self.lookups = 0
+        self.last = None
+        # OCIDs the last validate() couldn't check (reported valid)
+        self.unchecked = set()
+
+    def batches(self, ocids) -> tuple:
+        """([(region, [ocid])] search batches, [ocid] for the fallback)"""
+
+        regions = {}
+        single = []
+        for ocid in ocids:
+            parts = ocid_parts(ocid)
+            if parts is None or parts[0] not in SEARCH_TYPES:
+                single.append(ocid)
+                continue
+            regions.setdefault(parts[1] or self.home_region, []).append(ocid)
+
+        batches = []
+        for region, region_ocids in regions.items():
+            for start in range(0, len(region_ocids), self.batch_size):
+                batches.append((region, region_ocids[start:start + self.batch_size]))
+        return batches, single
+
+    def search(self, region: str, ocids: list) -> dict:
+        """{ocid: exists or None} for one batch - what search doesn't confirm, or all if it fails, is looked up"""
+
+        from oci.exceptions import ServiceError
+        from oci.resource_search.models import StructuredSearchDetails
+
+        found = {}
+        try:
+            client = self.search_client(region)
+            page = None
+            while True:
+                response = client.search_resources(
+                    search_details=StructuredSearchDetails(type="Structured", query=search_query(ocids), matching_context_type="NONE"),
+                    limit=1000,
+                    page=page)
+                with self.lock:
+                    self.searches += 1
+                for resource in response.data.items:
+                    if resource.lifecycle_state not in GONE_STATES:
+                        found[resource.identifier] = True
+                page = response.next_page
+                if not page:
+                    break
+        except ServiceError as exc:
+            logger.warning(f"Resource Search failed in {region}, checking {len(ocids)} OCIDs one at a time: {exc.message}")
+            return {ocid: self.lookup(ocid) for ocid in ocids}
+        # A miss may be index lag or permissions rather than deletion - ask the resource's own service
+        return {ocid: True if ocid in found else self.lookup(ocid) for ocid in ocids}
+
+    def lookup(self, ocid: str):
+        """fallback(ocid) - None if it fails"""
+
+        with self.lock:
+            self.lookups += 1
+        try:
+            return self.fallback(ocid)
+        except Exception as exc:
+            logger.warning(f"Unable to determine {ocid}: {exc}")
+            return None
+
+    def validate(self, ocids, progress=None) -> dict:
+        """{ocid: exists} for every distinct OCID in ocids.  progress (a Progress) counts the batches and lookups"""
+
+        tic = time.perf_counter()
+        self.searches = self.lookups = 0
+        distinct = list(dict.fromkeys(ocids))
+        batches, single = self.batches(distinct)
+        logger.info(f"Checking {len(distinct)} distinct OCIDs: {len(batches)} search batches, {len(single)} single lookups")
+
+        results = {}
+        if progress:
+            progress.set_to_load(len(batches) + len(single))
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="validate") as executor:
+            futures = [executor.submit(self.search, region, batch) for region, batch in batches]
+            futures += [executor.submit(lambda ocid: {ocid: self.lookup(ocid)}, ocid) for ocid in single]
+            if progress:
+                for future in futures:
+                    future.add_done_callback(progress.progress_indicator)
+            for future in futures:
+                try:
+                    results.update(future.result())
+                except Exception as exc:
+                    logger.error(f"Validation failed: {exc}")
+
+        # Anything that couldn't be determined is treated as valid - only report what is known to be gone
+        self.unchecked = {ocid for ocid in distinct if results.get(ocid) is None}
+        valid = {ocid: results.get(ocid) is not False for ocid in distinct}
+        self.last = ValidationSummary(len(distinct), sum(not v for v in valid.values()), self.searches, self.lookups,
+                                      time.perf_counter() - tic)
+        logger.info(self.last.describe())
+        return valid
@@ -16,23 +16,30 @@
 # are located, and then you use the filtering commands to retrieve what you want.
 # Please look at the argument parsing section or run with --help to see what is possible
 
-from oci import config
-from oci.identity import IdentityClient
-from oci.identity.models import Compartment
-from oci import loggingingestion
-from oci import pagination
-from oci.retry import DEFAULT_RETRY_STRATEGY
-from oci.exceptions import ConfigFileNotFound
-
-from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
-from oci.loggingingestion.models import PutLogsDetails, LogEntry, LogEntryBatch
+# The OCI SDK is imported where clients are made (oci_clients) - a query of the cache (-q) doesn't import it at all
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from oci.identity import IdentityClient
+    from oci.identity.models import Compartment
+    from oci.resource_search import ResourceSearchClient
+
+from oci_compartment_tree import CompartmentTree
+from oci_json_writer import FORMATS as JSON_FORMATS, RecordWriter, output_name
+from oci_log_shipper import LogShipper, WORKERS as LOG_WORKERS
+from oci_policy_discovery import policy_compartment_ids, stream_compartments, submit_pipelined
+from oci_policy_crawler import AsyncIdentityCrawler, CONCURRENCY
+from oci_policy_parser import StatementParser
+from oci_policy_store import StatementStore, StatementSummary
+from oci_policy_query import SUMMARY_FILTER_COLUMNS, StatementQuery
+from oci_policy_index import TrigramIndex
+from oci_policy_snapshot import dump_json, load_json, load_table, open_snapshot, write_snapshot
 
 import argparse
-import json
+import configparser
+import glob
 import os
-import datetime
-import uuid
 import logging
+from threading import Lock
 from concurrent.futures import ThreadPoolExecutor
 
 # Define Logger for module
@@ -41,11 +48,19 @@ logger = logging.getLogger('oci-policy-analysis')
 
 # Global
 global identity_client
+global compartment_tree
+
+# Policies listed while compartment pages are still streaming (paths not resolvable yet)
+deferred_lock = Lock()
+deferred_policies = []
+
+# Shared statement parser - identical statement texts are parsed once
+statement_parser = StatementParser()
 
-# Lists
-dynamic_group_statements = []
-service_statements = []
-regular_statements = []
+# Lists (compact records, indexable like the tuples)
+dynamic_group_statements = StatementStore(StatementSummary)
+service_statements = StatementStore(StatementSummary)
+regular_statements = StatementStore(StatementSummary)
 special_statements = []
 
 ########################################
@@ -58,59 +73,18 @@ def print_statement(statement_tuple):
 
 
 def parse_statement(statement, comp_string, policy):
-    # Parse tuple and partition
-    # (subject, verb, resource, location, condition)
-    # Pass 1 - where condition
-    # Pass 2 - group subject
-    # Pass 3 - location
-    # Pass 4 - verb and resource
-    pass1 = statement.casefold().partition(" where ")
-    condition = pass1[2]
-    pass2a = pass1[0].partition("allow ")
-    pass2b = pass2a[2].partition(" to ")
-    subject = pass2b[0]
-    pass3 = pass2b[2].partition(" in ")
-    location = pass3[2]
-    pass4 = pass3[0].partition(" ")
-    verb = pass4[0]
-    resource = pass4[2]
-
-    # Location Update
-    # If compartment name, use hierarchy, if id then leave alone
-    if "compartment id" in location:
-        pass
-    elif "tenancy" in location:
-        pass
-    else:
-        sub_comp = location.partition("compartment ")[2]
-        if comp_string == "":
-            # if root, then leave compartment alone
-            # location = f"compartment {comp_name}"
-            pass
-        else:
-            location = f"compartment {comp_string}:{sub_comp}"
+    # Tuple of (subject, verb, resource, location, condition) plus lineage
+    # The parse itself is shared by every occurrence of the same statement text
+    return statement_parser.statement_tuple(statement=statement, comp_string=comp_string, policy=policy)
 
-    # Build tuple based on modified location
-    statement_tuple = (subject, verb, resource, location, condition,
-                       f"{comp_string}", policy.name, policy.id, policy.compartment_id, statement)
-    return statement_tuple
-
-# Recursive Compartments / Policies
-def get_compartment_path(compartment: Compartment, level, comp_string) -> str:
-
-    # Top level forces fall back through
-    logger.debug(f"Compartment Name: {compartment.name} ID: {compartment.id} Parent: {compartment.compartment_id}") 
-    if not compartment.compartment_id:
-        logger.debug(f"Top of tree. Path is {comp_string}")
-        return comp_string
-    parent_compartment = identity_client.get_compartment(compartment_id=compartment.compartment_id).data    
-
-    # Recurse until we get to top
-    logger.debug(f"Recurse. Path is {comp_string}")
-    return get_compartment_path(parent_compartment, level+1, compartment.name + "/" + comp_string)
+# Compartment path from the tree index (no API calls)
+def get_compartment_path(compartment: "Compartment") -> str:
+    path = compartment_tree.path(compartment.id)
+    logger.debug(f"Compartment Name: {compartment.name} ID: {compartment.id} Path: {path}")
+    return path
 
 # Threadable policy loader - per compartment
-def load_policies(compartment: Compartment):
+def load_policies(compartment: "Compartment"):
     logger.debug(f"Compartment: {compartment.id}")
 
     # Get policies First
@@ -124,12 +98,22 @@ def load_policies(compartment: Compartment):
     if len(list_policies_response) == 0:
         logger.debug("No policies. return")
         return
-    
+
+    # While compartment pages are still arriving the tree can't resolve paths - park until it is complete
+    with deferred_lock:
+        if not compartment_tree.ready.is_set():
+            deferred_policies.append((compartment, list_policies_response))
+            return
+
+    parse_policies(compartment, list_policies_response)
+
+# Parse the policies of one compartment into the lists
+def parse_policies(compartment: "Compartment", policies: list):
     # Load recursive structure of path (only if there are policies)
-    path = get_compartment_path(compartment, 0, "")
+    path = get_compartment_path(compartment)
     logger.debug(f"Compartment Path: {path}")
 
-    for policy in list_policies_response:
+    for policy in policies:
         logger.debug(f"() Policy: {policy.name} ID: {policy.id}")
         for index, statement in enumerate(policy.statements, start=1):
             logger.debug(f"-- Statement {index}: {statement}")
@@ -164,13 +148,24 @@ def load_policies(compartment: Compartment):
                 regular_statements.append(statement_tuple)
     logger.debug(f"confused")
 
+# Parse every statement of the policies on a process pool, so parse_policies finds them in the parser cache
+def parse_ahead(policy_lists, workers: int):
+    if workers > 1:
+        statement_parser.parse_bulk([statement for policies in policy_lists for policy in policies for statement in policy.statements],
+                                    workers=workers)
+
 # Load the policies (main function)
-def load_policy_analysis(id_client:IdentityClient, tenancy_ocid: str, recursion: bool, threads:int):
+def load_policy_analysis(id_client:"IdentityClient", tenancy_ocid: str, recursion: bool, threads:int, search_client:"ResourceSearchClient"=None,
+                         engine: str = "thread", concurrency: int = CONCURRENCY, parse_workers: int = 1):
     # Requirements
     # Logger (should be set somewhere)
     # IdentityClient
          # If set from main() it is ok, otherwise take from function call
+    # ResourceSearchClient (optional) - only list policies in compartments that Search says have them
+    # engine - "thread" (executor with threads) or "async" (asyncio crawler with concurrency requests in flight)
+    # parse_workers - processes for parsing the statements listed in bulk (async engine, deferred compartments)
     global identity_client
+    global compartment_tree
     identity_client = id_client
     logger.info(f"---Starting Policy Load---")
 
@@ -182,29 +177,106 @@ def load_policy_analysis(id_client:IdentityClient, tenancy_ocid: str, recursion:
     root_comp = identity_client.get_compartment(compartment_id=tenancy_ocid).data 
     comp_list.append(root_comp)
 
-    if recursion:
-        # Get all compartments (we don't know the depth of any), tenancy level
-        # Using the paging API
-        paginated_response = pagination.list_call_get_all_results(
-            identity_client.list_compartments,
-            tenancy_ocid,
-            access_level="ACCESSIBLE",
-            sort_order="ASC",
-            compartment_id_in_subtree=True,
-            lifecycle_state="ACTIVE",
-            limit=1000)
-        comp_list.extend(paginated_response.data)
-
-    logger.info(f'Loaded {len(comp_list)} Compartments.  {"Using recursion" if recursion else "No Recursion, only root-level policies"}')
+    # Index the hierarchy once - paths come from here rather than a get_compartment per ancestor
+    compartment_tree = CompartmentTree(fetch_compartment=lambda ocid: identity_client.get_compartment(compartment_id=ocid).data)
+    compartment_tree.add(root_comp)
+
+    # Discovery via Resource Search (None falls back to every compartment)
+    search_ids = policy_compartment_ids(search_client, tenancy_ocid) if search_client else None
+
+    if engine == "async":
+        # One event loop does the listing and every list_policies - then parse as the thread engine would
+        crawler = AsyncIdentityCrawler(identity_client, concurrency=concurrency)
+        comp_list, policies_by_compartment = crawler.run(tenancy_ocid=tenancy_ocid, recursion=recursion, only=search_ids)
+        compartment_tree = CompartmentTree(comp_list, fetch_compartment=lambda ocid: identity_client.get_compartment(compartment_id=ocid).data)
+        logger.info(f'Loaded {len(comp_list)} Compartments with {concurrency} concurrent requests.  {"Using recursion" if recursion else "No Recursion, only root-level policies"}')
+        parse_ahead(policies_by_compartment.values(), parse_workers)
+        for c in comp_list:
+            if policies_by_compartment.get(c.id):
+                parse_policies(c, policies_by_compartment[c.id])
+        logger.info(f"Statement parse cache: {statement_parser.cache_info()}")
+        logger.info(f"---Finished Policy Load---")
+        return
+
+    # Compartments are yielded page by page as they are listed (we don't know the depth of any)
+    def compartments_to_load():
+        if search_ids is None or root_comp.id in search_ids:
+            yield root_comp
+        if not recursion:
+            return
+        for c in stream_compartments(identity_client, tenancy_ocid):
+            comp_list.append(c)
+            compartment_tree.add(c)
+            if search_ids is None or c.id in search_ids:
+                yield c
+
     with ThreadPoolExecutor(max_workers = threads, thread_name_prefix="thread") as executor:
-        results = executor.map(load_policies, comp_list)
         logger.info(f"Kicked off {threads} threads for parallel execution - adjust as necessary")
+        results = submit_pipelined(executor, load_policies, compartments_to_load(), max_pending=threads * 4)
+        logger.info(f'Loaded {len(comp_list)} Compartments, {len(results)} to load.  {"Using recursion" if recursion else "No Recursion, only root-level policies"}')
+
+        # Listing is done - resolve the tree and parse whatever was parked meanwhile
+        with deferred_lock:
+            compartment_tree.complete()
+            deferred = deferred_policies[:]
+            deferred_policies.clear()
+        parse_ahead((policies for _, policies in deferred), parse_workers)
+        for c, policies in deferred:
+            parse_policies(c, policies)
     for res in results:
-        logger.debug(f"Result: {res}")
+        logger.debug(f"Result: {res.result()}")
+    logger.info(f"Statement parse cache: {statement_parser.cache_info()}")
     logger.info(f"---Finished Policy Load---")
 
 
 
+# Tenancy OCID of a config file profile - read without the SDK (profiles inherit DEFAULT, as in the SDK)
+def config_tenancy(profile: str):
+    path = os.path.expanduser(os.environ.get("OCI_CONFIG_FILE", os.path.join("~", ".oci", "config")))
+    config_file = configparser.ConfigParser(interpolation=None)
+    if not config_file.read(path):
+        return None
+    if profile != "DEFAULT" and not config_file.has_section(profile):
+        return None
+    return config_file.get(profile, "tenancy", fallback=None)
+
+# Tenancy of the only script snapshot in this directory (None if there isn't exactly one)
+def snapshot_tenancy():
+    snapshots = glob.glob(".policy-snapshot-*.dat")
+    return snapshots[0][len(".policy-snapshot-"):-len(".dat")] if len(snapshots) == 1 else None
+
+# Imports the SDK and makes the clients - (tenancy OCID, identity, logging (if log_ocid), search (if use_search))
+def oci_clients(profile: str, use_instance_principals: bool, use_search: bool, log_ocid: str = None):
+    from oci import config, loggingingestion
+    from oci.identity import IdentityClient
+    from oci.resource_search import ResourceSearchClient
+    from oci.retry import DEFAULT_RETRY_STRATEGY
+    from oci.exceptions import ConfigFileNotFound
+    from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
+
+    if use_instance_principals:
+        logger.info("Using Instance Principal Authentication")
+        signer = InstancePrincipalsSecurityTokenSigner()
+        identity_client = IdentityClient(config={}, signer=signer, retry_strategy=DEFAULT_RETRY_STRATEGY)
+        loggingingestion_client = loggingingestion.LoggingClient(config={}, signer=signer) if log_ocid else None
+        search_client = ResourceSearchClient(config={}, signer=signer, retry_strategy=DEFAULT_RETRY_STRATEGY) if use_search else None
+        return signer.tenancy_id, identity_client, loggingingestion_client, search_client
+
+    # Use a profile (must be defined)
+    logger.info(f"Using Profile Authentication: {profile}")
+    try:
+        oci_config = config.from_file(profile_name=profile)
+        logger.info(f'Using tenancy OCID from profile: {oci_config["tenancy"]}')
+
+        # Create the OCI Client to use
+        identity_client = IdentityClient(oci_config, retry_strategy=DEFAULT_RETRY_STRATEGY)
+        loggingingestion_client = loggingingestion.LoggingClient(oci_config) if log_ocid else None
+        search_client = ResourceSearchClient(oci_config, retry_strategy=DEFAULT_RETRY_STRATEGY) if use_search else None
+        return oci_config["tenancy"], identity_client, loggingingestion_client, search_client
+    except ConfigFileNotFound as exc:
+        logger.fatal(f"Unable to use Profile Authentication: {exc}")
+        exit(1)
+
 ########################################
 # Main Code
 # Pre-and Post-processing
@@ -222,10 +294,20 @@ if __name__ == "__main__":
     parser.add_argument("-lf", "--locationfilter", help="Filter all location (eg compartment name) subjects by this text")
     parser.add_argument("-r", "--recurse", help="Recursion or not (default True)", action="store_true")
     parser.add_argument("-c", "--usecache", help="Load from local cache (if it exists)", action="store_true")
+    parser.add_argument("-q", "--query", help="Query the local cache only - no OCI clients or SDK import, nothing rewritten", action="store_true")
+    parser.add_argument("-tn", "--tenancy", help="Tenancy OCID of the cache for -q (def: from the profile, or the only cache here)")
     parser.add_argument("-w", "--writejson", help="Write filtered output to JSON", action="store_true")
+    parser.add_argument("-jf", "--jsonformat", help="Output of -w - one statement per line or a JSON array (def=ndjson)", choices=JSON_FORMATS, default="ndjson")
     parser.add_argument("-ip", "--instanceprincipal", help="Use Instance Principal Auth - negates --profile", action="store_true")
     parser.add_argument("-lo", "--logocid", help="Use an OCI Log - provide OCID")
+    parser.add_argument("-lw", "--logworkers", help=f"Concurrent uploads to the OCI Log (def={LOG_WORKERS})", type=int, default=LOG_WORKERS)
     parser.add_argument("-t", "--threads", help="Concurrent Threads (def=5)", type=int, default=1)
+    parser.add_argument("-e", "--engine", help="Load engine - thread pool or asyncio crawler (def=thread)", choices=["thread", "async"], default="thread")
+    parser.add_argument("-cc", "--concurrency", help=f"Requests in flight for the async engine (def={CONCURRENCY})", type=int, default=CONCURRENCY)
+    parser.add_argument("-s", "--search", help="Discover policies with Resource Search and only list compartments that have them", action="store_true")
+    parser.add_argument("-j", "--jsoncache", help="Also write the JSON cache files (the cache is a binary snapshot)", action="store_true")
+    parser.add_argument("-x", "--index", help="Filter through a trigram index saved next to the cache (pays off with -c)", action="store_true")
+    parser.add_argument("-pw", "--parseworkers", help="Processes for parsing large loads in bulk (def=1, parse in the load threads)", type=int, default=1)
     args = parser.parse_args()
     verbose = args.verbose
     use_cache = args.usecache
@@ -239,6 +321,11 @@ if __name__ == "__main__":
     recursion = args.recurse
     write_json_output = args.writejson
     use_instance_principals = args.instanceprincipal
+    use_search = args.search
+    use_index = args.index
+    write_json_cache = args.jsoncache
+    engine = args.engine
+    concurrency = args.concurrency
     log_ocid = None if not args.logocid else args.logocid
 
     # Update Logging Level
@@ -248,191 +335,136 @@ if __name__ == "__main__":
 
     logger.info(f'Using profile {profile} with Logging level {"DEBUG" if verbose else "INFO"}')
 
-    if use_instance_principals:
-        logger.info("Using Instance Principal Authentication")
-        signer = InstancePrincipalsSecurityTokenSigner()
-        identity_client = IdentityClient(config={}, signer=signer, retry_strategy=DEFAULT_RETRY_STRATEGY)
-        loggingingestion_client = loggingingestion.LoggingClient(config={}, signer=signer)
-        tenancy_ocid = signer.tenancy_id
-    else:
-        # Use a profile (must be defined)
-        logger.info(f"Using Profile Authentication: {profile}")
-        try:
-            config = config.from_file(profile_name=profile)
-            logger.info(f'Using tenancy OCID from profile: {config["tenancy"]}')
-            tenancy_ocid = config["tenancy"]
-
-            # Create the OCI Client to use
-            identity_client = IdentityClient(config, retry_strategy=DEFAULT_RETRY_STRATEGY)
-            loggingingestion_client = loggingingestion.LoggingClient(config)
-        except ConfigFileNotFound as exc:
-            logger.fatal(f"Unable to use Profile Authentication: {exc}")
+    # Query mode - the cache is read as is, and clients are only made for a log upload
+    query_only = args.query
+    if query_only:
+        use_cache = True
+        write_json_cache = False
+        tenancy_ocid = args.tenancy or (None if use_instance_principals else config_tenancy(profile)) or snapshot_tenancy()
+        if not tenancy_ocid:
+            logger.fatal("No tenancy for -q: pass --tenancy, or use a profile with a tenancy, or keep one cache in this directory")
             exit(1)
+        loggingingestion_client = oci_clients(profile, use_instance_principals, False, log_ocid)[2] if log_ocid else None
+    else:
+        tenancy_ocid, identity_client, loggingingestion_client, search_client = oci_clients(profile, use_instance_principals, use_search, log_ocid)
 
-    # Load from cache (if exists)
+    # Load from cache (if exists) - the snapshot, else the JSON cache files of older versions
+    snapshot_path = f'.policy-snapshot-{tenancy_ocid}.dat'
+    snapshot = None
     if use_cache:
         logger.info("Loading Policy statements from cache")
 
-        if os.path.isfile(f'./.policy-special-cache-{tenancy_ocid}.dat'):
-            with open(f'./.policy-special-cache-{tenancy_ocid}.dat', 'r') as filehandle:
-                special_statements = json.load(filehandle)
-        if os.path.isfile(f'./.policy-dg-cache-{tenancy_ocid}.dat'):
-            with open(f'./.policy-dg-cache-{tenancy_ocid}.dat', 'r') as filehandle:
-                dynamic_group_statements = json.load(filehandle)
-        if os.path.isfile(f'.policy-svc-cache-{tenancy_ocid}.dat'):
-            with open(f'./.policy-svc-cache-{tenancy_ocid}.dat', 'r') as filehandle:
-                service_statements = json.load(filehandle)
-        if os.path.isfile(f'.policy-statement-cache-{tenancy_ocid}.dat'):
-            with open(f'./.policy-statement-cache-{tenancy_ocid}.dat', 'r') as filehandle:
-                regular_statements = json.load(filehandle)
+        snapshot = open_snapshot(snapshot_path, tenancy_ocid)
+        if snapshot:
+            special_statements = load_table(snapshot, "special") or []
+            dynamic_group_statements = load_table(snapshot, "dg", StatementSummary) or StatementStore(StatementSummary)
+            service_statements = load_table(snapshot, "svc", StatementSummary) or StatementStore(StatementSummary)
+            regular_statements = load_table(snapshot, "statement", StatementSummary) or StatementStore(StatementSummary)
+        else:
+            special_statements = load_json(f'./.policy-special-cache-{tenancy_ocid}.dat') or []
+            dynamic_group_statements = StatementStore(StatementSummary, load_json(f'./.policy-dg-cache-{tenancy_ocid}.dat'))
+            service_statements = StatementStore(StatementSummary, load_json(f'./.policy-svc-cache-{tenancy_ocid}.dat'))
+            regular_statements = StatementStore(StatementSummary, load_json(f'./.policy-statement-cache-{tenancy_ocid}.dat'))
+            if query_only and not os.path.isfile(f'./.policy-statement-cache-{tenancy_ocid}.dat'):
+                logger.fatal(f"No cache for tenancy {tenancy_ocid} in {os.getcwd()} - load it without -q first")
+                exit(1)
     else:
         # Call using function that is designed as a module function to be called from outside of this code
         load_policy_analysis(id_client=identity_client,
                              tenancy_ocid=tenancy_ocid,
                              recursion=recursion,
-                             threads=threads)
-
-
-    # Write to local cache (per type)
-    with open(f'.policy-special-cache-{tenancy_ocid}.dat', 'w') as filehandle:
-        json.dump(special_statements, filehandle)
-    with open(f'.policy-dg-cache-{tenancy_ocid}.dat', 'w') as filehandle:
-        json.dump(dynamic_group_statements, filehandle)
-    with open(f'.policy-svc-cache-{tenancy_ocid}.dat', 'w') as filehandle:
-        json.dump(service_statements, filehandle)
-    with open(f'.policy-statement-cache-{tenancy_ocid}.dat', 'w') as filehandle:
-        json.dump(regular_statements, filehandle)
-
-    # Perform Filtering
-    if sub_filter:
-        logger.info(f"Filtering subject: {sub_filter}. Before: {len(dynamic_group_statements)}/{len(service_statements)}/{len(regular_statements)} DG/SVC/Reg statements")
-        dynamic_group_statements = list(filter(lambda statement: sub_filter.casefold() in statement[0].casefold(), dynamic_group_statements))
-        service_statements = list(filter(lambda statement: sub_filter.casefold() in statement[0].casefold(), service_statements))
-        regular_statements = list(filter(lambda statement: sub_filter.casefold() in statement[0].casefold(), regular_statements))
+                             threads=threads,
+                             search_client=search_client,
+                             engine=engine,
+                             concurrency=concurrency,
+                             parse_workers=args.parseworkers)
+
+
+    # Write to local cache (unless it was just read from the snapshot, or this is a query)
+    if not snapshot and not query_only:
+        write_snapshot(snapshot_path, tenancy_ocid, {"special": special_statements,
+                                                     "dg": (dynamic_group_statements, SUMMARY_FILTER_COLUMNS.values()),
+                                                     "svc": (service_statements, SUMMARY_FILTER_COLUMNS.values()),
+                                                     "statement": (regular_statements, SUMMARY_FILTER_COLUMNS.values())})
+    if write_json_cache:
+        dump_json(f'.policy-special-cache-{tenancy_ocid}.dat', special_statements)
+        dump_json(f'.policy-dg-cache-{tenancy_ocid}.dat', dynamic_group_statements)
+        dump_json(f'.policy-svc-cache-{tenancy_ocid}.dat', service_statements)
+        dump_json(f'.policy-statement-cache-{tenancy_ocid}.dat', regular_statements)
+
+    # Perform Filtering - all filters in one query per statement type (through the trigram index if asked)
+    query = StatementQuery(SUMMARY_FILTER_COLUMNS, separator=None, subject=sub_filter, verb=verb_filter,
+                           resource=resource_filter, location=location_filter)
+    if query.clauses:
+        logger.info(f"Filtering {query}. Before: {len(dynamic_group_statements)}/{len(service_statements)}/{len(regular_statements)} DG/SVC/Reg statements")
+        indexes = {}
+        if use_index:
+            for kind, store in (("dg", dynamic_group_statements), ("svc", service_statements), ("statement", regular_statements)):
+                indexes[kind] = TrigramIndex.load_or_build(f'.policy-{kind}-index-{tenancy_ocid}.dat', store, SUMMARY_FILTER_COLUMNS.values(),
+                                                           save=not query_only)
+        dynamic_group_statements = query.run(dynamic_group_statements, indexes.get("dg"))
+        service_statements = query.run(service_statements, indexes.get("svc"))
+        regular_statements = query.run(regular_statements, indexes.get("statement"))
         logger.info(f"After: {len(dynamic_group_statements)}/{len(service_statements)}/{len(regular_statements)} DG/SVC/Reg statements")
 
-    if verb_filter:
-        logger.info(f"Filtering verb: {verb_filter}. Before: {len(dynamic_group_statements)}/{len(service_statements)}/{len(regular_statements)} DG/SVC/Reg statements")
-        dynamic_group_statements = list(filter(lambda statement: verb_filter.casefold() in statement[1].casefold(), dynamic_group_statements))
-        service_statements = list(filter(lambda statement: verb_filter.casefold() in statement[1].casefold(), service_statements))
-        regular_statements = list(filter(lambda statement: verb_filter.casefold() in statement[1].casefold(), regular_statements))
-        logger.info(f"After: {len(dynamic_group_statements)}/{len(service_statements)}/{len(regular_statements)} DG/SVC/Reg statements")
-
-    if resource_filter:
-        logger.info(f"Filtering resource: {resource_filter}. Before: {len(dynamic_group_statements)}/{len(service_statements)}/{len(regular_statements)} DG/SVC/Reg statements")
-        dynamic_group_statements = list(filter(lambda statement: resource_filter.casefold() in statement[2].casefold(), dynamic_group_statements))
-        service_statements = list(filter(lambda statement: resource_filter.casefold() in statement[2].casefold(), service_statements))
-        regular_statements = list(filter(lambda statement: resource_filter.casefold() in statement[2].casefold(), regular_statements))
-        logger.info(f"After: {len(dynamic_group_statements)}/{len(service_statements)}/{len(regular_statements)} DG/SVC/Reg statements")
-
-    if location_filter:
-        logger.info(f"Filtering location: {location_filter}. Before: {len(dynamic_group_statements)}/{len(service_statements)}/{len(regular_statements)} DG/SVC/Reg statements")
-        dynamic_group_statements = list(filter(lambda statement: location_filter.casefold() in statement[3].casefold(), dynamic_group_statements))
-        service_statements = list(filter(lambda statement: location_filter.casefold() in statement[3].casefold(), service_statements))
-        regular_statements = list(filter(lambda statement: location_filter.casefold() in statement[3].casefold(), regular_statements))
-        logger.info(f"After: {len(dynamic_group_statements)}/{len(service_statements)}/{len(regular_statements)} DG/SVC/Reg statements")
+    # Ship to OCI Logging while printing - requests are uploaded as they fill
+    shipper = LogShipper(loggingingestion_client, log_ocid, workers=args.logworkers) if log_ocid else None
 
     # Print Special
-    entries = []
     logger.info("========Summary Special==============")
     for index, statement in enumerate(special_statements, start=1):
         logger.info(f"Statement #{index}: {statement[0]} | Policy: {statement[2]}")
-        entries.append(LogEntry(id=str(uuid.uuid1()),
-                                data=f"Statement #{index}: {statement}"))
+        if shipper:
+            shipper.add("special-statement", f"Statement #{index}: {statement}")
     logger.info(f"Total Special statement in tenancy: {len(special_statements)}")
 
-    # Create Log Batch
-    special_batch = LogEntryBatch(defaultlogentrytime=datetime.datetime.utcnow(),
-                                  source="oci-policy-analysis",
-                                  type="special-statement",
-                                  entries=entries)
-
     # Print Dynamic Groups
-    entries = []
     logger.info("========Summary DG==============")
     for index, statement in enumerate(dynamic_group_statements, start=1):
         logger.info(f"Statement #{index}: {statement[9]} | Policy: {statement[5]}/{statement[6]}")
-        entries.append(LogEntry(id=str(uuid.uuid1()),
-                                data=f"Statement #{index}: {statement[9]} | Policy: {statement[5]}/{statement[6]}"))
+        if shipper:
+            shipper.add("dynamic-group-statement", f"Statement #{index}: {statement[9]} | Policy: {statement[5]}/{statement[6]}")
     logger.info(f"Total Service statement in tenancy: {len(dynamic_group_statements)}")
 
-    # Create Log Batch
-    dg_batch = LogEntryBatch(defaultlogentrytime=datetime.datetime.utcnow(),
-                             source="oci-policy-analysis",
-                             type="dynamic-group-statement",
-                             entries=entries)
-
     # Print Service
-    entries = []
     logger.info("========Summary SVC==============")
     for index, statement in enumerate(service_statements, start=1):
         logger.info(f"Statement #{index}: {statement[9]} | Policy: {statement[5]}/{statement[6]}")
-        entries.append(LogEntry(id=str(uuid.uuid1()),
-                                data=f"Statement #{index}: {statement[9]} | Policy: {statement[5]}/{statement[6]}"))
+        if shipper:
+            shipper.add("service-statement", f"Statement #{index}: {statement[9]} | Policy: {statement[5]}/{statement[6]}")
     logger.info(f"Total Service statement in tenancy: {len(service_statements)}")
 
-    # Create Log Batch
-    service_batch = LogEntryBatch(defaultlogentrytime=datetime.datetime.utcnow(),
-                                  source="oci-policy-analysis",
-                                  type="service-statement",
-                                  entries=entries)
-
     # Print Regular
-    entries = []
     logger.info("========Summary Reg==============")
     for index, statement in enumerate(regular_statements, start=1):
         logger.info(f"Statement #{index}: {statement[9]} | Policy: {statement[5]}{statement[6]}")
-        entries.append(LogEntry(id=str(uuid.uuid1()),
-                                data=f"Statement #{index}: {statement[9]} | Policy: {statement[5]}{statement[6]}"))
+        if shipper:
+            shipper.add("regular-statement", f"Statement #{index}: {statement[9]} | Policy: {statement[5]}{statement[6]}")
     logger.info(f"Total Regular statements in tenancy: {len(regular_statements)}")
 
-    # Create Log Batch
-    regular_batch = LogEntryBatch(defaultlogentrytime=datetime.datetime.now(datetime.timezone.utc),
-                                  source="oci-policy-analysis",
-                                  type="regular-statement",
-                                  entries=entries)
-
-    # Write batches to OCI Logging
-    if log_ocid:
-        put_logs_response = loggingingestion_client.put_logs(
-            log_id=log_ocid,
-            put_logs_details=PutLogsDetails(
-                specversion="1.0",
-                log_entry_batches=[special_batch, dg_batch, service_batch, regular_batch]
-            )
-        )
+    # Wait for the last uploads (the summary is logged with throughput and rejected entries)
+    if shipper:
+        shipper.close()
 
-    # To output file if required
+    # To output file if required - one record at a time
     if write_json_output:
-        # Empty Dictionary
-        statements_list = []
-        for i, s in enumerate(special_statements):
-            statements_list.append({"type": "special", "statement": s[0],
-                                    "lineage": {"policy-compartment-ocid": s[4], "policy-relative-hierarchy": s[1],
-                                                "policy-name": s[2], "policy-ocid": s[3]}
-                                    })
-        for i, s in enumerate(dynamic_group_statements):
-            statements_list.append({"type": "dynamic-group", "subject": s[0], "verb": s[1],
-                                    "resource": s[2], "location": s[3], "conditions": s[4],
-                                    "lineage": {"policy-compartment-ocid": s[8], "policy-relative-hierarchy": s[5],
-                                                "policy-name": s[6], "policy-ocid": s[7], "policy-text": s[9]}
-                                    })
-        for i, s in enumerate(service_statements):
-            statements_list.append({"type": "service", "subject": s[0], "verb": s[1],
-                                    "resource": s[2], "location": s[3], "conditions": s[4],
-                                    "lineage": {"policy-compartment-ocid": s[8], "policy-relative-hierarchy": s[5],
-                                                "policy-name": s[6], "policy-ocid": s[7], "policy-text": s[9]}
-                                    })
-        for i, s in enumerate(regular_statements):
-            statements_list.append({"type": "regular", "subject": s[0], "verb": s[1],
-                                    "resource": s[2], "location": s[3], "conditions": s[4],
-                                    "lineage": {"policy-compartment-ocid": s[8], "policy-relative-hierarchy": s[5],
-                                                "policy-name": s[6], "policy-ocid": s[7], "policy-text": s[9]}
-                                    })
-        # Serializing json
-        json_object = json.dumps(statements_list, indent=2)
-
-        # Writing to sample.json
-        with open(f"policyoutput-{tenancy_ocid}.json", "w") as outfile:
-            outfile.write(json_object)
+        def output_records():
+            for s in special_statements:
+                yield {"type": "special", "statement": s[0],
+                       "lineage": {"policy-compartment-ocid": s[4], "policy-relative-hierarchy": s[1],
+                                   "policy-name": s[2], "policy-ocid": s[3]}
+                       }
+            for statement_type, statements in (("dynamic-group", dynamic_group_statements), ("service", service_statements),
+                                               ("regular", regular_statements)):
+                for s in statements:
+                    yield {"type": statement_type, "subject": s[0], "verb": s[1],
+                           "resource": s[2], "location": s[3], "conditions": s[4],
+                           "lineage": {"policy-compartment-ocid": s[8], "policy-relative-hierarchy": s[5],
+                                       "policy-name": s[6], "policy-ocid": s[7], "policy-text": s[9]}
+                           }
+
+        output_file = output_name(f"policyoutput-{tenancy_ocid}", args.jsonformat)
+        with RecordWriter(output_file, args.jsonformat) as writer:
+            writer.write_all(output_records())
+        logger.info(f"Wrote {writer.count} statements to {output_file}")
     logger.debug(f"-----Complete--------")
\ No newline at end of file
@@ -0,0 +1,324 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Evaluator for the "where" part of policy statements (UI field 13, script field 4).
+# Grammar (case-insensitive, as OCI compares):
+#   condition  := all{condition, ...} | any{condition, ...} | comparison
+#   comparison := variable (= | !=) operand | variable in (operand, ...) | variable (before | after) operand
+#               | variable between operand and operand
+#   operand    := 'string' | "string" | /pattern*/ | request.x / target.x variable | bare word
+# Variables are request.* and target.* names, tags included (target.resource.tag.ns.key,
+# request.principal.group.tag.ns.key ...).  A condition is compiled once per distinct text into a closure over a
+# request context - a dict of variable -> value, or a collection of values for multi-valued variables (groups, tags).
+# As in OCI, a comparison on a variable the context doesn't have is false.  Times compare as strings (ISO 8601).
+# what_if() evaluates the conditions of many statements against a batch of contexts.
+#
+#   python3 oci_policy_conditions.py <tenancy OCID> --set target.resource.tag.ns.key=prod --set request.region=phx
+
+import argparse
+import functools
+import logging
+import os
+import re
+
+logger = logging.getLogger('oci-policy-conditions')
+
+# Distinct condition texts kept compiled
+CACHE_SIZE = 65536
+
+VARIABLE_PREFIXES = ("request.", "target.")
+
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<comment>//.*)
+      | (?P<string>'[^']*'|"[^"]*")
+      | (?P<pattern>/[^/\s]*/)
+      | (?P<operator>!=|=)
+      | (?P<punctuation>[{}(),])
+      | (?P<word>[^\s{}(),='"!]+)
+    )""", re.VERBOSE | re.DOTALL)
+
+
+class ConditionError(ValueError):
+    """Condition text the grammar doesn't accept"""
+
+    def __init__(self, text: str, message: str):
+        super().__init__(f"{message}: {text}")
+        self.text = text
+
+
+def tokenize(text: str) -> list:
+    """(kind, value) tokens - a // comment ends the condition"""
+
+    tokens, position = [], 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if not match or match.end() == position:
+            raise ConditionError(text, f"Unexpected character at {position}")
+        position = match.end()
+        kind = match.lastgroup
+        if kind == "comment":
+            break
+        tokens.append((kind, match.group(kind)))
+    return tokens
+
+
+def context_of(values: dict) -> dict:
+    """Request context as compiled conditions read it - casefolded names and strings, collections as frozensets"""
+
+    context = {}
+    for name, value in values.items():
+        if isinstance(value, (list, tuple, set, frozenset)):
+            value = frozenset(str(item).casefold() for item in value)
+        elif value is not None:
+            value = str(value).casefold()
+        context[name.casefold()] = value
+    return context
+
+
+def parse_settings(settings: list) -> dict:
+    """Context from "variable=value" strings - a variable given more than once is multi-valued"""
+
+    context = {}
+    for setting in settings:
+        name, _, value = setting.partition("=")
+        context.setdefault(name.strip(), []).append(value.strip())
+    return {name: values[0] if len(values) == 1 else values for name, values in context.items()}
+
+
+class Parser:
+    """Recursive descent over the tokens of one condition, building closures"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.position = 0
+        self.variables = set()
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, kind: str = None, value: str = None):
+        token = self.peek()
+        if token[0] is None or (kind and token[0] != kind) or (value and token[1].casefold() != value):
+            raise ConditionError(self.text, f"Expected {value or kind or 'more'} at token {self.position}, found {token[1] or 'the end'}")
+        self.position += 1
+        return token
+
+    def parse(self):
+        check = self.condition()
+        if self.position != len(self.tokens):
+            raise ConditionError(self.text, f"Unexpected {self.peek()[1]} after the condition")
+        return check
+
+    def condition(self):
+        kind, value = self.peek()
+        if kind == "word" and value.casefold() in ("all", "any") and self.tokens[self.position + 1:self.position + 2] == [("punctuation", "{")]:
+            self.position += 2
+            parts = [self.condition()]
+            while self.peek() == ("punctuation", ","):
+                self.position += 1
+                parts.append(self.condition())
+            self.take("punctuation", "}")
+            parts = tuple(parts)
+            if value.casefold() == "all":
+                return lambda context: all(part(context) for part in parts)
+            return lambda context: any(part(context) for part in parts)
+        return self.comparison()
+
+    def variable(self) -> str:
+        _, name = self.take("word")
+        name = name.casefold()
+        if not name.startswith(VARIABLE_PREFIXES):
+            raise ConditionError(self.text, f"{name} is not a request or target variable")
+        self.variables.add(name)
+        return name
+
+    def operand(self):
+        """("literal", value) / ("pattern", regex) / ("variable", name)"""
+
+        kind, value = self.take()
+        if kind == "string":
+            return "literal", value[1:-1].casefold()
+        if kind == "pattern":
+            # /abc*/ - * matches anything
+            return "pattern", re.compile(".*".join(map(re.escape, value[1:-1].casefold().split("*"))), re.DOTALL)
+        if kind == "word":
+            value = value.casefold()
+            if value.startswith(VARIABLE_PREFIXES):
+                self.variables.add(value)
+                return "variable", value
+            return "literal", value
+        raise ConditionError(self.text, f"Expected a value, found {value}")
+
+    def bound(self):
+        operand = self.operand()
+        if operand[0] == "pattern":
+            raise ConditionError(self.text, "A pattern can't be a time bound")
+        return operand
+
+    def comparison(self):
+        name = self.variable()
+        kind, operator = self.take()
+        operator = operator.casefold()
+        if operator in ("=", "!="):
+            operand = self.operand()
+            check = equals(name, operand)
+            if operator == "=":
+                return check
+            # Not applicable (false) unless both sides have a value
+            other = operand[1] if operand[0] == "variable" else name
+            return lambda context: context.get(name) is not None and context.get(other) is not None and not check(context)
+        if operator == "in":
+            self.take("punctuation", "(")
+            operands = [self.operand()]
+            while self.peek() == ("punctuation", ","):
+                self.position += 1
+                operands.append(self.operand())
+            self.take("punctuation", ")")
+            checks = tuple(equals(name, operand) for operand in operands)
+            return lambda context: any(check(context) for check in checks)
+        if operator in ("before", "after"):
+            bound = self.bound()
+            return ordered(name, high=bound) if operator == "before" else ordered(name, low=bound)
+        if operator == "between":
+            low = self.bound()
+            self.take("word", "and")
+            return ordered(name, low=low, high=self.bound(), inclusive=True)
+        raise ConditionError(self.text, f"Unknown operator {operator}")
+
+
+def resolve(operand, context):
+    kind, value = operand
+    return context.get(value) if kind == "variable" else value
+
+
+def equals(name: str, operand):
+    """Closure for variable = operand - a multi-valued variable matches if any of its values does"""
+
+    kind, value = operand
+    if kind == "literal":
+        def check(context):
+            actual = context.get(name)
+            if actual is None:
+                return False
+            return actual == value if type(actual) is str else value in actual
+    elif kind == "pattern":
+        def check(context):
+            actual = context.get(name)
+            if actual is None:
+                return False
+            if type(actual) is str:
+                return value.fullmatch(actual) is not None
+            return any(value.fullmatch(item) for item in actual)
+    else:
+        def check(context):
+            actual, other = context.get(name), context.get(value)
+            if actual is None or other is None:
+                return False
+            actual = {actual} if type(actual) is str else actual
+            other = {other} if type(other) is str else other
+            return not actual.isdisjoint(other)
+    return check
+
+
+def ordered(name: str, low=None, high=None, inclusive: bool = False):
+    """Closure for low < variable < high (either bound optional) - strings compared as they sort (ISO times)"""
+
+    def check(context):
+        actual = context.get(name)
+        if type(actual) is not str:
+            return False
+        if low is not None:
+            bound = resolve(low, context)
+            if type(bound) is not str or (actual < bound if inclusive else actual <= bound):
+                return False
+        if high is not None:
+            bound = resolve(high, context)
+            if type(bound) is not str or (actual > bound if inclusive else actual >= bound):
+                return False
+        return True
+    return check
+
+
+class Condition:
+    """Compiled condition - call it with a context (see context_of) to evaluate it"""
+
+    __slots__ = ("text", "variables", "check")
+
+    def __init__(self, text: str):
+        parser = Parser(text)
+        self.check = parser.parse()
+        self.text = text
+        self.variables = frozenset(parser.variables)
+
+    def __call__(self, context: dict) -> bool:
+        return bool(self.check(context))
+
+    def __repr__(self):
+        return f"Condition({self.text!r})"
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def compile_condition(text: str) -> Condition:
+    """Compiled condition for a text, shared by every statement with the same text.  Raises ConditionError"""
+
+    return Condition(text.strip())
+
+
+def what_if(statements, contexts: list, condition_of=lambda statement: statement[13]) -> list:
+    """For each context (a dict of variable -> value), the statements with a condition that holds in it
+    (grouped by condition, in statement order within each).
+    Each distinct condition is compiled and evaluated once per context.  Unconditional statements and
+    conditions that don't parse are left out (the latter are logged once)"""
+
+    by_condition = {}
+    for statement in statements:
+        text = condition_of(statement)
+        if text:
+            by_condition.setdefault(text, []).append(statement)
+
+    compiled = []
+    for text, matching in by_condition.items():
+        try:
+            compiled.append((compile_condition(text), matching))
+        except ConditionError as exc:
+            logger.warning(f"Skipping {len(matching)} statements: {exc}")
+
+    results = []
+    for values in contexts:
+        context = context_of(values)
+        results.append([statement for condition, matching in compiled if condition(context) for statement in matching])
+    logger.debug(f"Evaluated {len(compiled)} conditions against {len(contexts)} contexts: {compile_condition.cache_info()}")
+    return results
+
+
+if __name__ == "__main__":
+    from oci_policy_snapshot import load_json, load_table, open_snapshot
+    from oci_policy_store import PolicyStatement
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s [%(threadName)s] %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser()
+    parser.add_argument("tenancy", help="Tenancy OCID of a UI cache (.policy-ui-snapshot-<tenancy>.dat) in this directory")
+    parser.add_argument("--set", help="Context variable, eg target.resource.tag.ns.key=value (repeat; a variable set twice is multi-valued)",
+                        action="append", default=[])
+    args = parser.parse_args()
+
+    statements = load_table(open_snapshot(f".policy-ui-snapshot-{args.tenancy}.dat", args.tenancy), "statement", PolicyStatement)
+    if statements is None:
+        statements = load_json(f".policy-statement-cache-{args.tenancy}.dat")
+        if statements is None:
+            logger.error(f"No cached statements for {args.tenancy} in {os.getcwd()} - load the tenancy in the UI first")
+            exit(1)
+
+    context = parse_settings(args.set)
+    matching = what_if(statements, [context])[0]
+    for statement in matching:
+        print(f"{statement[3]}\t{statement[0]}\t{statement[4]}")
+    logger.info(f"{len(matching)} conditional statements hold for {context}")
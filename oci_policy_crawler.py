@@ -0,0 +1,383 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# asyncio engine for the policy loaders - an alternative to the ThreadPoolExecutor engine.
+# Compartment listing, compartment lookups and list_policies all run as coroutines on one event loop, over
+# non-blocking keep-alive connections, so hundreds of Identity calls can be in flight on a single thread.
+# Everything the SDK would use comes from the IdentityClient: its endpoint, its signer (called on each request
+# as the SDK calls it), its user agent and timeouts, the CA bundle its session verifies with (or
+# REQUESTS_CA_BUNDLE / certifi, as requests would) and its proxies (or the *_PROXY environment, tunnelled with
+# CONNECT for HTTPS).  Responses are turned into SDK models by the client's own deserializer, and errors
+# raise the SDK's ServiceError.  A 429 pauses only the operation that returned it (honouring Retry-After).
+# list_policies tasks are created as compartment pages arrive, but at most max_pending are unfinished at
+# once, and each finished compartment is reported to the progress callback as the thread engine does.
+#
+#   crawler = AsyncIdentityCrawler(identity_client, concurrency=CONCURRENCY)
+#   compartments, policies_by_compartment = crawler.run(tenancy_ocid, progress=progress)
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import ssl
+import time
+from urllib.parse import unquote, urlencode, urlsplit
+
+logger = logging.getLogger('oci-policy-crawler')
+
+IDENTITY_BASE_PATH = "/20160918"
+CONCURRENCY = 100
+MAX_RETRIES = 6
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# The SDK's default (connect, read) timeouts
+TIMEOUT = (10.0, 60.0)
+
+
+class SigningRequest:
+    """The parts of a prepared request an OCI signer reads and sets - method, url, path_url, headers and body"""
+
+    def __init__(self, method: str, url: str, headers: dict):
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.body = None
+        parts = urlsplit(url)
+        self.path_url = parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+def tls_context(verify) -> ssl.SSLContext:
+    """TLS context for a requests-style verify setting - False, a CA bundle file or directory, or True (the
+    REQUESTS_CA_BUNDLE / CURL_CA_BUNDLE environment, else certifi, else the system store)"""
+
+    if verify is False:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return context
+    bundle = verify if isinstance(verify, str) else os.environ.get("REQUESTS_CA_BUNDLE") or os.environ.get("CURL_CA_BUNDLE")
+    if not bundle:
+        try:
+            import certifi
+            bundle = certifi.where()
+        except ImportError:
+            pass
+    if bundle and os.path.isdir(bundle):
+        return ssl.create_default_context(capath=bundle)
+    return ssl.create_default_context(cafile=bundle)
+
+
+def proxy_for(url: str, proxies: dict = None):
+    """Proxy URL for url - from a requests-style proxies dict, else the *_PROXY environment (honouring
+    NO_PROXY) - or None"""
+
+    from urllib.request import getproxies, proxy_bypass
+
+    parts = urlsplit(url)
+    proxies = proxies or {}
+    proxy = proxies.get(f"{parts.scheme}://{parts.hostname}") or proxies.get(parts.scheme) or proxies.get("all")
+    if proxy is None and not proxy_bypass(parts.hostname):
+        environment = getproxies()
+        proxy = environment.get(parts.scheme) or environment.get("all")
+    return proxy or None
+
+
+class EndpointGate:
+    """Per-operation rate control - optional request rate, plus a shared pause when the operation throttles"""
+
+    def __init__(self, rate: float = None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = 0.0
+        self.paused_until = 0.0
+        self.throttled = 0
+
+    async def wait(self):
+        """Wait out any 429 pause, then take the next request slot"""
+
+        while True:
+            now = time.monotonic()
+            delay = max(self.paused_until, self.next_slot) - now
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        self.next_slot = max(now, self.next_slot) + self.interval
+
+    def pause(self, seconds: float):
+        """Hold every request to this operation for the given time"""
+
+        self.throttled += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AsyncIdentityCrawler:
+    """Coroutine-based Identity reader (compartments and policies) with the settings of an SDK IdentityClient"""
+
+    def __init__(self, identity_client, concurrency: int = CONCURRENCY, rate: float = None,
+                 max_retries: int = MAX_RETRIES, max_pending: int = None):
+        """concurrency is the number of requests in flight (open connections).  rate optionally caps the
+        requests per second of each operation.  max_pending bounds the unfinished list_policies tasks
+        (default twice concurrency)"""
+
+        client = identity_client.base_client
+        self.client = client
+        self.signer = client.signer
+        endpoint = client.endpoint.rstrip("/")
+        # The client's endpoint normally ends with the API version already
+        self.endpoint = endpoint if endpoint.endswith(IDENTITY_BASE_PATH) else endpoint + IDENTITY_BASE_PATH
+        url = urlsplit(self.endpoint)
+        self.host = url.hostname
+        self.netloc = url.netloc
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        session = getattr(client, "session", None)
+        self.tls = tls_context(getattr(session, "verify", True)) if url.scheme == "https" else None
+        self.proxy = proxy_for(self.endpoint, getattr(session, "proxies", None))
+        self.user_agent = getattr(client, "user_agent", None) or "oci-policy-crawler"
+        timeout = getattr(client, "timeout", None) or TIMEOUT
+        self.connect_timeout, self.read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.max_retries = max_retries
+        self.max_pending = max_pending or concurrency * 2
+
+        # Stats
+        self.requests = 0
+        self.retries = 0
+
+    ###########################################################################
+    # HTTP plumbing
+    ###########################################################################
+
+    async def _open(self):
+        """Take an idle keep-alive connection or open a new one (through the proxy if there is one)"""
+
+        if self.idle:
+            return self.idle.pop()
+        if not self.proxy:
+            return await asyncio.open_connection(self.host, self.port, ssl=self.tls)
+
+        proxy = urlsplit(self.proxy)
+        reader, writer = await asyncio.open_connection(proxy.hostname, proxy.port or 80)
+        if self.tls:
+            # Tunnel to the endpoint, then TLS over the tunnel
+            lines = [f"CONNECT {self.host}:{self.port} HTTP/1.1", f"host: {self.host}:{self.port}"] + self._proxy_headers()
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+            await writer.drain()
+            status_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            if len(status_line.split()) < 2 or status_line.split()[1] != b"200":
+                writer.close()
+                raise ConnectionError(f"Proxy {proxy.hostname} refused the tunnel: {status_line.decode(errors='replace').strip()}")
+            await writer.start_tls(self.tls, server_hostname=self.host)
+        return reader, writer
+
+    def _proxy_headers(self) -> list:
+        """Proxy-Authorization for a proxy URL with credentials"""
+
+        proxy = urlsplit(self.proxy)
+        if not proxy.username:
+            return []
+        credentials = f"{unquote(proxy.username)}:{unquote(proxy.password or '')}".encode()
+        return [f"proxy-authorization: Basic {base64.b64encode(credentials).decode()}"]
+
+    def _request(self, url: str) -> bytes:
+        """Request head of a GET, signed by the client's signer"""
+
+        request = SigningRequest("GET", url, {"host": self.netloc, "accept": "application/json", "user-agent": self.user_agent})
+        if self.signer:
+            self.signer(request)
+        # Plain HTTP through a proxy takes the absolute URL
+        plain_proxy = self.proxy and not self.tls
+        lines = [f"GET {url if plain_proxy else request.path_url} HTTP/1.1"] + [f"{k}: {v}" for k, v in request.headers.items()]
+        if plain_proxy:
+            lines += self._proxy_headers()
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _exchange(self, url: str):
+        """One GET over a pooled connection - returns (status, headers, body)"""
+
+        reader, writer = await asyncio.wait_for(self._open(), self.connect_timeout)
+        try:
+            writer.write(self._request(url))
+            await writer.drain()
+            status, headers, body = await asyncio.wait_for(self._read_response(reader), self.read_timeout)
+        except BaseException:
+            writer.close()
+            raise
+
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self.idle.append((reader, writer))
+        return status, headers, body
+
+    async def _read_response(self, reader):
+        """(status, headers, body) of one response"""
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by endpoint")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            return status, headers, b"".join(chunks)
+        return status, headers, await reader.readexactly(int(headers.get("content-length", 0)))
+
+    async def _get(self, operation: str, resource: str, params: dict = None):
+        """GET with bounded concurrency, 429/Retry-After handling and backoff - returns (body, headers)"""
+
+        from oci.exceptions import ServiceError
+
+        url = f"{self.endpoint}{resource}"
+        if params:
+            url = f"{url}?{urlencode({k: v for k, v in params.items() if v is not None})}"
+        gate = self.gates.setdefault(operation, EndpointGate(self.rate))
+
+        for attempt in range(self.max_retries + 1):
+            await gate.wait()
+            async with self.semaphore:
+                self.requests += 1
+                try:
+                    status, headers, body = await self._exchange(url)
+                except ssl.SSLCertVerificationError:
+                    # Won't get better by retrying
+                    raise
+                except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, OSError) as exc:
+                    status, headers, body, error = None, {}, b"", exc
+
+            if status is not None and status < 300:
+                return body, headers
+            if status is not None:
+                try:
+                    detail = json.loads(body)
+                except ValueError:
+                    detail = {}
+                error = ServiceError(status, detail.get("code"), headers, detail.get("message") or body.decode(errors="replace"),
+                                     operation_name=operation, request_endpoint=f"GET {url}")
+            if (status is not None and status not in RETRY_STATUS) or attempt == self.max_retries:
+                raise error
+
+            # Back off - Retry-After wins, otherwise exponential with jitter
+            self.retries += 1
+            try:
+                delay = float(headers.get("retry-after"))
+            except (TypeError, ValueError):
+                delay = min(30.0, 0.2 * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            if status == 429:
+                gate.pause(delay)
+                logger.debug(f"Throttled on {operation}, pausing it {delay:.2f}s")
+            else:
+                await asyncio.sleep(delay)
+
+    async def _get_all(self, operation: str, resource: str, params: dict, response_type: str):
+        """Async generator over pages (lists of SDK models) of a list call (opc-next-page)"""
+
+        params = dict(params)
+        while True:
+            body, headers = await self._get(operation, resource, params)
+            yield self.client.deserialize_response_data(body, response_type) or []
+            if not headers.get("opc-next-page"):
+                return
+            params["page"] = headers["opc-next-page"]
+
+    ###########################################################################
+    # Identity calls
+    ###########################################################################
+
+    async def get_compartment(self, compartment_id: str):
+        body, _ = await self._get("get_compartment", f"/compartments/{compartment_id}")
+        return self.client.deserialize_response_data(body, "Compartment")
+
+    async def list_compartment_pages(self, tenancy_ocid: str):
+        """Every ACTIVE compartment in the subtree, a page at a time"""
+
+        async for page in self._get_all("list_compartments", "/compartments",
+                                        {"compartmentId": tenancy_ocid,
+                                         "accessLevel": "ACCESSIBLE",
+                                         "sortOrder": "ASC",
+                                         "compartmentIdInSubtree": "true",
+                                         "lifecycleState": "ACTIVE",
+                                         "limit": 1000}, "list[Compartment]"):
+            yield page
+
+    async def list_policies(self, compartment_id: str) -> list:
+        policies = []
+        async for page in self._get_all("list_policies", "/policies", {"compartmentId": compartment_id, "limit": 1000},
+                                        "list[Policy]"):
+            policies.extend(page)
+        return policies
+
+    async def crawl(self, tenancy_ocid: str, recursion: bool = True, only: set = None, progress=None):
+        """Root compartment, every compartment (if recursion) and their policies.
+        list_policies starts as soon as each compartment page arrives, max_pending at a time.  only restricts
+        which compartments are asked for policies (eg from Resource Search).  progress (a Progress) grows by
+        one per compartment to load and ticks as each finishes.
+        Returns (compartments, {compartment OCID: [policies]})"""
+
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.gates = {}
+        self.requests = self.retries = 0
+        slots = asyncio.Semaphore(self.max_pending)
+        tasks = {}
+
+        async def start(compartment):
+            # Blocks the listing while max_pending compartments are still loading
+            await slots.acquire()
+            if progress:
+                progress.add_to_load(1)
+            task = asyncio.ensure_future(self.list_policies(compartment.id))
+            task.add_done_callback(lambda _: slots.release())
+            if progress:
+                task.add_done_callback(progress.progress_indicator)
+            tasks[compartment.id] = task
+
+        self.idle = []
+        try:
+            root = await self.get_compartment(tenancy_ocid)
+            compartments = [root]
+            if only is None or root.id in only:
+                await start(root)
+            if recursion:
+                async for page in self.list_compartment_pages(tenancy_ocid):
+                    compartments.extend(page)
+                    for c in page:
+                        if only is None or c.id in only:
+                            await start(c)
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        finally:
+            for _, writer in self.idle:
+                writer.close()
+
+        throttled = sum(g.throttled for g in self.gates.values())
+        logger.info(f"Crawled {len(compartments)} compartments with {self.requests} requests ({self.retries} retries, {throttled} throttled)")
+        return compartments, {ocid: task.result() for ocid, task in tasks.items()}
+
+    def run(self, tenancy_ocid: str, recursion: bool = True, only: set = None, progress=None):
+        """Blocking entry point for the (threaded) loaders"""
+
+        return asyncio.run(self.crawl(tenancy_ocid=tenancy_ocid, recursion=recursion, only=only, progress=progress))
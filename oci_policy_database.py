@@ -0,0 +1,328 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# SQLite backend for UI statements (PolicyAnalysis with -d <database>).
+# Every load is kept as a snapshot (tenancy, load time) in one database file, so many tenancies and loads can be
+# searched together.  One row per statement, with B-tree indexes on subject type, subject, verb, resource, location
+# and hierarchy, and an FTS5 trigram table over the statement text and conditions (external content - the text
+# is stored once).  StatementQuery filters (oci_policy_query.py) run as SQL: text/condition needles of 3 or more
+# characters go through the FTS table, the rest are LIKE / casefold scans.  Only matching statements are read
+# back, so memory doesn't grow with the number of statements or snapshots.
+#
+#   python3 oci_policy_database.py policies.db                                  # list snapshots
+#   python3 oci_policy_database.py policies.db --subject admins --verb manage   # latest snapshot of every tenancy
+#   python3 oci_policy_database.py policies.db --text "all-resources" --all     # every snapshot
+#   python3 oci_policy_database.py policies.db --delete 3                       # drop snapshot 3
+
+import argparse
+import datetime
+import logging
+import sqlite3
+import time
+from threading import Lock
+
+from oci_policy_query import StatementQuery
+from oci_policy_store import STATEMENT_FIELDS, PolicyStatement, StatementStore
+
+logger = logging.getLogger('oci-policy-database')
+
+# Bump when the schema changes - a database with another version is refused
+SCHEMA_VERSION = 1
+
+# Rows per fetch when streaming statements or results
+BATCH = 5000
+
+# Needles shorter than a trigram can't use the FTS index
+GRAM = 3
+
+# Statement columns - the subject is split into domain and name, so both can be searched and indexed
+COLUMNS = STATEMENT_FIELDS[:7] + ("subject_domain", "subject_name") + STATEMENT_FIELDS[8:]
+SUBJECT = STATEMENT_FIELDS.index("subject")
+INDEXED_COLUMNS = ("subject_type", "subject_name", "verb", "resource", "location", "hierarchy")
+FTS_COLUMNS = ("text", "condition")
+BOOLEAN_COLUMNS = ("valid", "permission")
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS snapshot (
+    id INTEGER PRIMARY KEY,
+    tenancy TEXT NOT NULL,
+    loaded TEXT,
+    written TEXT,
+    statements INTEGER
+);
+CREATE INDEX IF NOT EXISTS snapshot_tenancy ON snapshot(tenancy);
+CREATE TABLE IF NOT EXISTS statement (
+    id INTEGER PRIMARY KEY,
+    snapshot_id INTEGER NOT NULL REFERENCES snapshot(id),
+    row INTEGER NOT NULL,
+    {", ".join(f"{column} {'BOOLEAN' if column in BOOLEAN_COLUMNS else 'TEXT'}" for column in COLUMNS)},
+    UNIQUE (snapshot_id, row)
+);
+{"".join(f"CREATE INDEX IF NOT EXISTS statement_{column} ON statement({column});" for column in INDEXED_COLUMNS)}
+CREATE VIRTUAL TABLE IF NOT EXISTS statement_fts USING fts5(
+    {", ".join(FTS_COLUMNS)}, content='statement', content_rowid='id', tokenize='trigram'
+);
+"""
+
+# valid / permission are Python booleans (permission may also be None - NULLs are never converted)
+sqlite3.register_converter("BOOLEAN", lambda value: value == b"1")
+
+
+def casefold(value):
+    return value.casefold() if isinstance(value, str) else value
+
+
+def like_pattern(needle: str) -> str:
+    """LIKE pattern for a substring, with the LIKE wildcards escaped"""
+
+    return "%" + needle.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def values_of(row) -> list:
+    """Record values (subject as a (domain, name) tuple) from a statement row's COLUMNS"""
+
+    values = list(row)
+    values[SUBJECT:SUBJECT + 2] = [(values[SUBJECT], values[SUBJECT + 1])]
+    return values
+
+
+class StatementDatabase:
+    """Statement snapshots in a SQLite file.  One connection, shared by the UI and loader threads"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        self.connection.create_function("casefold", 1, casefold, deterministic=True)
+        with self.lock, self.connection:
+            version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            tables = self.connection.execute("SELECT count(*) FROM sqlite_master WHERE name = 'statement'").fetchone()[0]
+            if tables and version != SCHEMA_VERSION:
+                raise ValueError(f"Database {path} has schema version {version}, expected {SCHEMA_VERSION}")
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        logger.info(f"Opened statement database {path}")
+
+    def add_snapshot(self, tenancy: str, statements, loaded: str = None) -> int:
+        """Store statements (records or 16-field lists, streamed) as a new snapshot of tenancy - returns its id"""
+
+        tic = time.perf_counter()
+        placeholders = ", ".join("?" * (len(COLUMNS) + 2))
+        with self.lock, self.connection:
+            cursor = self.connection.execute("INSERT INTO snapshot (tenancy, loaded, written) VALUES (?, ?, ?)",
+                                             (tenancy, loaded, str(datetime.datetime.now())))
+            snapshot_id = cursor.lastrowid
+            rows = ((snapshot_id, row, *statement[:SUBJECT], *(statement[SUBJECT] or (None, None)), *statement[SUBJECT + 1:])
+                    for row, statement in enumerate(statements))
+            self.connection.executemany(
+                f"INSERT INTO statement (snapshot_id, row, {', '.join(COLUMNS)}) VALUES ({placeholders})", rows)
+            count = self.connection.execute("SELECT count(*) FROM statement WHERE snapshot_id = ?", (snapshot_id,)).fetchone()[0]
+            self.connection.execute("UPDATE snapshot SET statements = ? WHERE id = ?", (count, snapshot_id))
+            self.connection.execute(f"INSERT INTO statement_fts (rowid, {', '.join(FTS_COLUMNS)}) "
+                                    f"SELECT id, {', '.join(FTS_COLUMNS)} FROM statement WHERE snapshot_id = ?", (snapshot_id,))
+        logger.info(f"Stored {count} statements of {tenancy} as snapshot {snapshot_id} in {time.perf_counter() - tic:.2f}s")
+        return snapshot_id
+
+    def delete_snapshot(self, snapshot_id: int):
+        with self.lock, self.connection:
+            # External content - the FTS entries are removed with the values they were built from
+            self.connection.execute(f"INSERT INTO statement_fts (statement_fts, rowid, {', '.join(FTS_COLUMNS)}) "
+                                    f"SELECT 'delete', id, {', '.join(FTS_COLUMNS)} FROM statement WHERE snapshot_id = ?",
+                                    (snapshot_id,))
+            self.connection.execute("DELETE FROM statement WHERE snapshot_id = ?", (snapshot_id,))
+            self.connection.execute("DELETE FROM snapshot WHERE id = ?", (snapshot_id,))
+        logger.info(f"Deleted snapshot {snapshot_id}")
+
+    def snapshots(self, tenancy: str = None) -> list:
+        """(id, tenancy, loaded, written, statements) of every snapshot (of tenancy), oldest first"""
+
+        sql = "SELECT id, tenancy, loaded, written, statements FROM snapshot"
+        with self.lock:
+            if tenancy:
+                return self.connection.execute(f"{sql} WHERE tenancy = ? ORDER BY id", (tenancy,)).fetchall()
+            return self.connection.execute(f"{sql} ORDER BY id").fetchall()
+
+    def latest_snapshots(self) -> list:
+        """Id of the newest snapshot of each tenancy"""
+
+        with self.lock:
+            return [row[0] for row in self.connection.execute("SELECT max(id) FROM snapshot GROUP BY tenancy ORDER BY tenancy")]
+
+    def latest_snapshot(self, tenancy: str):
+        """(id, tenancy, loaded, written, statements) of the newest snapshot of tenancy, or None"""
+
+        snapshots = self.snapshots(tenancy)
+        return snapshots[-1] if snapshots else None
+
+    def count(self, snapshot_id: int) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT count(*) FROM statement WHERE snapshot_id = ?", (snapshot_id,)).fetchone()[0]
+
+    def fetch(self, sql: str, parameters=()):
+        """Rows of a query, fetched BATCH at a time so only one batch is held"""
+
+        with self.lock:
+            cursor = self.connection.execute(sql, parameters)
+            batch = cursor.fetchmany(BATCH)
+        while batch:
+            yield from batch
+            with self.lock:
+                batch = cursor.fetchmany(BATCH)
+
+    def statements(self, snapshot_id: int, start: int = 0, stop: int = None):
+        """Record values of the snapshot's statements start..stop, in load order"""
+
+        sql = f"SELECT {', '.join(COLUMNS)} FROM statement WHERE snapshot_id = ? AND row >= ?"
+        parameters = [snapshot_id, start]
+        if stop is not None:
+            sql += " AND row < ?"
+            parameters.append(stop)
+        return map(values_of, self.fetch(sql + " ORDER BY row", parameters))
+
+    def where(self, query: StatementQuery) -> tuple:
+        """SQL condition and parameters for a query's clauses (AND of ORs)"""
+
+        conditions, parameters = [], []
+        for clause in query.clauses:
+            alternatives = []
+            for (name, _), needle in clause:
+                if name not in COLUMNS:
+                    raise ValueError(f"Unknown statement column {name}")
+                if name in FTS_COLUMNS and len(needle) >= GRAM:
+                    # Trigram phrase - a case-insensitive substring match
+                    alternatives.append("s.id IN (SELECT rowid FROM statement_fts WHERE statement_fts MATCH ?)")
+                    parameters.append(f'{name} : "{needle.replace(chr(34), chr(34) * 2)}"')
+                elif needle.isascii():
+                    # LIKE ignores ASCII case, which is all an ASCII needle can differ by
+                    alternatives.append(f"s.{name} LIKE ? ESCAPE '\\'")
+                    parameters.append(like_pattern(needle))
+                else:
+                    alternatives.append(f"instr(casefold(s.{name}), ?) > 0")
+                    parameters.append(needle)
+            conditions.append("(" + " OR ".join(alternatives) + ")")
+        return " AND ".join(conditions) or "1", parameters
+
+    def filter(self, query: StatementQuery, snapshot_ids: list):
+        """(snapshot id, record values) of the statements matching query in the given snapshots, in load order"""
+
+        condition, parameters = self.where(query)
+        sql = (f"SELECT s.snapshot_id, {', '.join(f's.{column}' for column in COLUMNS)} FROM statement s "
+               f"WHERE s.snapshot_id IN ({', '.join('?' * len(snapshot_ids))}) AND {condition} ORDER BY s.snapshot_id, s.row")
+        logger.debug(f"Filter SQL: {sql} {parameters}")
+        return ((row[0], values_of(row[1:])) for row in self.fetch(sql, [*snapshot_ids, *parameters]))
+
+    def set_valid(self, snapshot_id: int, changes: list):
+        """Update the valid flag of (row, valid) pairs of a snapshot"""
+
+        with self.lock, self.connection:
+            self.connection.executemany("UPDATE statement SET valid = ? WHERE snapshot_id = ? AND row = ?",
+                                        ((valid, snapshot_id, row) for row, valid in changes))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class DatabaseRecords:
+    """Sequence of a DatabaseStore's records - read from the database each time, nothing is kept"""
+
+    def __init__(self, store):
+        self.store = store
+        self.length = store.database.count(store.snapshot_id)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return [self.store.make(values) for values in self.store.database.statements(self.store.snapshot_id, start, stop)]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("statement index out of range")
+        return self[index:index + 1][0]
+
+    def __iter__(self):
+        return map(self.store.make, self.store.database.statements(self.store.snapshot_id))
+
+
+class DatabaseStore(StatementStore):
+    """StatementStore over one snapshot in a StatementDatabase - statements are streamed from the database and
+    filters run as SQL.  Changing a record only changes the copy read; use set_valid to store validity.
+    Adding statements reads the rest into memory first"""
+
+    def __init__(self, database: StatementDatabase, snapshot_id: int):
+        super().__init__(PolicyStatement)
+        self.database = database
+        self.snapshot_id = snapshot_id
+        self.records = DatabaseRecords(self)
+
+    def materialize(self):
+        if isinstance(self.records, DatabaseRecords):
+            self.records = list(self.records)
+
+    def append(self, row):
+        self.materialize()
+        super().append(row)
+
+    def extend(self, rows):
+        self.materialize()
+        super().extend(rows)
+
+    def filter(self, query: StatementQuery) -> list:
+        """Statements matching query, in load order"""
+
+        if not isinstance(self.records, DatabaseRecords):
+            return query.run(self)
+        return [self.make(values) for _, values in self.database.filter(query, [self.snapshot_id])]
+
+    def set_valid(self, changes: list):
+        """Store the valid flag of (row, valid) pairs"""
+
+        if isinstance(self.records, DatabaseRecords):
+            self.database.set_valid(self.snapshot_id, changes)
+        else:
+            for row, valid in changes:
+                self.records[row][5] = valid
+        self.generation += 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s [%(threadName)s] %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser()
+    parser.add_argument("database", help="Statement database (PolicyAnalysis -d)")
+    parser.add_argument("--tenancy", help="Only snapshots of this tenancy OCID")
+    parser.add_argument("--all", help="Search every snapshot, not only the latest of each tenancy", action="store_true")
+    parser.add_argument("--delete", help="Delete a snapshot by id", type=int)
+    for name in ("subject", "verb", "resource", "location", "hierarchy", "condition", "text", "policy"):
+        parser.add_argument(f"--{name}", help=f"{name} filter ('|' separated alternatives)", default="")
+    args = parser.parse_args()
+
+    database = StatementDatabase(args.database)
+    if args.delete is not None:
+        database.delete_snapshot(args.delete)
+        exit(0)
+
+    query = StatementQuery(subject=args.subject, verb=args.verb, resource=args.resource, location=args.location,
+                           hierarchy=args.hierarchy, condition=args.condition, text=args.text, policy=args.policy)
+    snapshots = {row[0]: row for row in database.snapshots(args.tenancy)}
+    if not query.clauses:
+        for snapshot_id, tenancy, loaded, written, statements in snapshots.values():
+            print(f"{snapshot_id}\t{tenancy}\t{loaded}\t{statements} statements")
+        exit(0)
+
+    snapshot_ids = list(snapshots) if args.all else [n for n in database.latest_snapshots() if n in snapshots]
+    matches = 0
+    for snapshot_id, values in database.filter(query, snapshot_ids):
+        print(f"{snapshot_id}\t{snapshots[snapshot_id][1]}\t{values[3]}\t{values[0]}\t{values[4]}")
+        matches += 1
+    logger.info(f"{matches} statements in {len(snapshot_ids)} snapshots")
@@ -0,0 +1,97 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Policy discovery helpers shared by the policy loaders (oci_policy_analysis.py and tkinter/policy.py).
+# Resource Search finds every policy in the tenancy with one paged query, so list_policies only needs
+# to be called in the compartments that actually hold policies.
+# Compartments can also be streamed page by page into an executor so listing and loading overlap.
+# The SDK is imported by the functions that call it.
+
+import logging
+from threading import BoundedSemaphore
+
+logger = logging.getLogger('oci-policy-discovery')
+
+POLICY_SEARCH_QUERY = "query policy resources where lifeCycleState = 'ACTIVE'"
+
+
+def search_policy_compartments(search_client, tenancy_ocid: str) -> dict:
+    """Run one tenancy-wide structured search and return {compartment OCID: [policy OCIDs]}"""
+
+    from oci import pagination
+    from oci.resource_search.models import StructuredSearchDetails
+
+    paginated_response = pagination.list_call_get_all_results(
+        search_client.search_resources,
+        search_details=StructuredSearchDetails(
+            type="Structured",
+            query=POLICY_SEARCH_QUERY,
+            matching_context_type="NONE"
+        ),
+        tenant_id=tenancy_ocid,
+        limit=1000)
+
+    policy_compartments = {}
+    for resource in paginated_response.data:
+        policy_compartments.setdefault(resource.compartment_id, []).append(resource.identifier)
+    logger.info(f"Resource Search found {sum(len(p) for p in policy_compartments.values())} policies in {len(policy_compartments)} compartments")
+    return policy_compartments
+
+
+def policy_compartment_ids(search_client, tenancy_ocid: str):
+    """Set of compartment OCIDs that Resource Search says hold policies, or None if the search can't be used.
+    An empty result is treated as unusable (every tenancy has a root policy, so the index can't be trusted) -
+    in both cases the per-compartment load is the fallback"""
+
+    from oci.exceptions import ServiceError
+
+    try:
+        policy_compartments = search_policy_compartments(search_client, tenancy_ocid)
+    except ServiceError as exc:
+        logger.warning(f"Resource Search failed, loading every compartment: {exc.message}")
+        return None
+    if not policy_compartments:
+        logger.warning("Resource Search returned no policies, loading every compartment")
+        return None
+    return set(policy_compartments)
+
+
+def stream_compartments(identity_client, tenancy_ocid: str):
+    """Yield every ACTIVE compartment in the tenancy, one page at a time as the API returns them"""
+
+    from oci import pagination
+
+    return pagination.list_call_get_all_results_generator(
+        identity_client.list_compartments,
+        'record',
+        tenancy_ocid,
+        access_level="ACCESSIBLE",
+        sort_order="ASC",
+        compartment_id_in_subtree=True,
+        lifecycle_state="ACTIVE",
+        limit=1000)
+
+
+def submit_pipelined(executor, fn, items, max_pending: int, on_submit=None, on_done=None) -> list:
+    """Submit fn(item) to the executor as each item arrives from the (lazy) items iterable.
+    At most max_pending submissions are unfinished at once, so a fast producer can't queue up the whole
+    listing ahead of the workers. on_submit(item) and on_done(future) are optional progress hooks"""
+
+    slots = BoundedSemaphore(max_pending)
+    futures = []
+    for item in items:
+        slots.acquire()
+        if on_submit:
+            on_submit(item)
+        future = executor.submit(fn, item)
+        future.add_done_callback(lambda f: slots.release())
+        if on_done:
+            future.add_done_callback(on_done)
+        futures.append(future)
+    logger.debug(f"Submitted {len(futures)} items")
+    return futures
@@ -0,0 +1,217 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Trigram index over the filtered columns of a StatementStore, used by StatementQuery (oci_policy_query.py).
+# Each column keeps its distinct casefolded values, the rows holding each value, and a trigram -> values
+# posting list with the number of rows behind it.  A substring lookup takes the rarest trigram of the needle,
+# verifies only the values in its posting list and returns their rows - the statements are never scanned.
+# Postings are flat arrays (offsets + ids) so the index saves and loads as raw bytes next to the policy cache.
+
+import json
+import logging
+import os
+import sys
+import time
+import zlib
+from array import array
+from itertools import accumulate, chain
+
+logger = logging.getLogger('oci-policy-index')
+
+# Bump when the file layout changes - older files are rebuilt
+INDEX_VERSION = 1
+GRAM = 3
+
+
+def grams_of(value: str) -> set:
+    """Distinct trigrams of a value (none if it is shorter than a trigram)"""
+
+    return {value[i:i + GRAM] for i in range(len(value) - GRAM + 1)}
+
+
+def flatten(groups: list) -> tuple:
+    """(offsets, ids) arrays for a list of id lists - ids of group n are ids[offsets[n]:offsets[n+1]]"""
+
+    offsets = array('i', accumulate(chain((0,), map(len, groups))))
+    return offsets, array('i', chain.from_iterable(groups))
+
+
+class ColumnIndex:
+    """Distinct values of one column, their rows, and trigram postings over the values"""
+
+    ARRAYS = ("row_values", "value_offsets", "value_rows", "gram_offsets", "gram_values", "gram_rows")
+
+    def __init__(self, values: list, grams: list, **arrays):
+        self.values = values
+        self.grams = {gram: n for n, gram in enumerate(grams)}
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def build(cls, column: list):
+        """Index a folded column (one string per row)"""
+
+        ids = {}
+        row_values = array('i', (ids.setdefault(value, len(ids)) for value in column))
+        values = list(ids)
+
+        # Rows per value - a stable sort of the row numbers by value id
+        rows = sorted(range(len(row_values)), key=row_values.__getitem__)
+        counts = [0] * len(values)
+        for value_id in row_values:
+            counts[value_id] += 1
+        value_offsets = array('i', accumulate(chain((0,), counts)))
+
+        postings = {}
+        for value_id, value in enumerate(values):
+            for gram in grams_of(value):
+                posting = postings.get(gram)
+                if posting is None:
+                    postings[gram] = [value_id]
+                else:
+                    posting.append(value_id)
+        gram_offsets, gram_values = flatten(list(postings.values()))
+        gram_rows = array('i', (sum(counts[n] for n in posting) for posting in postings.values()))
+        return cls(values, list(postings), row_values=row_values, value_offsets=value_offsets,
+                   value_rows=array('i', rows), gram_offsets=gram_offsets, gram_values=gram_values, gram_rows=gram_rows)
+
+    def rarest_gram(self, needle: str):
+        """Posting number of the needle's trigram held by the fewest rows, -1 if a trigram is absent.
+        None for needles shorter than a trigram"""
+
+        if len(needle) < GRAM:
+            return None
+        gram_rows = self.gram_rows
+        rarest = None
+        for gram in grams_of(needle):
+            n = self.grams.get(gram)
+            if n is None:
+                return -1
+            if rarest is None or gram_rows[n] < gram_rows[rarest]:
+                rarest = n
+        return rarest
+
+    def estimate(self, needle: str) -> int:
+        """Upper bound on the rows containing needle"""
+
+        rarest = self.rarest_gram(needle)
+        if rarest is None:
+            return len(self.row_values)
+        return 0 if rarest < 0 else self.gram_rows[rarest]
+
+    def matching_values(self, needle: str) -> list:
+        """Ids of the values containing needle (casefolded already)"""
+
+        values = self.values
+        rarest = self.rarest_gram(needle)
+        if rarest is None:
+            return [n for n, value in enumerate(values) if needle in value]
+        if rarest < 0:
+            return []
+
+        # Candidates are the values holding the rarest trigram of the needle
+        offsets = self.gram_offsets
+        candidates = self.gram_values[offsets[rarest]:offsets[rarest + 1]]
+        return [n for n in candidates if needle in values[n]]
+
+    def rows(self, value_ids) -> list:
+        """Row numbers holding any of the values, grouped by value (ascending within a value)"""
+
+        offsets, value_rows = self.value_offsets, self.value_rows
+        return list(chain.from_iterable(value_rows[offsets[n]:offsets[n + 1]] for n in value_ids))
+
+
+class TrigramIndex:
+    """ColumnIndex per filter column of a store, valid for the store generation it was built from"""
+
+    def __init__(self, columns: dict, generation: int, fingerprint: int):
+        self.columns = columns
+        self.generation = generation
+        self.fingerprint = fingerprint
+
+    @staticmethod
+    def folded_columns(store, columns) -> dict:
+        """Folded store columns by name for an iterable of (name, extract)"""
+
+        return {name: store.folded_column(name, extract) for name, extract in dict(columns).items()}
+
+    @staticmethod
+    def fingerprint_of(folded: dict) -> int:
+        checksum = 0
+        for name in sorted(folded):
+            checksum = zlib.crc32("\x00".join(folded[name]).encode(errors="surrogatepass"), zlib.crc32(name.encode(), checksum))
+        return checksum
+
+    @classmethod
+    def build(cls, store, columns):
+        """Index the columns ((name, extract) pairs) of a store"""
+
+        tic = time.perf_counter()
+        folded = cls.folded_columns(store, columns)
+        index = cls({name: ColumnIndex.build(column) for name, column in folded.items()}, store.generation,
+                    cls.fingerprint_of(folded))
+        logger.info(f"Built trigram index over {len(store)} statements, {len(folded)} columns in {time.perf_counter() - tic:.2f}s")
+        return index
+
+    @classmethod
+    def load_or_build(cls, path: str, store, columns, save: bool = True):
+        """Index from path if it was saved for the same statements, else build it (and save it to path)"""
+
+        folded = cls.folded_columns(store, columns)
+        fingerprint = cls.fingerprint_of(folded)
+        if os.path.isfile(path):
+            try:
+                index = cls.load(path, fingerprint)
+                if index:
+                    index.generation = store.generation
+                    return index
+            except (OSError, EOFError, ValueError, KeyError) as exc:
+                logger.warning(f"Unable to read index {path}, rebuilding: {exc}")
+        index = cls.build(store, columns)
+        if save:
+            index.save(path)
+        return index
+
+    def is_current(self, store) -> bool:
+        return self.generation == store.generation
+
+    def save(self, path: str):
+        """Header line (JSON) then the postings as raw arrays"""
+
+        header = {"version": INDEX_VERSION, "fingerprint": self.fingerprint, "byteorder": sys.byteorder,
+                  "itemsize": array('i').itemsize, "columns": {}}
+        for name, column in self.columns.items():
+            header["columns"][name] = {"values": column.values, "grams": list(column.grams),
+                                       "lengths": [len(getattr(column, a)) for a in ColumnIndex.ARRAYS]}
+        with open(path, 'wb') as filehandle:
+            filehandle.write(json.dumps(header).encode() + b"\n")
+            for column in self.columns.values():
+                for name in ColumnIndex.ARRAYS:
+                    getattr(column, name).tofile(filehandle)
+        logger.debug(f"Saved trigram index to {path}")
+
+    @classmethod
+    def load(cls, path: str, fingerprint: int):
+        """Index saved at path, or None if it is for other statements or another layout"""
+
+        tic = time.perf_counter()
+        with open(path, 'rb') as filehandle:
+            header = json.loads(filehandle.readline())
+            if (header["version"] != INDEX_VERSION or header["fingerprint"] != fingerprint or header["byteorder"] != sys.byteorder
+                    or header["itemsize"] != array('i').itemsize):
+                logger.info(f"Index {path} is out of date")
+                return None
+            columns = {}
+            for name, layout in header["columns"].items():
+                arrays = {}
+                for array_name, length in zip(ColumnIndex.ARRAYS, layout["lengths"]):
+                    arrays[array_name] = array('i')
+                    arrays[array_name].fromfile(filehandle, length)
+                columns[name] = ColumnIndex(layout["values"], layout["grams"], **arrays)
+        logger.info(f"Loaded trigram index from {path} in {time.perf_counter() - tic:.2f}s")
+        return cls(columns, None, fingerprint)
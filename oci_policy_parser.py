@@ -0,0 +1,473 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Policy statement parsing shared by both loaders (oci_policy_analysis.py and tkinter/policy.py).
+#
+# match_statement() is a single-pass parser - a drop-in for POLICY_REGEX / SUBJECT_REGEX.
+# The regex has nested lazy quantifiers (the subject is ([...]|,)+? followed by optional groups), so a long
+# or malformed statement backtracks exponentially.  This parser walks the statement left to right with
+# plain character-class scanners and keyword checks.  The only search is for where the subject ends, and every
+# tail it tries (verb, resource, location, where, comment) is memoized by position, so each character is
+# looked at a bounded number of times - guaranteed linear time.
+#
+# StatementParser sits on top and is what the loaders call.  Statements are parsed once per distinct text
+# (Terraform-templated policies repeat the same text in every child compartment) into a ParsedStatement kept
+# in a bounded LRU, and only the lineage (policy name, OCIDs, hierarchy) is added per occurrence - as the
+# UI's 16-field list or the CLI's 10-tuple.
+
+import functools
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from typing import NamedTuple
+
+logger = logging.getLogger('oci-policy-parser')
+
+POLICY_REGEX = r'^\s*?(allow|endorse)\s+(?P<subjecttype>service|any-user|any-group|dynamic-group|dynamicgroup|group|resource)\s*(?P<subject>([\w\/\'\.\\, +-]|,)+?)?\s+(to\s+)?((?P<verb>read|inspect|use|manage)\s+(?P<resource>[\w-]+)|(?P<perm>{[\s*\w\s*|\s*\w\s*,\s*]+}))\s+in\s+(?P<locationtype>any-tenancy|tenancy|compartment\s+id|compartment)\s*(?P<location>[\w\':.-]+)?(?:\s+where\s+(?P<condition>.+))?(?:(?P<optional>\s*\/\/.+))?$'
+SUBJECT_REGEX = r'^(\'|\")?((?P<domain>[\w\-\_]+)(\/|\\))?(?P<name>[\w\-\_]+)(\'|\")?'
+
+# Statement parser - "lexer" (linear time, match_statement) or "regex" (POLICY_REGEX / SUBJECT_REGEX)
+PARSERS = ("lexer", "regex")
+PARSER = "lexer"
+
+# Distinct statement texts kept parsed
+CACHE_SIZE = 65536
+
+# Bulk parsing - distinct texts per task, and fewer distinct texts than this are parsed in-process
+# (starting the pool costs more than it saves)
+CHUNK_SIZE = 5000
+BULK_THRESHOLD = 20000
+
+# Character-class scanners (anchored, no nested quantifiers - nothing to backtrack)
+_WS = re.compile(r'\s*')
+_NEXT_WS = re.compile(r'\s')
+_SUBJECT_CHARS = re.compile(r'[\w\/\'\.\\, +-]*')
+_RESOURCE_CHARS = re.compile(r'[\w-]*')
+_LOCATION_CHARS = re.compile(r'[\w\':.-]*')
+_PERM = re.compile(r'\{[\s*\w|,]+\}')
+_NAME_CHARS = re.compile(r'[\w\-\_]*')
+
+STATEMENT_KEYWORDS = ("allow", "endorse")
+SUBJECT_TYPES = ("service", "any-user", "any-group", "dynamic-group", "dynamicgroup", "group", "resource")
+VERBS = ("read", "inspect", "use", "manage")
+GROUPS = ("subjecttype", "subject", "verb", "resource", "perm", "locationtype", "location", "condition", "optional")
+
+
+class _Scanner:
+    """State for one statement - position helpers plus memo tables for the tails already tried"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lower = text.lower()
+        self.n = len(text)
+        self.tails = {}
+        self.locations = {}
+
+    def skip_ws(self, i: int) -> int:
+        return _WS.match(self.text, i).end()
+
+    def is_ws(self, i: int) -> bool:
+        return i < self.n and self.text[i].isspace()
+
+    def keyword(self, i: int, word: str) -> bool:
+        return self.lower.startswith(word, i)
+
+    def eol(self, i: int) -> int:
+        """Where '.+' starting at i stops (next newline or end)"""
+        e = self.text.find("\n", i)
+        return self.n if e < 0 else e
+
+    ###########################################################################
+    # Tail pieces - each returns a dict of groups on success or None
+    ###########################################################################
+
+    def comment(self, q: int):
+        """(?P<optional>\\s*//.+) followed by $"""
+
+        t = self.skip_ws(q)
+        if self.text.startswith("//", t):
+            e = self.eol(t + 2)
+            if e > t + 2:
+                return self.text[q:e]
+        return None
+
+    def end(self, q: int):
+        """(?:\\s+where\\s+(?P<condition>.+))?(?:(?P<optional>\\s*//.+))?$ at q"""
+
+        # where clause - the condition runs to the end of the line, so this always ends the statement
+        if self.is_ws(q):
+            a = self.skip_ws(q)
+            if self.keyword(a, "where") and self.is_ws(a + 5):
+                b = self.skip_ws(a + 5)
+                for s in range(b, a + 5, -1):
+                    e = self.eol(s)
+                    if e > s:
+                        return {"condition": self.text[s:e], "optional": self.comment(e)}
+
+        # Comment only
+        optional = self.comment(q)
+        if optional is not None:
+            return {"condition": None, "optional": optional}
+
+        # End of statement (or line)
+        if q == self.n or self.text[q] == "\n":
+            return {"condition": None, "optional": None}
+        return None
+
+    def location(self, p: int):
+        """\\s*(?P<location>[\\w':.-]+)? then the end of the statement, memoized by p"""
+
+        if p in self.locations:
+            return self.locations[p]
+
+        result = None
+        ws_end = self.skip_ws(p)
+        loc_end = _LOCATION_CHARS.match(self.text, ws_end).end()
+        if loc_end > ws_end:
+            tail = self.end(loc_end)
+            if tail:
+                result = dict(tail, location=self.text[ws_end:loc_end])
+        if result is None:
+            tail = self.end(ws_end)
+            if tail:
+                result = dict(tail, location=None)
+        if result is None and ws_end > p:
+            # Giving back whitespace - the where/comment outcome is the same from anywhere in the run,
+            # and a bare newline inside it ends the statement
+            tail = self.end(ws_end - 1)
+            if tail is None and "\n" in self.text[p:ws_end]:
+                tail = {"condition": None, "optional": None}
+            if tail:
+                result = dict(tail, location=None)
+
+        self.locations[p] = result
+        return result
+
+    def location_type(self, g: int):
+        """(?P<locationtype>any-tenancy|tenancy|compartment\\s+id|compartment) and the rest"""
+
+        candidates = []
+        if self.keyword(g, "any-tenancy"):
+            candidates.append(g + 11)
+        if self.keyword(g, "tenancy"):
+            candidates.append(g + 7)
+        if self.keyword(g, "compartment"):
+            if self.is_ws(g + 11):
+                h = self.skip_ws(g + 11)
+                if self.keyword(h, "id"):
+                    candidates.append(h + 2)
+            candidates.append(g + 11)
+        for end in candidates:
+            rest = self.location(end)
+            if rest:
+                return dict(rest, locationtype=self.text[g:end])
+        return None
+
+    def tail(self, w: int):
+        """(to\\s+)?(verb resource|perm)\\s+in\\s+<location> from the first word after the subject, memoized by w"""
+
+        if w in self.tails:
+            return self.tails[w]
+
+        result = None
+        pos = w
+        if self.keyword(pos, "to") and self.is_ws(pos + 2):
+            pos = self.skip_ws(pos + 2)
+
+        groups = None
+        end = None
+        for verb in VERBS:
+            if self.keyword(pos, verb) and self.is_ws(pos + len(verb)):
+                r = self.skip_ws(pos + len(verb))
+                end = _RESOURCE_CHARS.match(self.text, r).end()
+                if end > r:
+                    groups = {"verb": self.text[pos:pos + len(verb)], "resource": self.text[r:end], "perm": None}
+                break
+        if groups is None:
+            perm = _PERM.match(self.text, pos)
+            if perm:
+                end = perm.end()
+                groups = {"verb": None, "resource": None, "perm": perm.group(0)}
+
+        if groups and self.is_ws(end):
+            f = self.skip_ws(end)
+            if self.keyword(f, "in") and self.is_ws(f + 2):
+                rest = self.location_type(self.skip_ws(f + 2))
+                if rest:
+                    result = dict(rest, **groups)
+
+        self.tails[w] = result
+        return result
+
+    ###########################################################################
+    # Statement
+    ###########################################################################
+
+    def statement_at(self, start: int):
+        """^\\s*?(allow|endorse)\\s+<subjecttype>\\s*<subject>?\\s+<tail> from a line start"""
+
+        k = self.skip_ws(start)
+        for word in STATEMENT_KEYWORDS:
+            if self.keyword(k, word):
+                k += len(word)
+                break
+        else:
+            return None
+        if not self.is_ws(k):
+            return None
+        k = self.skip_ws(k)
+
+        for subject_type in SUBJECT_TYPES:
+            if self.keyword(k, subject_type):
+                break
+        else:
+            return None
+        p0 = k + len(subject_type)
+        q = self.skip_ws(p0)
+
+        # Shortest subject whose following word starts a valid tail (the regex's lazy +?)
+        run_end = _SUBJECT_CHARS.match(self.text, q).end()
+        i = q + 1
+        while i <= run_end:
+            space = _NEXT_WS.search(self.text, i, run_end + 1)
+            if not space:
+                break
+            i = space.start()
+            j = self.skip_ws(i)
+            rest = self.tail(j)
+            if rest:
+                return dict(rest, subjecttype=self.text[k:p0], subject=self.text[q:i])
+            # Every subject ending inside this whitespace run leads to the same tail
+            i = j + 1
+
+        # No subject at all - only possible when whitespace separates the subject type from the tail
+        if q > p0:
+            rest = self.tail(q)
+            if rest:
+                return dict(rest, subjecttype=self.text[k:p0], subject=None)
+        return None
+
+
+def match_statement(statement: str):
+    """Parse an allow/endorse statement. Returns {group: value} with the same groups and values as
+    POLICY_REGEX (re.IGNORECASE | re.MULTILINE, re.search), or None if the statement doesn't match"""
+
+    scanner = _Scanner(statement)
+    start = 0
+    while True:
+        groups = scanner.statement_at(start)
+        if groups:
+            return groups
+        newline = statement.find("\n", start)
+        if newline < 0:
+            return None
+        start = newline + 1
+
+
+def split_subject(subject: str):
+    """Split a subject into (domain, name) as SUBJECT_REGEX does. Domain is None when not given,
+    and None is returned when the subject doesn't start with a name"""
+
+    k = 1 if subject[:1] in ("'", '"') else 0
+    domain_end = _NAME_CHARS.match(subject, k).end()
+    if domain_end > k and subject[domain_end:domain_end + 1] in ("/", "\\"):
+        name_end = _NAME_CHARS.match(subject, domain_end + 1).end()
+        if name_end > domain_end + 1:
+            return subject[k:domain_end], subject[domain_end + 1:name_end]
+    if domain_end > k:
+        return None, subject[k:domain_end]
+    return None
+
+
+###############################################################################
+# Shared statement parser (both loaders)
+###############################################################################
+
+def normalize(statement: str) -> str:
+    """Cache key for a statement - the loaders compare and store statements casefolded"""
+
+    return statement.casefold()
+
+
+def partition_columns(text: str) -> tuple:
+    """(subject, verb, resource, location, condition) by plain partitioning - the CLI's historic split,
+    kept for statements the grammar doesn't accept so they still land somewhere searchable"""
+
+    pass1 = text.partition(" where ")
+    condition = pass1[2]
+    pass2a = pass1[0].partition("allow ")
+    pass2b = pass2a[2].partition(" to ")
+    subject = pass2b[0]
+    pass3 = pass2b[2].partition(" in ")
+    location = pass3[2]
+    pass4 = pass3[0].partition(" ")
+    return subject, pass4[0], pass4[2], location, condition
+
+
+class ParsedStatement(NamedTuple):
+    """Parse of one statement text without lineage - every occurrence of the same text shares this object"""
+
+    text: str
+    # Parsed cleanly - an empty hierarchy is shown as ROOT
+    matched: bool
+    # Fields 4-14 of the statement list (text, valid, subject-type, (domain, name), verb ... optional)
+    fields: tuple
+    # CLI view - (subject, verb, resource, location, condition)
+    columns: tuple
+
+
+class StatementParser:
+    """Statement text to ParsedStatement through a bounded LRU, plus the per-occurrence views the loaders keep"""
+
+    def __init__(self, parser: str = PARSER, cache_size: int = CACHE_SIZE):
+        """parser is "lexer" or "regex" (same output), cache_size the number of distinct texts kept parsed"""
+
+        if parser not in PARSERS:
+            raise ValueError(f"Unknown parser {parser}, expected one of {PARSERS}")
+        self.parser = parser
+        self.policy_pattern = re.compile(POLICY_REGEX, re.IGNORECASE | re.MULTILINE)
+        self.subject_pattern = re.compile(SUBJECT_REGEX, re.IGNORECASE)
+        self._cached_parse = functools.lru_cache(maxsize=cache_size)(self._parse)
+
+        # Results of a bulk parse, taken by _parse while they are loaded into the LRU
+        self._primed = {}
+        self._prime_lock = Lock()
+
+    def _groups(self, text: str):
+        if self.parser == "regex":
+            result = self.policy_pattern.search(text)
+            return result.groupdict() if result else None
+        return match_statement(text)
+
+    def _split_subject(self, subject: str):
+        if self.parser == "regex":
+            result = self.subject_pattern.search(subject)
+            return (result.group('domain'), result.group('name')) if result else None
+        return split_subject(subject)
+
+    def _parse(self, text: str) -> ParsedStatement:
+        """Parse a normalized statement (cache miss)"""
+
+        primed = self._primed.get(text)
+        if primed is not None:
+            return primed
+        groups = self._groups(text)
+        if not groups:
+            logger.info(f"No parse result: {text}")
+            subject_type = "define" if text.startswith("define") else "other"
+            return ParsedStatement(text, False, (text, True, subject_type, ("", ""), "", "", False, "", "", "", ""),
+                                   partition_columns(text))
+
+        subject_type = groups['subjecttype']
+        location = f"{groups['locationtype']} {groups['location']}" if groups['location'] else groups['locationtype']
+        columns = (subject_type if subject_type in ("any-user", "any-group") or not groups['subject'] else f"{subject_type} {groups['subject']}",
+                   groups['verb'] or groups['perm'],
+                   groups['resource'] or "",
+                   location,
+                   groups['condition'] or "")
+
+        # Post-process any-user / any-group, otherwise subject(domain/group)
+        if subject_type in ("any-user", "any-group"):
+            subject = (None, subject_type)
+        else:
+            split = self._split_subject(groups['subject'] or "")
+            if not split:
+                logger.warning(f"Failed to parse subject of statement: {text}")
+                return ParsedStatement(text, False, (text, False, "other", ("", ""), "", "", False, "", "", "", ""), columns)
+            subject = ("Default" if not split[0] else split[0], split[1])
+
+        fields = (text, True, subject_type, subject,
+                  groups['verb'] or "",
+                  groups['resource'] or "",
+                  groups['perm'],
+                  groups['locationtype'],
+                  groups['location'] or "",
+                  groups['condition'] or "",
+                  groups['optional'] or "")
+        return ParsedStatement(text, True, fields, columns)
+
+    def parse(self, statement: str) -> ParsedStatement:
+        """Shared parse of a statement - cached on the normalized text"""
+
+        return self._cached_parse(normalize(statement))
+
+    def parse_bulk(self, statements: list, workers: int = None, chunk_size: int = CHUNK_SIZE) -> list:
+        """ParsedStatement per statement, in order - distinct texts are parsed in chunks on a pool of worker processes
+        (default one per CPU) and loaded into the cache, so later parse() calls for them are hits.
+        Small batches, or workers=1, parse in-process"""
+
+        texts = [normalize(statement) for statement in statements]
+        distinct = list(dict.fromkeys(texts))
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(distinct) < BULK_THRESHOLD:
+            return [self._cached_parse(text) for text in texts]
+
+        chunks = [distinct[i:i + chunk_size] for i in range(0, len(distinct), chunk_size)]
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_start_worker, initargs=(self.parser,)) as pool:
+            # map keeps chunk order - results line up with distinct
+            parsed = [result for chunk in pool.map(_parse_chunk, chunks) for result in chunk]
+        by_text = dict(zip(distinct, parsed))
+        with self._prime_lock:
+            self._primed = by_text
+            try:
+                for text in distinct:
+                    self._cached_parse(text)
+            finally:
+                self._primed = {}
+        logger.info(f"Parsed {len(distinct)} distinct of {len(texts)} statements on {min(workers, len(chunks))} processes")
+        return [by_text[text] for text in texts]
+
+    def statement_list(self, statement: str, hierarchy: str, policy) -> list:
+        """UI representation - 16 fields, lineage (0-3, 15) added to the shared parse (4-14)"""
+
+        parsed = self.parse(statement)
+        if parsed.matched and not hierarchy:
+            # Hierarchy ROOT so searchable
+            hierarchy = "ROOT"
+        return [policy.name, policy.id, policy.compartment_id, f"{hierarchy}", *parsed.fields,
+                policy.time_created.strftime("%m/%d/%Y %H:%M:%S")]
+
+    def statement_tuple(self, statement: str, comp_string: str, policy) -> tuple:
+        """CLI representation - (subject, verb, resource, location, condition, hierarchy, policy name, policy OCID,
+        compartment OCID, statement)"""
+
+        parsed = self.parse(statement)
+        subject, verb, resource, location, condition = parsed.columns
+
+        # Location Update
+        # If compartment name, use hierarchy, if id or tenancy then leave alone (also at the root)
+        if "compartment id" not in location and "tenancy" not in location and comp_string != "":
+            location = f"compartment {comp_string}:{location.partition('compartment ')[2]}"
+
+        return (subject, verb, resource, location, condition,
+                f"{comp_string}", policy.name, policy.id, policy.compartment_id, parsed.text)
+
+    def cache_info(self):
+        """functools cache statistics (hits, misses, maxsize, currsize)"""
+
+        return self._cached_parse.cache_info()
+
+    def cache_clear(self):
+        self._cached_parse.cache_clear()
+
+
+# Bulk parse workers - one parser per process
+_worker_parser = None
+
+
+def _start_worker(parser: str):
+    global _worker_parser
+    _worker_parser = StatementParser(parser=parser, cache_size=0)
+
+
+def _parse_chunk(texts: list) -> list:
+    """ParsedStatement per (normalized, distinct) text"""
+
+    return [_worker_parser._parse(text) for text in texts]
@@ -0,0 +1,415 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Effective permissions from parsed UI statements (PolicyAnalysis fields subject type/subject, verb, resource,
+# location type and location) and the compartment hierarchy.
+# Each "allow" statement becomes a Grant per subject ("group a, group b" lists are split out of the text), scoped
+# to a compartment path: the tenancy, a compartment named relative
+# to the policy's compartment (a:b:c, which may start with that compartment), or a compartment OCID.  A grant applies in its compartment and every
+# compartment below it, so each compartment gets a closure - the grants of its ancestors plus its own - indexed
+# by subject and by resource.  Verbs are ordered (inspect < read < use < manage) and resource families expand
+# to their resource types, so questions are answered with a few dictionary lookups:
+#   engine.permissions(subject, "a/b/c")            - what the subject can do in a/b/c, per resource type
+#   engine.can(subject, "use", "instances", "a/b")  - the grants that allow it (empty if none)
+#   engine.who_can("manage", "buckets", "a/b")      - subjects with grants that allow it
+# Subjects are (subject type, domain, name) keys - see subject_key - or (subject type, None, OCID) for "group id ocid1...".
+# A statement whose subject list can't be resolved is counted in skipped, never given to its first subject.  Grants with a condition are included
+# and flagged, unless a request context is given: then only those whose condition holds in it are
+# (oci_policy_conditions.py) - eg what a tag value would unlock.
+#
+#   python3 oci_policy_permissions.py <tenancy OCID> --subject "group Default/Admins" --compartment a/b/c
+#   python3 oci_policy_permissions.py <tenancy OCID> --verb manage --resource instances --compartment a/b/c
+#   python3 oci_policy_permissions.py <tenancy OCID> --verb read --resource buckets --set target.bucket.name=logs
+
+import argparse
+import logging
+import os
+import re
+import time
+from typing import NamedTuple
+
+from oci_policy_conditions import ConditionError, compile_condition, context_of, parse_settings
+from oci_policy_parser import match_statement
+
+logger = logging.getLogger('oci-policy-permissions')
+
+# Each verb includes the ones before it
+VERBS = ("inspect", "read", "use", "manage")
+VERB_RANK = {verb: rank for rank, verb in enumerate(VERBS)}
+
+ALL_RESOURCES = "all-resources"
+
+# Aggregate resource types and the individual types they cover (OCI policy reference)
+RESOURCE_FAMILIES = {
+    "cluster-family": ("clusters", "cluster-node-pools", "cluster-virtualnode-pools", "cluster-workrequests"),
+    "compute-management-family": ("instance-configurations", "instance-pools", "cluster-networks"),
+    "database-family": ("db-systems", "db-nodes", "db-homes", "databases", "pluggable-databases", "db-backups",
+                        "backup-destinations", "vmclusters", "exadata-infrastructures"),
+    "autonomous-database-family": ("autonomous-databases", "autonomous-backups", "autonomous-container-databases",
+                                   "autonomous-vmclusters", "cloud-autonomous-vmclusters", "cloud-exadata-infrastructures"),
+    "dns": ("dns-zones", "dns-records", "dns-traffic", "dns-steering-policies", "dns-steering-policy-attachments",
+            "dns-resolvers", "dns-resolver-endpoints", "dns-views", "dns-tsig-keys"),
+    "email-family": ("email-senders", "suppressions", "email-domains", "dkims"),
+    "file-family": ("file-systems", "mount-targets", "export-sets"),
+    "functions-family": ("fn-app", "fn-function", "fn-invocation"),
+    "instance-family": ("app-catalog-listing", "console-histories", "instances", "instance-console-connection",
+                        "instance-images", "volume-attachments"),
+    "log-analytics-family": ("loganalytics-features-family", "loganalytics-resources-family"),
+    "logging-family": ("log-groups", "log-content", "unified-configuration"),
+    "object-family": ("buckets", "objects", "objectstorage-namespaces"),
+    "ons-family": ("ons-topics", "ons-subscriptions"),
+    "stream-family": ("stream-pools", "streams", "stream-push", "stream-pull", "connect-harness"),
+    "virtual-network-family": ("vcns", "subnets", "route-tables", "network-security-groups", "security-lists",
+                               "dhcp-options", "private-ips", "public-ips", "ipv6s", "internet-gateways", "nat-gateways",
+                               "service-gateways", "local-peering-gateways", "remote-peering-connections", "drgs",
+                               "drg-attachments", "drg-route-tables", "drg-route-distributions", "cpes",
+                               "ipsec-connections", "cross-connects", "cross-connect-groups", "virtual-circuits",
+                               "vnics", "vnic-attachments", "vlans", "byoip-ranges", "vtaps", "capture-filters"),
+    "volume-family": ("volumes", "volume-attachments", "volume-backups", "boot-volume-backups", "backup-policies",
+                      "backup-policy-assignments", "volume-groups", "volume-group-backups"),
+}
+
+# Subjects every statement for them applies to - any-group covers groups and dynamic groups
+ANY_USER = ("any-user", None, "any-user")
+ANY_GROUP = ("any-group", None, "any-group")
+
+
+# One subject of a statement's comma-separated list: [type] (id <ocid> | [domain/]name), names quoted if they
+# have spaces.  Groups: 1 type, 2 OCID, 3-5 domain (quoted ' or " or bare), 6-8 name
+SUBJECT_NAME = r"""(?:'([^']+)'|"([^"]+)"|([^\s'"/,]+))"""
+SUBJECT_ITEM = re.compile(r"\s*(?:(group|dynamic-group|dynamicgroup|service|resource)\s+)?"
+                          r"(?:id\s+(ocid1\.\S+)|(?:" + SUBJECT_NAME + r"\s*/\s*)?" + SUBJECT_NAME + r")\s*$")
+
+
+def subject_key(subject_type: str, name: str, domain: str = "Default") -> tuple:
+    """(subject type, domain, name) as grants index them - casefolded, domain None for any-user / any-group"""
+
+    if subject_type in ("any-user", "any-group"):
+        return (subject_type, None, subject_type)
+    subject_type = subject_type.casefold()
+    return ("dynamic-group" if subject_type == "dynamicgroup" else subject_type, (domain or "Default").casefold(), name.casefold())
+
+
+def id_subject_key(subject_type: str, ocid: str) -> tuple:
+    """(subject type, None, OCID) for a subject given by OCID ("group id ocid1...")"""
+
+    subject_type = subject_type.casefold()
+    return ("dynamic-group" if subject_type == "dynamicgroup" else subject_type, None, ocid.casefold())
+
+
+def parse_subject(subject: str) -> tuple:
+    """subject_key for "group Admins", "dynamic-group Domain/Name", "group id ocid1..." or "any-user" """
+
+    subject_type, _, name = subject.strip().partition(" ")
+    name = name.strip()
+    if name.startswith("id ") and name[3:].strip().startswith("ocid1."):
+        return id_subject_key(subject_type, name[3:].strip())
+    domain, _, group = name.rpartition("/")
+    return subject_key(subject_type, group.strip("'\""), domain.strip("'\""))
+
+
+def statement_subjects(statement):
+    """subject keys of every subject of a 16-field UI statement ("allow group a, group b ..." has two),
+    or None if the subject list can't be resolved"""
+
+    subject_type = statement[6]
+    if subject_type in ("any-user", "any-group"):
+        return [subject_key(subject_type, subject_type)]
+    text = statement[4]
+    head = text[:text.find(" to ")]
+    if not any(mark in head for mark in (",", "'", '"', " id ")):
+        # One plain subject - the parsed (domain, name) is all of it
+        return [subject_key(subject_type, statement[7][1], statement[7][0])] if statement[7][1] else None
+
+    groups = match_statement(text)
+    if not groups or not groups["subject"]:
+        return None
+    subjects = []
+    current = groups["subjecttype"]
+    for item in groups["subject"].split(","):
+        match = SUBJECT_ITEM.match(item)
+        if not match:
+            return None
+        # "group a, b" - a subject without a type has the one before it
+        current = match.group(1) or current
+        if match.group(2):
+            subjects.append(id_subject_key(current, match.group(2)))
+        else:
+            domain = match.group(3) or match.group(4) or match.group(5)
+            subjects.append(subject_key(current, match.group(6) or match.group(7) or match.group(8), domain))
+    return subjects
+
+
+def compartment_path(path: str) -> str:
+    """Casefolded hierarchy path ('a/b/c/', root '') from 'a/b/c', 'a:b:c', '/a/b/' or ROOT"""
+
+    if path is None or path == "ROOT":
+        return ""
+    parts = [part for part in path.replace(":", "/").casefold().split("/") if part]
+    return "/".join(parts) + "/" if parts else ""
+
+
+def parent_path(path: str) -> str:
+    return path[:path.rstrip("/").rfind("/") + 1] if path else None
+
+
+class Grant(NamedTuple):
+    """One allow statement, scoped to a compartment path (and everything below it)"""
+
+    id: int
+    subject: tuple
+    verb: str
+    rank: int
+    resource: str
+    scope: str
+    condition: str
+    policy_name: str
+    policy_id: str
+    text: str
+
+
+class Access(NamedTuple):
+    """What a subject can do on one resource type in a compartment"""
+
+    # Highest verb granted without a condition (None if only conditional grants)
+    verb: str
+    # Every grant that applies, conditional or not
+    grants: tuple
+
+
+class Closure:
+    """Grant ids in effect in one compartment, by subject (then resource) and by resource"""
+
+    __slots__ = ("subjects", "resources")
+
+    def __init__(self, subjects: dict = None, resources: dict = None):
+        self.subjects = subjects or {}
+        self.resources = resources or {}
+
+    def extend(self, grants: list):
+        """Closure of a child compartment: this one plus its own grants (unchanged entries are shared)"""
+
+        if not grants:
+            return self
+        subjects, resources = dict(self.subjects), dict(self.resources)
+        copied = set()
+        for grant in grants:
+            if grant.subject not in copied:
+                subjects[grant.subject] = dict(subjects.get(grant.subject, {}))
+                copied.add(grant.subject)
+            by_resource = subjects[grant.subject]
+            by_resource[grant.resource] = by_resource.get(grant.resource, ()) + (grant.id,)
+            resources[grant.resource] = resources.get(grant.resource, ()) + (grant.id,)
+        return Closure(subjects, resources)
+
+
+class PermissionEngine:
+    """Grants of a statement set with a closure per compartment"""
+
+    def __init__(self, grants: list, closures: dict, families: dict, skipped: dict):
+        self.grants = grants
+        self.closures = closures
+        self.families = families
+        self.skipped = skipped
+        # Resource type -> families covering it
+        self.member_of = {}
+        for family, members in families.items():
+            for member in members:
+                self.member_of.setdefault(member, []).append(family)
+
+    @classmethod
+    def build(cls, statements, tree=None, families: dict = RESOURCE_FAMILIES):
+        """Engine for 16-field UI statements.  tree is a CompartmentTree (compartment OCIDs and compartments
+        without policies) - without it, compartments come from the statements' hierarchies and locations"""
+
+        tic = time.perf_counter()
+        # Compartment OCID -> path, from the tree and from the compartments policies are attached to
+        id_paths = {ocid: compartment_path(path) for ocid, path in tree.paths.items()} if tree else {}
+        for statement in statements:
+            id_paths.setdefault(statement[2], compartment_path(statement[3]))
+
+        known = set(id_paths.values())
+        grants, direct, skipped = [], {}, {}
+        subject_lists = {}
+        for statement in statements:
+            reason = None
+            verb = statement[8]
+            location_type, location = statement[11], statement[12]
+            policy_path = compartment_path(statement[3])
+            if not statement[4].startswith("allow"):
+                reason = "not an allow statement"
+            elif verb not in VERB_RANK:
+                reason = "permission list" if statement[10] else "no verb"
+            elif location_type == "tenancy":
+                # A named tenancy is cross-tenancy access, not a scope here
+                scope = "" if not location else None
+                reason = None if not location else "cross-tenancy"
+            elif location_type == "compartment id":
+                scope = id_paths.get(location)
+                reason = None if scope is not None else "unknown compartment OCID"
+            elif location_type == "compartment":
+                scope = policy_path + compartment_path(location)
+                # The path may start at the policy's own compartment - take whichever compartment exists
+                if scope not in known and policy_path and parent_path(policy_path) + compartment_path(location) in known:
+                    scope = parent_path(policy_path) + compartment_path(location)
+            else:
+                reason = f"location type {location_type}"
+            if not reason:
+                # Statements repeat across compartments - split each distinct text's subject list once
+                subjects = subject_lists.get(statement[4])
+                if subjects is None:
+                    subjects = subject_lists[statement[4]] = statement_subjects(statement) or ()
+                if not subjects:
+                    reason = "unresolved subject"
+            if reason:
+                skipped[reason] = skipped.get(reason, 0) + 1
+                continue
+            # One grant per subject
+            for subject in subjects:
+                grant = Grant(len(grants), subject, verb, VERB_RANK[verb], statement[9], scope, statement[13] or "",
+                              statement[0], statement[1], statement[4])
+                grants.append(grant)
+                direct.setdefault(scope, []).append(grant)
+
+        # Every known compartment and its ancestors, parents before children
+        paths = {""}
+        for path in (*id_paths.values(), *direct):
+            while path not in paths:
+                paths.add(path)
+                path = parent_path(path)
+        closures = {}
+        for path in sorted(paths, key=lambda p: p.count("/")):
+            parent = closures[parent_path(path)] if path else Closure()
+            closures[path] = parent.extend(direct.get(path))
+        logger.info(f"Built permissions for {len(grants)} grants over {len(closures)} compartments in {time.perf_counter() - tic:.2f}s "
+                    f"(skipped {sum(skipped.values())} statements: {skipped})")
+        return cls(grants, closures, families, skipped)
+
+    def closure(self, compartment: str) -> Closure:
+        """Closure of a compartment path - one below the known compartments gets its nearest ancestor's"""
+
+        path = compartment_path(compartment)
+        while path not in self.closures:
+            path = parent_path(path)
+        return self.closures[path]
+
+    def subjects_for(self, subject: tuple) -> tuple:
+        """The subject plus any-user / any-group, whose grants also apply to it"""
+
+        if subject[0] in ("group", "dynamic-group"):
+            return (subject, ANY_GROUP, ANY_USER)
+        return (subject, ANY_USER) if subject != ANY_USER else (subject,)
+
+    def resources_for(self, resource: str) -> tuple:
+        """Resource types whose grants cover resource - itself, its families and all-resources"""
+
+        return (resource, *self.member_of.get(resource, ()), ALL_RESOURCES)
+
+    def applies(self, grant: Grant, context: dict) -> bool:
+        """Unconditional, or no context (conditional grants are kept, flagged), or its condition holds in context"""
+
+        if not grant.condition or context is None:
+            return True
+        try:
+            return compile_condition(grant.condition)(context)
+        except ConditionError as exc:
+            logger.debug(f"Grant {grant.id} doesn't apply: {exc}")
+            return False
+
+    def access(self, grant_ids, context: dict = None) -> Access:
+        grants = tuple(grant for grant in (self.grants[n] for n in sorted(set(grant_ids))) if self.applies(grant, context))
+        # Without a context, only unconditional grants count for the verb
+        granted = [grant.rank for grant in grants if context is not None or not grant.condition]
+        return Access(VERBS[max(granted)] if granted else None, grants)
+
+    def permissions(self, subject: tuple, compartment: str, context: dict = None) -> dict:
+        """resource type -> Access for a subject in a compartment, families expanded to their resource types.
+        context (variable -> value) drops the conditional grants whose condition doesn't hold"""
+
+        closure = self.closure(compartment)
+        granted = {}
+        for key in self.subjects_for(subject):
+            for resource, grant_ids in closure.subjects.get(key, {}).items():
+                for covered in (resource, *self.families.get(resource, ())):
+                    granted.setdefault(covered, []).extend(grant_ids)
+        context = context_of(context) if context is not None else None
+        access = {resource: self.access(grant_ids, context) for resource, grant_ids in sorted(granted.items())}
+        return {resource: entry for resource, entry in access.items() if entry.grants}
+
+    def can(self, subject: tuple, verb: str, resource: str, compartment: str, context: dict = None) -> list:
+        """Grants letting subject do verb on resource in compartment (conditional ones included, or with a
+        context only those whose condition holds)"""
+
+        closure = self.closure(compartment)
+        rank = VERB_RANK[verb]
+        grant_ids = set()
+        for key in self.subjects_for(subject):
+            by_resource = closure.subjects.get(key, {})
+            for covering in self.resources_for(resource):
+                grant_ids.update(by_resource.get(covering, ()))
+        context = context_of(context) if context is not None else None
+        return [self.grants[n] for n in sorted(grant_ids) if self.grants[n].rank >= rank and self.applies(self.grants[n], context)]
+
+    def who_can(self, verb: str, resource: str, compartment: str, context: dict = None) -> dict:
+        """subject -> grants letting it do verb on resource in compartment (conditional ones included, or with a
+        context only those whose condition holds)"""
+
+        closure = self.closure(compartment)
+        rank = VERB_RANK[verb]
+        context = context_of(context) if context is not None else None
+        subjects = {}
+        for covering in self.resources_for(resource):
+            for n in closure.resources.get(covering, ()):
+                grant = self.grants[n]
+                if grant.rank >= rank and self.applies(grant, context):
+                    subjects.setdefault(grant.subject, []).append(grant)
+        return subjects
+
+
+def describe(grant: Grant) -> str:
+    return f"{grant.verb} {grant.resource} in {grant.scope or 'tenancy'}{' (conditional)' if grant.condition else ''} - {grant.policy_name}: {grant.text}"
+
+
+if __name__ == "__main__":
+    from oci_policy_snapshot import load_json, load_table, open_snapshot
+    from oci_policy_store import PolicyStatement, StatementStore
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s [%(threadName)s] %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser()
+    parser.add_argument("tenancy", help="Tenancy OCID of a UI cache (.policy-ui-snapshot-<tenancy>.dat) in this directory")
+    parser.add_argument("--compartment", help="Compartment path, eg a/b/c (default: tenancy)", default="")
+    parser.add_argument("--subject", help="What this subject can do, eg \"group Default/Admins\"")
+    parser.add_argument("--verb", help="Who can do this verb on --resource", choices=VERBS)
+    parser.add_argument("--resource", help="Resource type for --verb (or to check --subject against)")
+    parser.add_argument("--set", help="Request context for conditional grants, eg target.resource.tag.ns.key=value (repeat)",
+                        action="append")
+    args = parser.parse_args()
+    context = parse_settings(args.set) if args.set else None
+
+    statements = load_table(open_snapshot(f".policy-ui-snapshot-{args.tenancy}.dat", args.tenancy), "statement", PolicyStatement)
+    if statements is None:
+        rows = load_json(f".policy-statement-cache-{args.tenancy}.dat")
+        if rows is None:
+            logger.error(f"No cached statements for {args.tenancy} in {os.getcwd()} - load the tenancy in the UI first")
+            exit(1)
+        statements = StatementStore(rows=rows)
+    engine = PermissionEngine.build(statements)
+
+    if args.subject and args.verb and args.resource:
+        for grant in engine.can(parse_subject(args.subject), args.verb, args.resource, args.compartment, context):
+            print(describe(grant))
+    elif args.subject:
+        for resource, access in engine.permissions(parse_subject(args.subject), args.compartment, context).items():
+            print(f"{access.verb or 'conditional':10} {resource:40} {len(access.grants)} grants")
+    elif args.verb and args.resource:
+        for subject, grants in engine.who_can(args.verb, args.resource, args.compartment, context).items():
+            print(f"{subject[0]} {subject[1] + '/' if subject[1] else ''}{subject[2]}")
+            for grant in grants:
+                print(f"    {describe(grant)}")
+    else:
+        parser.error("give --subject (with --verb and --resource to check one permission), or --verb and --resource")
@@ -0,0 +1,230 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Filter compiler for the statement filters (PolicyAnalysis.filter_policy_statements and the script's -sf/-vf/...).
+# Each filter is a '|'-separated list of case-insensitive substrings (any may match); all filters must match.
+# The filters are run as plain closures over the store's casefolded columns (no generated code): the first
+# filter scans its column, each later one only checks the rows still matching, and records are read for the
+# final rows only.  A query returns each statement at most once and keeps the store order.
+# With a TrigramIndex (oci_policy_index.py) the rows come from the index postings instead of a scan.
+# QueryCache keeps recent results by normalized filter, until the data they came from changes.
+
+import logging
+from collections import OrderedDict
+from threading import Lock
+
+logger = logging.getLogger('oci-policy-query')
+
+# Use the index only when its most selective clause matches under 1/INDEX_SCAN_RATIO of the statements
+INDEX_SCAN_RATIO = 4
+
+# Statements (references) held across all cached results before the least recently used are dropped
+MAX_CACHED_ROWS = 2000000
+
+# UI statements: filter name -> (column, extract) - column names the store's folded column cache
+FILTER_COLUMNS = {
+    "subject": ("subject_name", lambda statement: statement.subject[1]),
+    "verb": ("verb", lambda statement: statement.verb),
+    "resource": ("resource", lambda statement: statement.resource),
+    "location": ("location", lambda statement: statement.location),
+    "hierarchy": ("hierarchy", lambda statement: statement.hierarchy),
+    "condition": ("condition", lambda statement: statement.condition),
+    "text": ("text", lambda statement: statement.text),
+    "policy": ("policy_name", lambda statement: statement.policy_name),
+    # A location alternative of exactly "tenancy" matches the location type instead of the location
+    "location_type": ("location_type", lambda statement: statement.location_type),
+}
+
+# Script statements (StatementSummary)
+SUMMARY_FILTER_COLUMNS = {
+    "subject": ("subject", lambda statement: statement.subject),
+    "verb": ("verb", lambda statement: statement.verb),
+    "resource": ("resource", lambda statement: statement.resource),
+    "location": ("location", lambda statement: statement.location),
+    "condition": ("condition", lambda statement: statement.condition),
+    "hierarchy": ("hierarchy", lambda statement: statement.hierarchy),
+    "policy": ("policy_name", lambda statement: statement.policy_name),
+    "text": ("text", lambda statement: statement.text),
+}
+
+
+def filter_alternatives(value: str, separator: str = '|'):
+    """Distinct casefolded alternatives of a filter, sorted - None if the filter matches everything"""
+
+    alternatives = {alternative.casefold() for alternative in value.split(sep=separator)} if value else {""}
+    return None if "" in alternatives else tuple(sorted(alternatives))
+
+
+def matching_rows(rows, clause, columns) -> list:
+    """Rows (of all rows if None) where any (column position, needle) of the clause matches, in row order"""
+
+    if len(clause) == 1:
+        ((position, needle),) = clause
+        column = columns[position]
+        if rows is None:
+            return [i for i, value in enumerate(column) if needle in value]
+        return [i for i in rows if needle in column[i]]
+    # One tight pass per alternative - a row matching several is kept once
+    matched = set()
+    for alternative in clause:
+        matched.update(matching_rows(rows, (alternative,), columns))
+    return sorted(matched)
+
+
+class StatementQuery:
+    """Compiled set of filters - run(store) returns the matching statements"""
+
+    def __init__(self, columns: dict = FILTER_COLUMNS, separator: str = '|', **filters):
+        """filters are keyword arguments named as in columns, each a separator-delimited string (None or "" for no filter).
+        separator=None takes each filter as a single substring"""
+
+        # Clauses are AND'ed, each is a list of (column, needle) alternatives that are OR'ed.
+        # A filter with an empty alternative matches everything, so it adds no clause.
+        self.clauses = []
+        for name, value in filters.items():
+            alternatives = value.split(sep=separator) if value and separator else [value or ""]
+            if "" in alternatives:
+                continue
+            clause = []
+            for alternative in dict.fromkeys(alternatives):
+                if name == "location" and alternative == "tenancy" and "location_type" in columns:
+                    column = columns["location_type"]
+                else:
+                    column = columns[name]
+                clause.append((column, alternative.casefold()))
+            self.clauses.append(clause)
+
+        # Same for any order or repeat of filters and alternatives
+        self.key = frozenset(frozenset((name, needle) for (name, _), needle in clause) for clause in self.clauses)
+
+        # Columns the predicate reads, in first-use order
+        self.columns = list(dict.fromkeys(column for clause in self.clauses for column, _ in clause))
+        self.function = self.build()
+
+    def build(self):
+        """query(records, *columns) - records are only read for matching rows (a snapshot store decodes them on
+        first read)"""
+
+        if not self.clauses:
+            return lambda records: list(records)
+        position = {column: i for i, column in enumerate(self.columns)}
+        # Each clause as ((column position, needle), ...) - alternatives OR'ed, clauses AND'ed
+        clauses = tuple(tuple((position[column], needle) for column, needle in clause) for clause in self.clauses)
+
+        def query(records, *columns):
+            rows = None
+            for clause in clauses:
+                rows = matching_rows(rows, clause, columns)
+                if not rows:
+                    return []
+            return [records[i] for i in rows]
+        return query
+
+    def run(self, store, index=None) -> list:
+        """Matching statements of a StatementStore, in store order - through index if it is current for the store"""
+
+        if index is not None and self.clauses and index.is_current(store):
+            result = self.run_indexed(store, index)
+            if result is not None:
+                return result
+        columns = [store.folded_column(name, extract) for name, extract in self.columns]
+        return self.function(store.records, *columns)
+
+    def run_indexed(self, store, index) -> list:
+        """Rows of the most selective clause from the index, the other clauses checked on those rows only.
+        None if even that clause may match too much of the store for the index to beat a scan"""
+
+        # Upper bound on the rows of each clause, from the row counts of the needles' rarest trigrams
+        estimates = [sum(index.columns[name].estimate(needle) for (name, _), needle in clause) for clause in self.clauses]
+        seed = min(range(len(self.clauses)), key=estimates.__getitem__)
+        if estimates[seed] == 0:
+            return []
+        if estimates[seed] > len(store) // INDEX_SCAN_RATIO:
+            return None
+
+        # A row can hold matching values in two columns of the seed clause (location and location type)
+        rows = set()
+        for (name, _), needle in self.clauses[seed]:
+            column = index.columns[name]
+            rows.update(column.rows(column.matching_values(needle)))
+        rows = sorted(rows)
+
+        for clause in self.clauses[:seed] + self.clauses[seed + 1:]:
+            checks = [(store.folded_column(name, extract), needle) for (name, extract), needle in clause]
+            if len(checks) == 1:
+                column, needle = checks[0]
+                rows = [r for r in rows if needle in column[r]]
+            else:
+                rows = [r for r in rows if any(needle in column[r] for column, needle in checks)]
+        records = store.records
+        return [records[r] for r in rows]
+
+    def __repr__(self):
+        predicate = " and ".join("(" + " or ".join(f"{needle!r} in {name}" for (name, _), needle in clause) + ")"
+                                 for clause in self.clauses)
+        return f"StatementQuery({predicate or 'everything'})"
+
+
+class QueryCache:
+    """Least recently used query results, bounded by the statements they hold.
+    bump() whenever the data changes - it empties the cache and results computed before it are not kept"""
+
+    def __init__(self, max_rows: int = MAX_CACHED_ROWS):
+        self.max_rows = max_rows
+        self.results = OrderedDict()
+        self.rows = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def bump(self):
+        with self.lock:
+            self.generation += 1
+            self.results.clear()
+            self.rows = 0
+
+    def get(self, key):
+        """Cached result (shared - do not modify it) or None"""
+
+        with self.lock:
+            result = self.results.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.results.move_to_end(key)
+                self.hits += 1
+            return result
+
+    def put(self, key, result: list, generation: int):
+        """Keep result if the data hasn't changed since generation (read before computing it)"""
+
+        with self.lock:
+            if generation != self.generation or len(result) > self.max_rows:
+                return
+            previous = self.results.pop(key, None)
+            if previous is not None:
+                self.rows -= len(previous)
+            self.results[key] = result
+            self.rows += len(result)
+            while self.rows > self.max_rows:
+                _, evicted = self.results.popitem(last=False)
+                self.rows -= len(evicted)
+
+    def lookup(self, key, compute) -> list:
+        """Cached result for key, else compute() and cache it"""
+
+        generation = self.generation
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            self.put(key, result, generation)
+        return result
+
+    def __repr__(self):
+        return f"QueryCache(entries={len(self.results)}, rows={self.rows}, hits={self.hits}, misses={self.misses}, generation={self.generation})"
@@ -0,0 +1,489 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Binary snapshot of the policy / dynamic group caches, opened with mmap.
+# Layout: MAGIC, header length (uint32), JSON header (schema version, tenancy, load time, record counts and
+# section offsets), then 8-byte aligned sections:
+#   values  - every distinct value once (a tag byte, then UTF-8 for strings or JSON for anything else), with an
+#             offsets array
+#   tables  - per table, one array of value ids per field, the casefolded filter columns as value ids, and
+#             optionally a TrigramIndex (oci_policy_index.py) as raw arrays
+# Nothing is decoded when the file is opened.  A SnapshotStore decodes a statement the first time it is touched,
+# and filters read the folded columns (and index) without decoding statements at all.
+# The JSON caches can still be read (import) and written (export) - see load_json/dump_json and __main__.
+# Close a snapshot (or the SnapshotStore over it) before writing a new one to the same path - the mapping
+# holds the file open, and on Windows it can't be replaced while mapped.
+#
+#   python3 oci_policy_snapshot.py .policy-snapshot-<tenancy>.dat            # header
+#   python3 oci_policy_snapshot.py .policy-snapshot-<tenancy>.dat --json     # export tables to JSON caches
+
+import argparse
+import datetime
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from oci_policy_index import ColumnIndex, TrigramIndex
+from oci_policy_store import PolicyStatement, StatementStore, StatementSummary
+
+logger = logging.getLogger('oci-policy-snapshot')
+
+MAGIC = b"OCIPSNAP"
+# Bump when the layout changes - older snapshots are ignored (and the JSON caches used if present)
+SCHEMA_VERSION = 1
+ALIGN = 8
+
+# Value tags
+STRING = b"s"
+JSON = b"j"
+
+# Table record types - "list" tables (special statements, dynamic groups) are plain lists
+RECORD_TYPES = {"PolicyStatement": PolicyStatement, "StatementSummary": StatementSummary, "list": None}
+
+########################################
+# Writing
+########################################
+
+
+class SnapshotWriter:
+    """Collects tables, then writes them in one file"""
+
+    def __init__(self):
+        self.value_ids = {}
+        self.value_blobs = []
+        self.sections = []
+        self.size = 0
+        self.tables = {}
+
+    def value_id(self, value) -> int:
+        """Id of a value in the shared value table (added on first use)"""
+
+        # Keyed with the type so True and 1 don't share an entry
+        try:
+            key = (type(value), value)
+            n = self.value_ids.get(key)
+        except TypeError:
+            # Unhashable (a list)
+            key = (list, json.dumps(value))
+            n = self.value_ids.get(key)
+        if n is None:
+            n = self.value_ids[key] = len(self.value_blobs)
+            if type(value) is str:
+                self.value_blobs.append(STRING + value.encode(errors="surrogatepass"))
+            else:
+                self.value_blobs.append(JSON + json.dumps(value, ensure_ascii=False).encode(errors="surrogatepass"))
+        return n
+
+    def column_ids(self, column) -> array:
+        """Value ids of a column - each distinct string is looked up once"""
+
+        strings = {}
+        ids = array('i')
+        for value in column:
+            if type(value) is str:
+                n = strings.get(value)
+                if n is None:
+                    n = strings[value] = self.value_id(value)
+            else:
+                n = self.value_id(value)
+            ids.append(n)
+        return ids
+
+    def section(self, data: bytes) -> list:
+        """[offset, length] of data in the data area"""
+
+        offset = self.size
+        self.sections.append(data)
+        self.size += len(data)
+        padding = -self.size % ALIGN
+        if padding:
+            self.sections.append(b"\0" * padding)
+            self.size += padding
+        return [offset, len(data)]
+
+    def add_table(self, name: str, rows, columns=(), index: TrigramIndex = None):
+        """Add a table - rows is a StatementStore (its record type is kept) or a list of lists.
+        columns are the (name, extract) filter columns to store casefolded, index a TrigramIndex over the store"""
+
+        tic = time.perf_counter()
+        if isinstance(rows, StatementStore):
+            record_type = rows.record_type.__name__
+            records = rows.records
+            fields = [[getattr(record, field) for record in records] for field in rows.record_type.FIELDS]
+            folded = {column: rows.folded_column(column, extract) for column, extract in dict(columns).items()}
+        else:
+            record_type = "list"
+            records = rows
+            width = max((len(row) for row in rows), default=0)
+            fields = [[row[position] if position < len(row) else None for row in rows] for position in range(width)]
+            folded = {}
+
+        table = {"record_type": record_type, "records": len(records),
+                 "fields": [self.section(self.column_ids(field).tobytes()) for field in fields],
+                 "folded": {column: self.section(self.column_ids(values).tobytes()) for column, values in folded.items()}}
+        if index is not None:
+            table["index"] = {}
+            for column, column_index in index.columns.items():
+                table["index"][column] = {
+                    "values": self.section(self.column_ids(column_index.values).tobytes()),
+                    "grams": self.section(json.dumps(list(column_index.grams), ensure_ascii=False).encode(errors="surrogatepass")),
+                    "arrays": [self.section(array('i', getattr(column_index, a)).tobytes()) for a in ColumnIndex.ARRAYS]}
+            table["fingerprint"] = index.fingerprint
+        self.tables[name] = table
+        logger.debug(f"Snapshot table {name}: {len(records)} {record_type} records in {time.perf_counter() - tic:.2f}s")
+
+    def write(self, path: str, tenancy: str, loaded: str = None):
+        """Write the snapshot - to a temporary file first, so readers never see half a file"""
+
+        offsets = array('q', [0])
+        for blob in self.value_blobs:
+            offsets.append(offsets[-1] + len(blob))
+        values = {"count": len(self.value_blobs), "offsets": self.section(offsets.tobytes()),
+                  "blob": self.section(b"".join(self.value_blobs))}
+        header = {"schema": SCHEMA_VERSION, "byteorder": sys.byteorder, "itemsize": array('i').itemsize, "tenancy": tenancy, "loaded": loaded or str(datetime.datetime.now()),
+                  "written": str(datetime.datetime.now()), "records": {name: t["records"] for name, t in self.tables.items()},
+                  "values": values, "tables": self.tables}
+        header_bytes = json.dumps(header).encode()
+        start = len(MAGIC) + 4 + len(header_bytes)
+        padding = -start % ALIGN
+
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as filehandle:
+            filehandle.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes + b"\0" * padding)
+            for data in self.sections:
+                filehandle.write(data)
+        os.replace(temporary, path)
+        logger.info(f"Wrote snapshot {path}: {header['records']} records, {len(self.value_blobs)} distinct values")
+
+
+def write_snapshot(path: str, tenancy: str, tables: dict, loaded: str = None):
+    """Write tables {name: rows or (rows, columns) or (rows, columns, index)} to a snapshot at path"""
+
+    writer = SnapshotWriter()
+    for name, table in tables.items():
+        if isinstance(table, tuple):
+            writer.add_table(name, *table)
+        else:
+            writer.add_table(name, table)
+    writer.write(path, tenancy, loaded)
+
+########################################
+# Reading
+########################################
+
+
+class Snapshot:
+    """Memory-mapped snapshot - values are decoded on first use"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as filehandle:
+            self.map = mmap.mmap(filehandle.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a policy snapshot")
+        (length,) = struct.unpack("<I", self.map[len(MAGIC):len(MAGIC) + 4])
+        start = len(MAGIC) + 4
+        self.header = json.loads(self.map[start:start + length])
+        if self.header["schema"] != SCHEMA_VERSION:
+            raise ValueError(f"{path} has schema {self.header['schema']}, expected {SCHEMA_VERSION}")
+        if self.header["byteorder"] != sys.byteorder or self.header["itemsize"] != array('i').itemsize:
+            raise ValueError(f"{path} was written on another platform")
+        self.path = path
+        self.data = start + length + (-(start + length) % ALIGN)
+        self.view = memoryview(self.map)
+        # Typed views handed out by array() - released on close
+        self.views = []
+        self.value_offsets = self.array(self.header["values"]["offsets"], 'q')
+        self.value_blob = self.header["values"]["blob"][0] + self.data
+        self.decoded = {}
+        self.frozen = {}
+
+    @property
+    def tenancy(self) -> str:
+        return self.header["tenancy"]
+
+    @property
+    def loaded(self) -> str:
+        return self.header["loaded"]
+
+    def array(self, section: list, typecode: str = 'i') -> memoryview:
+        """Section as a read-only typed view of the mapped file (no copy)"""
+
+        offset, length = section
+        view = self.view[self.data + offset:self.data + offset + length].cast(typecode)
+        self.views.append(view)
+        return view
+
+    def bytes(self, section: list) -> bytes:
+        offset, length = section
+        return self.map[self.data + offset:self.data + offset + length]
+
+    def value(self, n: int):
+        """Decoded value n - shared for immutable values, a fresh copy for lists (callers may modify those)"""
+
+        value = self.decoded.get(n, self)
+        if value is self:
+            data = self.map[self.value_blob + self.value_offsets[n]:self.value_blob + self.value_offsets[n + 1]]
+            if data[:1] == STRING:
+                value = data[1:].decode(errors="surrogatepass")
+            else:
+                value = json.loads(data[1:])
+                if isinstance(value, list):
+                    return value
+            self.decoded[n] = value
+        return value
+
+    def frozen_value(self, n: int):
+        """Decoded value n with lists as tuples, always shared (statement records don't modify values)"""
+
+        value = self.frozen.get(n, self)
+        if value is self:
+            value = self.value(n)
+            if isinstance(value, list):
+                value = tuple(value)
+            self.frozen[n] = value
+        return value
+
+    def table(self, name: str):
+        """SnapshotTable, or None if the snapshot has no such table"""
+
+        table = self.header["tables"].get(name)
+        return SnapshotTable(self, name, table) if table else None
+
+    @property
+    def closed(self) -> bool:
+        return self.map.closed
+
+    def close(self):
+        """Unmap the file.  Values already decoded stay usable, the arrays (table fields, indexes) don't"""
+
+        if self.map.closed:
+            return
+        for view in self.views:
+            view.release()
+        self.views = []
+        self.view.release()
+        self.map.close()
+        logger.debug(f"Closed snapshot {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SnapshotTable:
+    """One table of a snapshot"""
+
+    def __init__(self, snapshot: Snapshot, name: str, header: dict):
+        self.snapshot = snapshot
+        self.name = name
+        self.header = header
+        self.record_type = RECORD_TYPES[header["record_type"]]
+        self.fields = [snapshot.array(section) for section in header["fields"]]
+
+    def __len__(self):
+        return self.header["records"]
+
+    def row(self, i: int) -> list:
+        """Row i - lists are fresh for list tables, shared tuples for statement tables"""
+
+        if self.record_type is None:
+            value = self.snapshot.value
+            return [value(field[i]) for field in self.fields]
+        frozen, value = self.snapshot.frozen, self.snapshot.frozen_value
+        row = [frozen.get(field[i], frozen) for field in self.fields]
+        for position, decoded in enumerate(row):
+            if decoded is frozen:
+                row[position] = value(self.fields[position][i])
+        return row
+
+    def column(self, ids) -> list:
+        """Decoded values for an array of value ids - each distinct value is decoded once"""
+
+        if self.record_type is None:
+            value = self.snapshot.value
+            return [value(n) for n in ids]
+        value = self.snapshot.frozen_value
+        return list(map({n: value(n) for n in set(ids)}.__getitem__, ids))
+
+    def rows(self) -> list:
+        """Every row as a list (decodes the whole table)"""
+
+        return [list(row) for row in zip(*(self.column(field) for field in self.fields))]
+
+    def folded_column(self, name: str):
+        """Stored casefolded filter column, or None"""
+
+        section = self.header["folded"].get(name)
+        return None if section is None else self.column(self.snapshot.array(section))
+
+    def index(self):
+        """Stored TrigramIndex (arrays are views of the mapped file), or None"""
+
+        if "index" not in self.header:
+            return None
+        tic = time.perf_counter()
+        value = self.snapshot.value
+        columns = {}
+        for name, layout in self.header["index"].items():
+            arrays = {a: self.snapshot.array(section) for a, section in zip(ColumnIndex.ARRAYS, layout["arrays"])}
+            columns[name] = ColumnIndex([value(n) for n in self.snapshot.array(layout["values"])],
+                                        json.loads(self.snapshot.bytes(layout["grams"])), **arrays)
+        logger.info(f"Opened trigram index of {self.name} in {time.perf_counter() - tic:.2f}s")
+        return TrigramIndex(columns, None, self.header["fingerprint"])
+
+
+class LazyRecords:
+    """Sequence of a SnapshotStore's records, each decoded the first time it is read"""
+
+    def __init__(self, store):
+        self.store = store
+        self.cache = [None] * len(store.table)
+
+    def __len__(self):
+        return len(self.cache)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.cache)))]
+        record = self.cache[index]
+        if record is None:
+            # Decoded values are shared already - no need to intern them again
+            record = self.cache[index] = self.store.record_type(*self.store.table.row(index))
+        return record
+
+    def __iter__(self):
+        # Reading them all - decode column by column rather than row by row
+        if None in self.cache:
+            table, record_type, cache = self.store.table, self.store.record_type, self.cache
+            for i, values in enumerate(zip(*(table.column(field) for field in table.fields))):
+                if cache[i] is None:
+                    cache[i] = record_type(*values)
+        return iter(self.cache)
+
+
+class SnapshotStore(StatementStore):
+    """StatementStore over a snapshot table - statements are decoded when touched, filters use the stored
+    folded columns.  Adding statements decodes the rest first"""
+
+    def __init__(self, table: SnapshotTable):
+        super().__init__(table.record_type)
+        self.table = table
+        self.records = LazyRecords(self)
+
+    def materialize(self):
+        if isinstance(self.records, LazyRecords):
+            self.records = list(self.records)
+
+    def append(self, row):
+        self.materialize()
+        super().append(row)
+
+    def extend(self, rows):
+        self.materialize()
+        super().extend(rows)
+
+    def close(self, keep: bool = True):
+        """Unmap the snapshot - if keep, the records are decoded first so the store keeps working from memory"""
+
+        if keep:
+            self.materialize()
+        self.table.snapshot.close()
+
+    def folded_column(self, name: str, extract) -> list:
+        if self.generation == 0 and name not in self.folded and not self.table.snapshot.closed:
+            column = self.table.folded_column(name)
+            if column is not None:
+                self.folded[name] = (0, column)
+        return super().folded_column(name, extract)
+
+    def index(self):
+        """Stored trigram index, current for this store - or None (also once the snapshot is closed)"""
+
+        if self.table.snapshot.closed:
+            return None
+        index = self.table.index()
+        if index is not None:
+            index.generation = self.generation
+        return index
+
+
+def open_snapshot(path: str, tenancy: str = None):
+    """Snapshot at path, or None if there isn't a usable one (missing, other schema, other tenancy)"""
+
+    if not os.path.isfile(path):
+        return None
+    try:
+        snapshot = Snapshot(path)
+    except (OSError, ValueError, KeyError, struct.error) as exc:
+        logger.warning(f"Ignoring snapshot {path}: {exc}")
+        return None
+    if tenancy and snapshot.tenancy != tenancy:
+        logger.warning(f"Ignoring snapshot {path}: it is for tenancy {snapshot.tenancy}")
+        return None
+    logger.info(f"Opened snapshot {path} (loaded {snapshot.loaded}, records {snapshot.header['records']})")
+    return snapshot
+
+
+def load_table(snapshot: Snapshot, name: str, record_type=None):
+    """SnapshotStore for a statement table, the rows of a list table - None if the table is missing or
+    holds another record type"""
+
+    table = snapshot.table(name) if snapshot else None
+    if table is None:
+        return None
+    if table.record_type is not record_type:
+        logger.warning(f"Snapshot table {name} holds {table.header['record_type']} records, not {getattr(record_type, '__name__', 'list')}")
+        return None
+    return SnapshotStore(table) if record_type else table.rows()
+
+########################################
+# JSON caches (import / export)
+########################################
+
+
+def load_json(path: str):
+    """Rows of a JSON cache file, or None if it doesn't exist"""
+
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r') as filehandle:
+        return json.load(filehandle)
+
+
+def dump_json(path: str, rows):
+    """Write a store or list as a JSON cache file"""
+
+    with open(path, 'w') as filehandle:
+        json.dump(rows.to_lists() if isinstance(rows, StatementStore) else rows, filehandle)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s [%(threadName)s] %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser()
+    parser.add_argument("snapshot", help="Snapshot file")
+    parser.add_argument("--json", help="Export every table to <snapshot>-<table>.json", action="store_true")
+    args = parser.parse_args()
+
+    snapshot = open_snapshot(args.snapshot)
+    if not snapshot:
+        exit(1)
+    header = {k: v for k, v in snapshot.header.items() if k not in ("values", "tables")}
+    print(json.dumps(header, indent=2))
+    if args.json:
+        for name in snapshot.header["tables"]:
+            table = snapshot.table(name)
+            rows = table.rows() if table.record_type is None else SnapshotStore(table).to_lists()
+            dump_json(f"{args.snapshot}-{name}.json", rows)
+            print(f"Exported {len(rows)} {name} rows to {args.snapshot}-{name}.json")
@@ -0,0 +1,165 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Compact statement store shared by the policy loaders (oci_policy_analysis.py and tkinter/policy.py).
+# Each statement is a __slots__ record instead of a 16-element list (or 10-tuple) plus a nested subject list,
+# and the low-cardinality fields (subject type, verb, resource, location, policy name/OCIDs, hierarchy ...)
+# are interned per store, so 150k statements loaded from a JSON cache share a few thousand strings.
+# Records index by position like the lists they replace (statement[7][1] still works), and to_list()
+# gives the plain list back for JSON and the UI grid.
+# Filters read casefolded copies of the columns they search, built once and kept until the store changes.
+
+import logging
+
+logger = logging.getLogger('oci-policy-store')
+
+# UI statement - positions match PolicyAnalysis.parse_statement
+STATEMENT_FIELDS = ("policy_name", "policy_id", "compartment_id", "hierarchy", "text", "valid", "subject_type", "subject",
+                    "verb", "resource", "permission", "location_type", "location", "condition", "optional", "time_created")
+
+# CLI statement - positions match the oci_policy_analysis.py tuple
+SUMMARY_FIELDS = ("subject", "verb", "resource", "location", "condition", "hierarchy", "policy_name", "policy_id",
+                  "compartment_id", "text")
+
+
+class StatementRecord:
+    """Slotted statement, indexable by position like the list or tuple it replaces"""
+
+    __slots__ = ()
+    FIELDS = ()
+    # Fields whose values are shared through the store's intern table
+    INTERNED = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.FIELDS, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [getattr(self, name) for name in self.FIELDS[index]]
+        return getattr(self, self.FIELDS[index])
+
+    def __setitem__(self, index, value):
+        setattr(self, self.FIELDS[index], value)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.FIELDS)
+
+    def __eq__(self, other):
+        if isinstance(other, (StatementRecord, list, tuple)):
+            return self.to_list() == [list(v) if isinstance(v, tuple) else v for v in other]
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_list()!r})"
+
+    def to_list(self) -> list:
+        """Plain list (nested subject as a list) - what the JSON cache and the UI grid hold"""
+
+        return [list(v) if isinstance(v, tuple) else v for v in self]
+
+
+class PolicyStatement(StatementRecord):
+    """UI statement (16 fields), subject is a shared (domain, name) tuple"""
+
+    __slots__ = STATEMENT_FIELDS
+    FIELDS = STATEMENT_FIELDS
+    INTERNED = ("policy_name", "policy_id", "compartment_id", "hierarchy", "subject_type", "subject", "verb", "resource",
+                "permission", "location_type", "location", "time_created")
+
+
+class StatementSummary(StatementRecord):
+    """CLI statement (10 fields)"""
+
+    __slots__ = SUMMARY_FIELDS
+    FIELDS = SUMMARY_FIELDS
+    INTERNED = ("subject", "verb", "resource", "location", "hierarchy", "policy_name", "policy_id", "compartment_id")
+
+
+class StatementStore:
+    """List-like collection of statement records with a per-store intern table"""
+
+    def __init__(self, record_type=PolicyStatement, rows=None):
+        """record_type is PolicyStatement (UI) or StatementSummary (CLI). rows are lists/tuples/records to add"""
+
+        self.record_type = record_type
+        self.records = []
+        self.strings = {}
+
+        # Bumped on every change - derived data (folded columns, query results) is only valid for one generation
+        self.generation = 0
+        self.folded = {}
+        self.interned_positions = tuple(record_type.FIELDS.index(name) for name in record_type.INTERNED)
+        if rows:
+            self.extend(rows)
+
+    def make(self, row) -> StatementRecord:
+        """Record from a list/tuple/record, with the interned fields swapped for their shared copies
+        (a subject list becomes a tuple so it can be shared too)"""
+
+        values = list(row)
+        setdefault = self.strings.setdefault
+        for position in self.interned_positions:
+            value = values[position]
+            if isinstance(value, list):
+                value = tuple(value)
+            if isinstance(value, (str, tuple)):
+                values[position] = setdefault(value, value)
+        return self.record_type(*values)
+
+    def append(self, row):
+        self.records.append(self.make(row))
+        self.generation += 1
+
+    def extend(self, rows):
+        self.records.extend(self.make(row) for row in rows)
+        self.generation += 1
+        logger.debug(f"Store holds {len(self.records)} statements, {len(self.strings)} interned values")
+
+    def folded_column(self, name: str, extract) -> list:
+        """Casefolded value of extract(record) for every record, in store order (None becomes "").
+        Cached under name for the current generation - distinct values are folded once"""
+
+        cached = self.folded.get(name)
+        if cached and cached[0] == self.generation:
+            return cached[1]
+
+        folds = {}
+        column = []
+        for record in self.records:
+            value = extract(record) or ""
+            folded = folds.get(value)
+            if folded is None:
+                folded = value.casefold()
+                # Statements are stored casefolded already - keep one copy of the string
+                folds[value] = folded = value if folded == value else folded
+            column.append(folded)
+        self.folded[name] = (self.generation, column)
+        return column
+
+    def to_lists(self) -> list:
+        """Every statement as a plain list (JSON cache format)"""
+
+        return [record.to_list() for record in self.records]
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __bool__(self):
+        return bool(self.records)
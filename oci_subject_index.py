@@ -0,0 +1,99 @@
+# coding: utf-8
+# Copyright (c) 2016, 2023, Oracle and/or its affiliates.  All rights reserved.
+# This software is dual-licensed to you under the Universal Permissive License (UPL) 1.0 as shown at https://oss.oracle.com/licenses/upl or Apache License 2.0 as shown at http://www.apache.org/licenses/LICENSE-2.0. You may choose either license.
+#
+# Supports Python 3
+#
+# DISCLAIMER – This is not an official Oracle application,  It is not supported by Oracle Support
+#
+# Hash join between dynamic-group statements and dynamic groups, shared by the UI analyses
+# (PolicyAnalysis.check_for_invalid_dynamic_groups and DynamicGroupAnalysis.run_dg_in_use_analysis).
+# Statements are keyed by the casefolded (domain, name) of their subject and dynamic groups by the same key,
+# so "does this statement's DG exist" and "which statements use this DG" are dictionary lookups - one pass
+# over the statements and one over the groups instead of one over the statements per group.
+# The index is built on first use and kept until either side is reloaded (a new store or DG list, or a
+# different length while a load is adding to it).
+#
+#   index = shared_index(policy_analysis.regular_statements, dyn_group_analysis.dynamic_groups)
+#   index.statements_for(dg)    - [(row, statement)] of the statements naming dg
+#   index.group_for(statement)  - the DG record a statement names, or None
+
+import logging
+import time
+from threading import Lock
+
+logger = logging.getLogger('oci-subject-index')
+
+
+def subject_key(domain: str, name: str) -> tuple:
+    """Casefolded (domain, name) - how statements and dynamic groups are matched"""
+
+    return ((domain or "").casefold(), (name or "").casefold())
+
+
+class SubjectIndex:
+    """Dynamic-group statements by subject and dynamic groups by (domain, name), for one statement store and DG list"""
+
+    def __init__(self, statements, dynamic_groups: list):
+        tic = time.perf_counter()
+        self.statements = statements
+        self.dynamic_groups = dynamic_groups
+        self.statement_count = len(statements)
+        self.group_count = len(dynamic_groups)
+
+        # subject key -> [(row, statement)] in store order.  Records read from a database are copies, so
+        # the row is kept to store results against
+        self.subjects = {}
+        folds = {}
+        for row, statement in enumerate(statements):
+            if statement[6] != "dynamic-group" or not statement[7][0]:
+                continue
+            # Subjects are shared tuples - fold each distinct one once
+            subject = statement[7]
+            key = folds.get(subject)
+            if key is None:
+                key = folds[subject] = subject_key(subject[0], subject[1])
+            self.subjects.setdefault(key, []).append((row, statement))
+
+        # subject key -> DG record (the first, if a domain has two with the same name)
+        self.groups = {}
+        for dg in dynamic_groups:
+            self.groups.setdefault(subject_key(dg[0], dg[1]), dg)
+        logger.info(f"Indexed {sum(map(len, self.subjects.values()))} dynamic-group statements over {len(self.subjects)} subjects "
+                    f"and {len(self.groups)} dynamic groups in {time.perf_counter() - tic:.3f}s")
+
+    def is_current(self, statements, dynamic_groups: list) -> bool:
+        """Built from these statements and DGs, and neither has grown or shrunk since"""
+
+        return (self.statements is statements and self.dynamic_groups is dynamic_groups
+                and self.statement_count == len(statements) and self.group_count == len(dynamic_groups))
+
+    def statements_for(self, dg) -> list:
+        """[(row, statement)] of the dynamic-group statements naming dg, in store order"""
+
+        return self.subjects.get(subject_key(dg[0], dg[1]), [])
+
+    def group_for(self, statement):
+        """DG record named by a dynamic-group statement, or None"""
+
+        return self.groups.get(subject_key(statement[7][0], statement[7][1]))
+
+    def statement_subjects(self):
+        """(subject key, [(row, statement)]) for every subject named by a dynamic-group statement"""
+
+        return self.subjects.items()
+
+
+# Last index built - both analyses run against the same statements and DGs
+_shared = None
+_shared_lock = Lock()
+
+
+def shared_index(statements, dynamic_groups: list) -> SubjectIndex:
+    """The index for these statements and DGs - the last one built if it is still current, else a new one"""
+
+    global _shared
+    with _shared_lock:
+        if _shared is None or not _shared.is_current(statements, dynamic_groups):
+            _shared = SubjectIndex(statements, dynamic_groups)
+        return _shared
@@ -1,28 +1,29 @@
 # Python
 import os
+import sys
 import logging
-import json
 import re
 import time
-from concurrent.futures import ThreadPoolExecutor
-
-# OCI
-from oci import config, pagination
-from oci.retry import DEFAULT_RETRY_STRATEGY
-from oci.identity import IdentityClient
-from oci.identity_domains import IdentityDomainsClient
-from oci.identity_domains.models import DynamicResourceGroup
-from oci.identity.models import DynamicGroup
-from oci.core import ComputeClient
-from oci.database import DatabaseClient
-from oci.functions import FunctionsManagementClient
-from oci.apigateway import ApiGatewayClient
-from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
-from oci.exceptions import ConfigFileNotFound, ServiceError
+from threading import Lock
+
+# OCI - imported by the methods that make or call clients, so the window opens without the SDK
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from oci.identity.models import DynamicGroup
 
 # Local
 from progress import Progress
 
+# Shared (repo root)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from oci_policy_query import QueryCache, filter_alternatives
+from oci_policy_snapshot import dump_json, load_json, load_table, open_snapshot, write_snapshot
+from oci_subject_index import shared_index
+from oci_client_pool import ClientPool, size_connection_pool
+from oci_ocid_validator import OcidValidator
+from oci_ocid_cache import OcidCache
+from oci_domain_crawler import DomainCrawler
+
 ###############################################################################################################
 # Constants
 ###############################################################################################################
@@ -39,9 +40,8 @@ THREADS = 8
 class DynamicGroupAnalysis:
 
     dynamic_groups = []
-    clients = []
 
-    def __init__(self, progress: Progress, verbose: bool):
+    def __init__(self, progress: Progress, verbose: bool, write_json: bool = False):
         logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s [%(threadName)s] %(levelname)s %(message)s')
         self.logger = logging.getLogger('oci-policy-analysis-dynamic-groups')
         self.logger.info("Init of class")
@@ -53,10 +53,25 @@ class DynamicGroupAnalysis:
         # Reference to progress object in main
         self.progress = progress
 
+        # Filter results by query - bumped whenever the DGs are reloaded or updated by an analysis
+        self.query_cache = QueryCache()
+
+        # The cache is a binary snapshot - the JSON cache is still read if there is no snapshot, and written on request
+        self.write_json = write_json
+
+        # Domains whose dynamic groups failed to load - the list is incomplete (and not cached) while any did
+        self.failed_domains = []
+
     # Just the Identity Client for now
     def initialize_client(self, profile: str, use_instance_principal: bool) -> bool:
         """Initialize the Identity Client"""
 
+        from oci import config
+        from oci.retry import DEFAULT_RETRY_STRATEGY
+        from oci.identity import IdentityClient
+        from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
+        from oci.exceptions import ConfigFileNotFound
+
         if use_instance_principal:
             self.logger.info("Using Instance Principal Authentication")
             self.config = {}
@@ -83,67 +98,35 @@ class DynamicGroupAnalysis:
             except ConfigFileNotFound as exc:
                 self.logger.fatal(f"Unable to use Profile Authentication: {exc}")
                 return False
+
+        # Regional clients for OCID validation - made on first use, shared by the analysis threads
+        self.region = self.config.get("region") or getattr(self.signer, "region", None)
+        size_connection_pool(self.identity_client, THREADS)
+        self.client_pool = ClientPool(self.config, self.signer, size=THREADS)
         self.logger.info(f"Set up Identity Client for tenancy: {self.tenancy_ocid}")
         return True
 
-    # Creation and caching of regional clients, needed for OCID validation in other regions
+    # Regional clients, needed for OCID validation in other regions
     def regional_client(self, region, type):
-        """Create and cache a regional OCI Client for any type or region"""
-
-        # Get base config
-        localconfig = self.config
-        localconfig["region"] = region
-        self.logger.debug(f"Using config: {localconfig}")
+        """Shared regional OCI Client for an OCID type and region (None if the type isn't supported)"""
 
         if "instance" in type:
-            # Check clients first (any one we have)
-            for client in self.clients:
-                if region == client[0] and isinstance(client[1], ComputeClient):
-                    self.logger.debug(f"Matching client {region} / {type}")
-                    return client[1]
-            # Create compute
-            cl = (region, ComputeClient(config=localconfig, region=region, retry_strategy=DEFAULT_RETRY_STRATEGY))
-            self.clients.append(cl)
-            self.logger.info(f"Created client {region} / {type}")
-            return cl[1]
+            service = "compute"
         elif "dbsystem" in type or "autonomousdatabase" in type or "dbnode" in type or "cloudvmcluster" in type:
-            # Check clients first (any one we have)
-            for client in self.clients:
-                if region == client[0] and isinstance(client[1], DatabaseClient):
-                    self.logger.debug(f"Matching client {region} / {type}")
-                    return client[1]
-            cl = (region, DatabaseClient(config=localconfig, region=region, retry_strategy=DEFAULT_RETRY_STRATEGY))
-            self.clients.append(cl)
-            self.logger.info(f"Created client {region} / {type}")
-            return cl[1]
-        # Functions
+            service = "database"
         elif "fnfunc" in type or "fnapp" in type:
-            # Check clients first (any one we have)
-            for client in self.clients:
-                if region == client[0] and isinstance(client[1], FunctionsManagementClient):
-                    self.logger.debug(f"Matching client {region} / {type}")
-                    return client[1]
-            cl = (region, FunctionsManagementClient(config=localconfig, region=region, retry_strategy=DEFAULT_RETRY_STRATEGY))
-            self.clients.append(cl)
-            self.logger.info(f"Created client {region} / {type}")
-            return cl[1]
-        # apigateway
-        elif "apigateway" in type :
-            # Check clients first (any one we have)
-            for client in self.clients:
-                if region == client[0] and isinstance(client[1], ApiGatewayClient):
-                    self.logger.debug(f"Matching client {region} / {type}")
-                    return client[1]
-            cl = (region, ApiGatewayClient(config=localconfig, region=region, retry_strategy=DEFAULT_RETRY_STRATEGY))
-            self.clients.append(cl)
-            self.logger.info(f"Created client {region} / {type}")
-            return cl[1]
+            service = "functions"
+        elif "apigateway" in type:
+            service = "apigateway"
         else:
             return None
+        return self.client_pool.get(service, region)
 
-    # OCID Checker - Return False if the object is not valid, True otherwise and if we cannot tell
-    def validate_ocid(self, ocid: str) -> bool:
-        '''Check the OCID and return False if it isn't a thing any more'''
+    # OCID Checker - Return False if the object is gone (404), True if it exists, None if we cannot tell
+    def validate_ocid(self, ocid: str):
+        '''Check the OCID and return False if it isn't a thing any more (None if it can't tell)'''
+
+        from oci.exceptions import ServiceError
 
         # Parse the OCID into pieces - compartments are missing a region - we also only care about some parts
         garb1, ocid_type, garb2, ocid_region, garb3 = ocid.split('.')
@@ -173,7 +156,7 @@ class DynamicGroupAnalysis:
                 cl.get_application(application_id=ocid)
             elif "apigateway" in ocid_type:
                 cl = self.regional_client(ocid_region, ocid_type)
-                cl.get_api(application_id=ocid)
+                cl.get_gateway(gateway_id=ocid)
             # elif "dbnode" in ocid_type:
             #     a = self.database_client[ocid_region].get_db_node(db_node_id=ocid)
             elif False:
@@ -187,42 +170,44 @@ class DynamicGroupAnalysis:
                 # Dataflowrun
             else:
                 self.logger.warning(f"Type of OCID not supported: {ocid_type}")
+                return None
         except ServiceError as exc:
-            # Expected
-            self.logger.debug(f"Caught error: {exc.message}")
-            return False
+            # Only a 404 says it is gone - throttling, server and auth errors say nothing about the OCID
+            if exc.status == 404:
+                self.logger.debug(f"Caught error: {exc.message}")
+                return False
+            self.logger.warning(f"Unable to determine {ocid}: {exc.status} {exc.message}")
+            return None
         except KeyError as exc:
             self.logger.error(f"Caught error - unable to determine: {exc}")
-            return True
+            return None
         except AttributeError as exc:
             self.logger.error(f"Caught error - unable to determine: {exc}")
-            return True
+            return None
         return True
 
     # Check a single DG for in use (requires PolicyAnalysis instance)
-    def dg_in_use(self, dg: DynamicGroup) -> bool:
+    def dg_in_use(self, dg: "DynamicGroup") -> bool:
         """Determine if a DG is in use within any policy statement"""
 
-        for statement in self.policies:
-            # If Domain is not defined, move on
-            if not statement[7][0]:
-                continue
-            if dg[0].casefold() == statement[7][0].casefold() and dg[1].casefold() == statement[7][1].casefold():
-                self.logger.debug(f"DG {dg[0]} referenced by statement {statement}")
-                return True
-        # No match so return False
-        return False
+        return bool(self.dg_statements(dg))
+
+    def dg_statements(self, dg: list) -> list:
+        """[(row, statement)] of the dynamic-group statements naming a DG (requires PolicyAnalysis statements)"""
+
+        return shared_index(self.policies, self.dynamic_groups).statements_for(dg)
 
     # See if any DG isn't in use by any policy
     def run_dg_in_use_analysis(self) -> list:
         """Use the policy statements to generate a list of delete-able DG"""
 
         unused_dynamic_groups = []
-        # Iterate rules to look for broken OCIDs and add to tuple
-        for i, dg in enumerate(self.dynamic_groups):
-            self.logger.debug(f"Validate DG {dg[0]}/{dg[1]}")
-            valid_dg = self.dg_in_use(dg=dg)
-            self.logger.debug(f"Valid: {dg[0]}/{dg[1]}: {valid_dg}")
+        # One pass over the statements and one over the DGs - reused until either is reloaded
+        index = shared_index(self.policies, self.dynamic_groups)
+        for dg in self.dynamic_groups:
+            statements = index.statements_for(dg)
+            valid_dg = bool(statements)
+            self.logger.debug(f"Valid: {dg[0]}/{dg[1]}: {valid_dg} ({len(statements)} statements)")
 
             # Set in existing DG
             dg[5] = valid_dg
@@ -232,74 +217,54 @@ class DynamicGroupAnalysis:
                 unused_dynamic_groups.append(dg)
 
         # Return the invalid list
+        self.query_cache.bump()
         self.logger.info(f"Finished DG in Use analysis, found {len(unused_dynamic_groups)} unused groups")
         return unused_dynamic_groups
 
-    # Threadable method to take a DG list (our object) and populate the invalid ocids
-    def invalid_ocid_check(self, dg: list):
-        """Given a DG (as internal list representation), update it if any OCID is invalid. Run as a thread"""
-
-        self.logger.debug(f"Thread Started on {dg[0]} / {dg[1]}")
-
-        # Could be multiple rules and thus multiple OCIDs
-        for i, rule in enumerate(dg[4]):
-            ocid = re.search(OCID_REGEX, rule)
-            if ocid and ocid.group(0):
-
-                # To do threading here, add to ocid_list
-                # then we'd need to run threads against the validation
-                # Each future would then need to be processed.
-                is_ocid_valid = self.validate_ocid(ocid.group(0))
-                self.logger.debug(f"Rule {i}: {dg[0]} ({is_ocid_valid}): {ocid.group(0)}")
-                if not is_ocid_valid:
-                    self.logger.info(f"Marking {ocid.group(0)} as invalid")
-                    dg[6].append(ocid.group(0))
-        self.logger.debug(f"Thread finished on {dg[0]}/{dg[1]}")
-
     # Process all DG Matching rules and look all valid OCIDs
     def run_deep_analysis(self):
-        """Control the threaded process of checking each Dynamic Group for invalid OCIDs"""
-
-        # We know the DG count now - set up progress
-        self.progress.set_to_load(len(self.dynamic_groups))
-
-        # new_dynamic_groups = []
+        """Check every OCID in the Dynamic Group matching rules, each distinct OCID once, and mark the invalid ones"""
 
         # Start timer
         tic = time.perf_counter()
 
-        # # Iterate rules to look for broken OCIDs and add to DG tuple
-        # for i, dg in enumerate(self.dynamic_groups):
-        #     rule = dg[2]
-        #     self.logger.debug(f"\n---Rule: {dg[0]} Rule{i}: {dg[2]}")
-
-        with ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix="thread") as executor:
-            # results = executor.map(self.load_policies, comp_list)
-            results = [executor.submit(self.invalid_ocid_check, dg) for dg in self.dynamic_groups]
-            self.logger.info(f"Kicked off {THREADS} threads for parallel execution - adjust as necessary")
-
-            # Add callbacks to report
-            for future in results:
-                # future.add_done_callback(print)
-                if self.progress:
-                    future.add_done_callback(self.progress.progress_indicator)
-
-        # Process Threaded Results
-        for future in results:
-            self.logger.debug(f"Result: {future}")
-            try:
-                future.result()
-            except Exception as exc:
-                self.logger.error(f"Executor Exception: {exc}")
+        # (DG, OCID) for every rule naming an OCID - the same OCID is often in many DGs
+        references = []
+        for dg in self.dynamic_groups:
+            for rule in dg[4]:
+                ocid = re.search(OCID_REGEX, rule)
+                if ocid and ocid.group(0):
+                    references.append((dg, ocid.group(0)))
+        self.logger.info(f"Found {len(references)} OCIDs in the rules of {len(self.dynamic_groups)} Dynamic Groups")
+
+        # Only OCIDs that are new, or whose cached state has expired, are checked
+        ocid_cache = OcidCache(f'.ocid-cache-{self.tenancy_ocid}.dat')
+        valid, stale = ocid_cache.split(ocid for _, ocid in references)
+
+        # Batched Resource Search per region, single lookups for what search doesn't cover
+        validator = OcidValidator(lambda region: self.client_pool.get("search", region), self.region,
+                                  fallback=self.validate_ocid, workers=THREADS)
+        checked = validator.validate(stale, progress=self.progress)
+        ocid_cache.update({ocid: exists for ocid, exists in checked.items() if ocid not in validator.unchecked})
+        ocid_cache.save()
+        valid.update(checked)
+
+        # Write the results back to every DG that names the OCID
+        for dg in self.dynamic_groups:
+            dg[6] = []
+        for dg, ocid in references:
+            if not valid[ocid]:
+                self.logger.info(f"Marking {ocid} as invalid in {dg[0]}/{dg[1]}")
+                dg[6].append(ocid)
 
         # Set progress back to 0
-        self.progress.progressbar_val = 0.0
+        if self.progress:
+            self.progress.progressbar_val = 0.0
 
         # Stop Timer
         toc = time.perf_counter()
 
-        # Replace DGs with new list of tuples
-        # self.dynamic_groups = new_dynamic_groups
+        self.query_cache.bump()
         self.logger.info(f"Finished deep analysis in {toc-tic}s")
 
     # Parse Dynamic Group into tuple
@@ -337,15 +302,30 @@ class DynamicGroupAnalysis:
 
     # Incoming call from outside (Entry Point)
     def load_all_dynamic_groups(self, use_cache: bool) -> bool:
-        """Load all dynamic groups in tenancy, using the configured Identity Client"""
+        """Load all dynamic groups in tenancy, using the configured Identity Client.
+        Returns False if any domain failed to load - the list is then incomplete, see failed_domains"""
+
+        from oci import pagination
+        from oci.exceptions import ServiceError
 
         self.dynamic_groups = []
+        self.domain_loads = []
+        self.failed_domains = []
+        self.query_cache.bump()
 
         if use_cache:
             self.logger.info(f"---Starting DG Load for tenant: {self.tenancy_ocid} from cached files---")
-            if os.path.isfile(f'./.dynamic-group-cache-{self.tenancy_ocid}.dat'):
-                with open(f'./.dynamic-group-cache-{self.tenancy_ocid}.dat', 'r') as filehandle:
-                    self.dynamic_groups = json.load(filehandle)
+            snapshot = open_snapshot(f'.dynamic-group-snapshot-{self.tenancy_ocid}.dat', self.tenancy_ocid)
+            dynamic_groups = load_table(snapshot, "dynamic_groups")
+            if snapshot:
+                # The rows are decoded - unmap the file so save_cache can replace it
+                snapshot.close()
+            if dynamic_groups is not None:
+                self.dynamic_groups = dynamic_groups
+            elif os.path.isfile(f'./.dynamic-group-cache-{self.tenancy_ocid}.dat'):
+                # JSON cache from an older version - import it and keep a snapshot from now on
+                self.dynamic_groups = load_json(f'./.dynamic-group-cache-{self.tenancy_ocid}.dat')
+                self.save_cache()
 
         else:
             self.logger.info(f"---Starting DG Load for tenant: {self.tenancy_ocid} from client---")
@@ -354,45 +334,33 @@ class DynamicGroupAnalysis:
             # If we get a list then we need to check each domain 
             try:
                 # First call Identity Domains List
-                domain_list = self.identity_client.list_domains(compartment_id=self.tenancy_ocid).data
+                domain_list = pagination.list_call_get_all_results(
+                    self.identity_client.list_domains,
+                    compartment_id=self.tenancy_ocid
+                ).data
                 self.logger.info(f"Domains list:")
                 for d in domain_list:
                     self.logger.info(f"Domain: {d.display_name} URL: {d.url}")
 
-                    # Annoyingly we need to create the client here
-                    self.identity_domains_client = IdentityDomainsClient(self.config, retry_strategy=DEFAULT_RETRY_STRATEGY, service_endpoint=d.url)
-
-                    # Call again for Dynamic Resource Groups
-                    dg_list = self.identity_domains_client.list_dynamic_resource_groups(
-                        attribute_sets=["all"]
-                    ).data
+                # Every domain at once, one client per domain endpoint - each page is parsed into the list as it arrives
+                lock = Lock()
 
-                    self.logger.info(f"DRGs for {d.display_name}")
-                    for dg in dg_list.resources:
-                        self.logger.info(f"DG: {dg.display_name} Rule: {dg.matching_rule} Created: {dg.meta.created}")
-                        entry = self.parse_dynamic_group(
-                            dg_domain=d.display_name,
+                def add_page(domain, dg_list):
+                    entries = []
+                    for dg in dg_list:
+                        self.logger.debug(f"DG: {dg.display_name} Rule: {dg.matching_rule} Created: {dg.meta.created}")
+                        entries.append(self.parse_dynamic_group(
+                            dg_domain=domain.display_name,
                             dg_name=dg.display_name,
                             dg_ocid=dg.ocid,
                             dg_rule=dg.matching_rule,
                             dg_created=dg.meta.created
-                        )
-                        self.dynamic_groups.append(entry)
-                    # # What is a DynamicResouceGroups
-                    # for res in dg_list.resources:
-                    #     self.logger.info(f"DRG for: {res.display_name}")
-
-                    #     # Even stupider, to get matching rule, we need to get the DynamicResourceGroup (no s)
-                    #     dg = self.identity_domains_client.get_dynamic_resource_group(
-                    #         dynamic_resource_group_id=res.ocid,
-                    #         attribute_sets=["all"]
-                    #     ).data
-
-                    #     self.logger.info(f"Dynamic Group: {dg}")
-                    #     entry = self.parse_dynamic_group(dynamic_group=dg)
-                    #     self.logger.debug(f'Response (IAM): {entry}')
-                    #     self.dynamic_groups.append(entry)
-               
+                        ))
+                    with lock:
+                        self.dynamic_groups.extend(entries)
+
+                self.domain_loads = DomainCrawler(self.config, self.signer, workers=THREADS).crawl(domain_list, add_page)
+                self.failed_domains = [load.domain for load in self.domain_loads if load.error]
             except ServiceError as se:
                 # Cannot load domains
 
@@ -415,14 +383,26 @@ class DynamicGroupAnalysis:
                     )
                     self.logger.debug(f'Response (non-IAM): {entry}')
                     self.dynamic_groups.append(entry)
+            if self.failed_domains:
+                # Analyses of a partial list would report the missing groups' statements as invalid - don't cache it
+                self.query_cache.bump()
+                self.logger.error(f"---DG Load incomplete ({len(self.dynamic_groups)}) - failed domains: {', '.join(self.failed_domains)}. Not cached---")
+                return False
             # # Dump new cache
-            with open(f'.dynamic-group-cache-{self.tenancy_ocid}.dat', 'w') as filehandle:
-                json.dump(self.dynamic_groups, filehandle)
+            self.save_cache()
 
         # Done
+        self.query_cache.bump()
         self.logger.info(f"---Finished DG Load ({len(self.dynamic_groups)}) for tenant: {self.tenancy_ocid} ---")
         return True
 
+    def save_cache(self):
+        """Write the DGs to the snapshot, and the JSON cache if asked"""
+
+        write_snapshot(f'.dynamic-group-snapshot-{self.tenancy_ocid}.dat', self.tenancy_ocid, {"dynamic_groups": self.dynamic_groups})
+        if self.write_json:
+            dump_json(f'.dynamic-group-cache-{self.tenancy_ocid}.dat', self.dynamic_groups)
+
     # Set the statements
     def set_statements(self, statements: list):
         """Set the policies in place"""
@@ -438,44 +418,20 @@ class DynamicGroupAnalysis:
         '''Filter the list of DGs and return what is required'''
 
         self.logger.info(f"Filtering DG with domain filter: {domain_filter}, name filter: {name_filter}, type filter: {type_filter}, ocid filter: {ocid_filter}")
-        filtered_dynamic_groups = []
-
-        # Split Name filter
-        split_domain_filter = domain_filter.split('|')
-        split_name_filter = name_filter.split('|')
-        split_ocid_filter = ocid_filter.split('|')
-        split_type_filter = type_filter.split('|')
-
-        # Domain Filter
-        for filt in split_domain_filter:
-            filtered_dynamic_groups.extend(list(filter(lambda dg: filt.casefold() in dg[0].casefold(), self.dynamic_groups)))
-        self.logger.debug(f"Filtered Domain: {split_domain_filter}. After: {len(filtered_dynamic_groups)} Dynamic Groups")
-
-        filtered_dynamic_groups_prev = filtered_dynamic_groups
-        filtered_dynamic_groups = []
-
-        # Name Filter
-        for filt in split_name_filter:
-            filtered_dynamic_groups.extend(list(filter(lambda dg: filt.casefold() in dg[1].casefold(), filtered_dynamic_groups_prev)))
-        self.logger.debug(f"Filtered Name: {split_name_filter}. After: {len(filtered_dynamic_groups)} Dynamic Groups")
-
-        filtered_dynamic_groups_prev = filtered_dynamic_groups
-        filtered_dynamic_groups = []
-
-        # OCID Filter
-        for filt in split_ocid_filter:
-            filtered_dynamic_groups.extend(list(filter(lambda dg: filt.casefold() in dg[3].casefold(), filtered_dynamic_groups_prev)))
-        # filtered_dynamic_groups = self.dynamic_groups
-        self.logger.debug(f"Filtered OCID: {split_ocid_filter}. After: {len(filtered_dynamic_groups)} Dynamic Groups")
-
-        filtered_dynamic_groups_prev = filtered_dynamic_groups
-        filtered_dynamic_groups = []
-
-        # Type Filter
-        for filt in split_type_filter:
-            filtered_dynamic_groups.extend(list(filter(lambda dg: filt.casefold() in dg[3].casefold(), filtered_dynamic_groups_prev)))
-        # filtered_dynamic_groups = self.dynamic_groups
-        self.logger.debug(f"Filtered Type: {split_type_filter}. After: {len(filtered_dynamic_groups)} Dynamic Groups")
+
+        # (position, alternatives) - all must match, any alternative of each. Empty filters match everything
+        clauses = tuple((position, alternatives) for position, alternatives in ((0, filter_alternatives(domain_filter)),
+                                                                                 (1, filter_alternatives(name_filter)),
+                                                                                 (3, filter_alternatives(ocid_filter)),
+                                                                                 (3, filter_alternatives(type_filter)))
+                        if alternatives)
+
+        # One pass, each DG at most once in load order - repeated queries come from the cache
+        filtered_dynamic_groups = self.query_cache.lookup(
+            clauses,
+            lambda: [dg for dg in self.dynamic_groups
+                     if all(any(filt in dg[position].casefold() for filt in alternatives) for position, alternatives in clauses)])
+        self.logger.debug(f"Query cache: {self.query_cache}")
         self.logger.info(f"After filters: {len(filtered_dynamic_groups)} Dynamic Groups")
         return filtered_dynamic_groups
 
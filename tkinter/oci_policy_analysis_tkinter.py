@@ -1,13 +1,5 @@
-# UI
-import tkinter as tk
-#import tkinter.ttk as ttk
-import ttkbootstrap as ttk
-
-from ttkbootstrap.constants import *
-from tkinter.filedialog import askopenfilename, asksaveasfilename
-from tkinter import font
-from tksheet import Sheet
-from tkinterweb import HtmlFrame
+# UI - ttkbootstrap, tksheet, tkinterweb and the analysis classes are imported after argument parsing (see main),
+# so --help and argument errors return without loading them
 
 # Python
 import json
@@ -21,13 +13,6 @@ import datetime
 # 3rd Party
 import argparse
 
-# Local Class
-from dynamic import DynamicGroupAnalysis
-from policy import PolicyAnalysis
-from progress import Progress
-
-from oci.identity_domains import IdentityDomainsClient
-
 ###############################################################################################################
 # Global variables and Helper
 ###############################################################################################################
@@ -81,7 +66,9 @@ def load_policy_analysis_from_client():
     policy_analysis.initialize_client(profile=profile.get(),
                                       use_instance_principal=use_instance_principal.get(),
                                       use_cache=use_cache.get(),
-                                      use_recursion=use_recursion.get())
+                                      use_recursion=use_recursion.get(),
+                                      use_search=use_search.get(),
+                                      use_async=use_async.get())
 
     # Start background thread to load policies
     bg_thread = Thread(target=load_policy_analysis_thread)
@@ -90,7 +77,10 @@ def load_policy_analysis_from_client():
     # Load Dynamic Groups
     dyn_group_analysis.initialize_client(profile.get(), 
                                       use_instance_principal=use_instance_principal.get())
-    dyn_group_analysis.load_all_dynamic_groups(use_cache=use_cache.get())
+    if not dyn_group_analysis.load_all_dynamic_groups(use_cache=use_cache.get()):
+        messagebox.showerror("Dynamic Groups incomplete",
+                             f"Dynamic groups of these domains failed to load: {', '.join(dyn_group_analysis.failed_domains)}.\n"
+                             "The list was not cached and the dynamic group analyses are disabled until a load succeeds.")
 
     # Display populate
     update_output()
@@ -212,8 +202,8 @@ def update_output():
                                                                            policy_filter=entry_policy.get(),
                                                                            text_filter=entry_text.get())
 
-    # TK Sheet
-    sheet_policies.data = regular_statements_filtered
+    # TK Sheet (plain lists - the store keeps compact records)
+    sheet_policies.data = [statement.to_list() for statement in regular_statements_filtered]
     if chk_show_expanded.get():
         # Show all columns
         sheet_policies.display_columns(all_columns_displayed=True)
@@ -331,9 +321,22 @@ def analyze_dynamic_group():
 
     # Parse Statement Again
 
+# Refuse the DG analyses while the DG list is missing a domain
+def dynamic_groups_incomplete() -> bool:
+    """Show the failed domains and return True if the last DG load was incomplete"""
+
+    if dyn_group_analysis.failed_domains:
+        messagebox.showerror("Dynamic Groups incomplete",
+                             f"Dynamic groups of these domains failed to load: {', '.join(dyn_group_analysis.failed_domains)}.\n"
+                             "Reload before running the analysis.")
+        return True
+    return False
+
 # From the Policy Screen, run the DG exists Analysis
 def run_policy_statement_dynamic_group_analysis():
     """Let the Policy class handle this"""
+    if dynamic_groups_incomplete():
+        return
     invalid_list = policy_analysis.check_for_invalid_dynamic_groups(dynamic_groups=dyn_group_analysis.dynamic_groups)
 
     # Create work statements
@@ -348,6 +351,8 @@ def run_policy_statement_dynamic_group_analysis():
 # From the DG Screen, run the DG in use Analysis
 def run_dynamic_group_inuse_analysis():
     """Let the DG class handle this"""
+    if dynamic_groups_incomplete():
+        return
     # Set Statements
     dyn_group_analysis.set_statements(policy_analysis.regular_statements)
     # Run the anlaysis
@@ -365,6 +370,8 @@ def run_dynamic_group_inuse_analysis():
 # From the DG Screen, run the DG in use Analysis
 def run_dynamic_group_ocid_analysis():
     """Run in the DG class as a thread"""
+    if dynamic_groups_incomplete():
+        return
 
     # Set Statements
     dyn_group_analysis.set_statements(policy_analysis.regular_statements)
@@ -388,6 +395,9 @@ def update_progress():
     if policy_analysis.finished:
         update_output()
         policy_analysis.finished = False
+        # What an incremental load changed
+        if policy_analysis.refresh_summary:
+            text_work.insert(tk.END, policy_analysis.refresh_summary.describe() + "\n")
         
     
     # Set an event every 1s forever
@@ -407,7 +417,7 @@ def load_file():
     input_json = json.loads(text)
 
     # Load all policies from filtered file
-    policy_analysis.regular_statements = input_json.get("filtered-policy-statements")
+    policy_analysis.set_statements(input_json.get("filtered-policy-statements"))
     logger.info(f"Loaded saved policies from disk")
 
     enable_buttons()
@@ -456,7 +466,7 @@ def save_file():
                      "condition-filter": entry_condition.get(),
                      "text-filter": entry_text.get(),
                      "policy-name-filter": entry_policy.get(),
-                     "filtered-policy-statements": regular_statements_filtered
+                     "filtered-policy-statements": [statement.to_list() for statement in regular_statements_filtered]
     }
 
     if filepath.endswith(".json"):
@@ -495,9 +505,31 @@ if __name__ == "__main__":
     # Parse Arguments
     parser = argparse.ArgumentParser()
     parser.add_argument("-v", "--verbose", help="increase output verbosity", action="store_true")
+    parser.add_argument("-p", "--parser", help="policy statement parser", choices=["lexer", "regex"], default="lexer")
+    parser.add_argument("-x", "--index", help="trigram index for filtering (saved next to the cache)", action="store_true")
+    parser.add_argument("-j", "--jsoncache", help="also write the JSON cache files (the cache is a binary snapshot)", action="store_true")
+    parser.add_argument("-d", "--database", help="keep statements in this SQLite database (every load is kept) and filter with SQL")
+    parser.add_argument("-i", "--incremental", help="on a tenancy load, only parse policies changed since the cached load", action="store_true")
+    parser.add_argument("-w", "--workers", help="processes for parsing large tenancy loads in bulk (def=1)", type=int, default=1)
     args = parser.parse_args()
     verbose = args.verbose
 
+    # UI
+    import tkinter as tk
+    #import tkinter.ttk as ttk
+    import ttkbootstrap as ttk
+
+    from ttkbootstrap.constants import *
+    from tkinter.filedialog import askopenfilename, asksaveasfilename
+    from tkinter import font, messagebox
+    from tksheet import Sheet
+    from tkinterweb import HtmlFrame
+
+    # Local Class (the OCI SDK is imported when a client is set up)
+    from dynamic import DynamicGroupAnalysis
+    from policy import PolicyAnalysis
+    from progress import Progress
+
     # Main Logger
     logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s [%(threadName)s] %(levelname)s %(message)s')
     logger = logging.getLogger('oci-policy-analysis-main')
@@ -590,6 +622,16 @@ if __name__ == "__main__":
     input_recursion= ttk.Checkbutton(frm_init, text='Recursion?', variable=use_recursion, command=update_load_options)
     input_recursion.grid(row=1, column=2, columnspan=2, sticky="ew", padx=25, pady=3)
 
+    # Resource Search discovery
+    use_search = tk.BooleanVar()
+    input_search = ttk.Checkbutton(frm_init, text='Use Search?', variable=use_search)
+    input_search.grid(row=2, column=2, columnspan=2, sticky="ew", padx=25, pady=3)
+
+    # asyncio load engine
+    use_async = tk.BooleanVar()
+    input_async = ttk.Checkbutton(frm_init, text='Async Engine?', variable=use_async)
+    input_async.grid(row=2, column=0, columnspan=2, sticky="ew", padx=5, pady=3)
+
     # Init Button
     btn_load = ttk.Button(frm_init, width=50, text="Load Policies and Dynamic Groups from ROOT compartment only", command=load_policy_analysis_from_client)
     btn_load.grid(row=0, column=4, rowspan=2, sticky="ew", padx=25)
@@ -831,9 +873,16 @@ if __name__ == "__main__":
     # Create the worker classes
     progress = Progress(progress_val=0)
     policy_analysis = PolicyAnalysis(progress=progress,
-                                     verbose=verbose)
+                                     verbose=verbose,
+                                     parser=args.parser,
+                                     use_index=args.index,
+                                     write_json=args.jsoncache,
+                                     database=args.database,
+                                     incremental=args.incremental,
+                                     parse_workers=args.workers)
     dyn_group_analysis = DynamicGroupAnalysis(progress=progress, 
-                                              verbose=verbose)
+                                              verbose=verbose,
+                                              write_json=args.jsoncache)
 
     # Start updating Progress Meter, using loop
     update_progress()
@@ -1,30 +1,41 @@
 # Python
 import logging
-import re
-import json
 import os
+import sys
 import time
 import datetime
+from threading import Lock
 from concurrent.futures import ThreadPoolExecutor
 
-from oci import config, pagination
-from oci.retry import DEFAULT_RETRY_STRATEGY
-from oci.exceptions import ConfigFileNotFound, ServiceError
-from oci.identity import IdentityClient
-from oci.identity.models import Compartment, Policy, UpdatePolicyDetails
-from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
-from oci.identity_domains import IdentityDomainsClient
+# OCI - imported by initialize_client, so the window opens (and a cache loads) without the SDK
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from oci.identity.models import Compartment, Policy
 
 # Local
 from progress import Progress
 
+# Shared (repo root)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from oci_compartment_tree import CompartmentTree
+from oci_policy_discovery import policy_compartment_ids, stream_compartments, submit_pipelined
+from oci_policy_crawler import AsyncIdentityCrawler, CONCURRENCY
+from oci_policy_parser import StatementParser, PARSER
+from oci_policy_store import PolicyStatement, StatementStore
+from oci_policy_query import FILTER_COLUMNS, QueryCache, StatementQuery
+from oci_policy_index import TrigramIndex
+from oci_policy_snapshot import SnapshotStore, dump_json, load_json, load_table, open_snapshot, write_snapshot
+from oci_policy_database import DatabaseStore, StatementDatabase
+from oci_policy_refresh import PolicyRefresh
+from oci_policy_permissions import PermissionEngine
+from oci_subject_index import shared_index
+
 ###############################################################################################################
 # Constants
 ###############################################################################################################
 
 THREADS = 8
-POLICY_REGEX = r'^\s*?(allow|endorse)\s+(?P<subjecttype>service|any-user|any-group|dynamic-group|dynamicgroup|group|resource)\s*(?P<subject>([\w\/\'\.\\, +-]|,)+?)?\s+(to\s+)?((?P<verb>read|inspect|use|manage)\s+(?P<resource>[\w-]+)|(?P<perm>{[\s*\w\s*|\s*\w\s*,\s*]+}))\s+in\s+(?P<locationtype>any-tenancy|tenancy|compartment\s+id|compartment)\s*(?P<location>[\w\':.-]+)?(?:\s+where\s+(?P<condition>.+))?(?:(?P<optional>\s*\/\/.+))?$'
-SUBJECT_REGEX = r'^(\'|\")?((?P<domain>[\w\-\_]+)(\/|\\))?(?P<name>[\w\-\_]+)(\'|\")?'
+MAX_PENDING = THREADS * 4
 
 ###############################################################################################################
 # PolicyAnalysis class
@@ -33,14 +44,15 @@ SUBJECT_REGEX = r'^(\'|\")?((?P<domain>[\w\-\_]+)(\/|\\))?(?P<name>[\w\-\_]+)(\'
 
 class PolicyAnalysis:
 
-    regular_statements = []
+    regular_statements = StatementStore()
 
     # Use like a global to indicate if it is running a threaded load.  When finished, this goes to True, and then
     # the main class does an update and sets this back to false.  Probably a better way
     finished = False
 
     # tenancy_ocid, identity_client recursion
-    def __init__(self, progress: Progress, verbose: bool):
+    def __init__(self, progress: Progress, verbose: bool, parser: str = PARSER, use_index: bool = False, write_json: bool = False,
+                 database: str = None, incremental: bool = False, parse_workers: int = 1):
         """Initialize the class"""
 
         # Create a logger
@@ -56,12 +68,55 @@ class PolicyAnalysis:
         # Set load date to nothing yet
         self.data_as_of = ""
 
+        # Shared statement parser - identical statement texts are parsed once
+        self.statement_parser = StatementParser(parser=parser)
+
+        # Processes for parsing whole batches of listed policies up front (1 - parse as policies are loaded)
+        self.parse_workers = parse_workers
+
+        # Optional trigram index for filtering, built after each load and kept next to the cache
+        self.use_index = use_index
+        self.statement_index = None
+
+        # Filter results by query - bumped whenever the statements are reloaded or changed
+        self.query_cache = QueryCache()
+
+        # The cache is a binary snapshot - the JSON cache is still read if there is no snapshot, and written on request
+        self.write_json = write_json
+
+        # Optional SQLite backend - every load is stored as a snapshot there and filters run as SQL
+        self.database = StatementDatabase(database) if database else None
+
+        # Incremental refresh - client loads reuse the cached statements of policies that haven't changed
+        self.incremental = incremental
+        self.refresh = None
+        self.refresh_summary = None
+
+        # Compartment index of a tenancy load (none when loaded from cache) and the permission engine built from it
+        self.compartment_tree = None
+        self.permissions = None
+
+        # Policies listed while compartments are still streaming (paths not resolvable yet)
+        self.deferred_lock = Lock()
+        self.deferred_policies = []
+
     # Class Initializer
-    def initialize_client(self, profile: str, use_instance_principal: bool, use_recursion: bool, use_cache: bool) -> bool:
+    def initialize_client(self, profile: str, use_instance_principal: bool, use_recursion: bool, use_cache: bool, use_search: bool = False,
+                          use_async: bool = False) -> bool:
         """Set up the OCI client (Identity)"""
 
+        from oci import config
+        from oci.retry import DEFAULT_RETRY_STRATEGY
+        from oci.exceptions import ConfigFileNotFound
+        from oci.identity import IdentityClient
+        from oci.auth.signers import InstancePrincipalsSecurityTokenSigner
+        from oci.identity_domains import IdentityDomainsClient
+        from oci.resource_search import ResourceSearchClient
+
         # Grab variables required
         self.use_recursion = use_recursion
+        self.use_search = use_search
+        self.use_async = use_async
         self.use_cache = use_cache
         self.use_instance_principal = use_instance_principal
         self.profile = profile
@@ -74,6 +129,7 @@ class PolicyAnalysis:
                 # Create the OCI Client to use
                 self.identity_client = IdentityClient(config={}, signer=signer, retry_strategy=DEFAULT_RETRY_STRATEGY)
                 self.idm_client = IdentityDomainsClient(config={}, signer=signer, retry_strategy=DEFAULT_RETRY_STRATEGY)
+                self.search_client = ResourceSearchClient(config={}, signer=signer, retry_strategy=DEFAULT_RETRY_STRATEGY)
                 self.tenancy_ocid = signer.tenancy_id
             except Exception as exc:
                 self.logger.fatal(f"Unable to use IP Authentication: {exc}")
@@ -89,6 +145,7 @@ class PolicyAnalysis:
                 self.idm_client = IdentityDomainsClient(config=self.config,
                                                         service_endpoint="https://idcs-aea17de1f62a467cbc60239f8851911c.identity.oraclecloud.com",
                                                         retry_strategy=DEFAULT_RETRY_STRATEGY)
+                self.search_client = ResourceSearchClient(self.config, retry_strategy=DEFAULT_RETRY_STRATEGY)
 
                 self.tenancy_ocid = self.config["tenancy"]
             except ConfigFileNotFound as exc:
@@ -97,7 +154,7 @@ class PolicyAnalysis:
         self.logger.info(f"Set up Identity Client for tenancy: {self.tenancy_ocid}")
         return True
 
-    def parse_statement(self, statement: str, comp_string: str, policy: Policy) -> list:
+    def parse_statement(self, statement: str, comp_string: str, policy: "Policy") -> list:
         '''Parses policy statement into list
            0 - policy name
            1 - id
@@ -115,111 +172,56 @@ class PolicyAnalysis:
            13 - conditions
            14 - optional (Comments at end)
            15 - created time
+           Fields 4-14 come from the shared parse of the statement text (one object per distinct text)
         '''
 
-        # Grab the creation time in string
-        time_created = policy.time_created.strftime("%m/%d/%Y %H:%M:%S")
-
-        # Use case-insensitive and multi-line
-        result = re.search(pattern=POLICY_REGEX,
-                           string=statement,
-                           flags=re.IGNORECASE|re.MULTILINE
-                           )
-        if result:
-            self.logger.debug(f"Statement: {statement} : {result.groups()}")
-            try:
-                # policy name, id, compartment id, hierarchy, statement text, valid-bool, subj-type, subject, verb, resource, perms, loc-type, location, conditions, optional) 
-                statement_list = [policy.name, policy.id, policy.compartment_id, f"{comp_string}", statement, True if result else False, 
-                                result.group('subjecttype'), 
-                                result.group('subject') if result.group('subject') else "", 
-                                result.group('verb') if result.group('verb') else "", 
-                                "" if not result.group('resource') else result.group('resource'), 
-                                result.group('perm'),
-                                result.group('locationtype'), 
-                                result.group('location') if result.group('location') else "", 
-                                result.group('condition') if result.group('condition') else "", 
-                                result.group('optional') if result.group('optional') else "",
-                                time_created
-                ]
-                # Post-process any-user / any-group
-                if statement_list[6] == "any-user" or statement_list[6] == "any-group":
-                    statement_list[7] = [None,statement_list[6]]
-                else:
-                    # Post-process subject(domain/group)
-                    subject_result = re.search(pattern=SUBJECT_REGEX,
-                                            string=statement_list[7],
-                                            flags=re.IGNORECASE
-                                            )
-                    subject_domain = "Default" if not subject_result.group('domain') else subject_result.group('domain')
-                    subject_name = subject_result.group('name')
-                    statement_list[7] = [subject_domain,subject_name]
-                
-                # Hierarchy ROOT so searchable
-                if not statement_list[3] or statement_list[3] == "":
-                    statement_list[3] = "ROOT"
-
-                # Statement list return
-                return statement_list
-            except Exception as e:
-                self.logger.warning(f"Failed to parse result: {e}")
-                statement_list = [policy.name, policy.id, policy.compartment_id, f"{comp_string}", statement,
-                                   False, "other", ["",""], "", "", False, "", "", "", "", time_created]
-                return statement_list
-        else:
-            # Return less populated tuple
-            self.logger.info(f"No regex result: {statement}")
-            if statement.startswith("define"):
-                statement_list = [policy.name, policy.id, policy.compartment_id, f"{comp_string}", statement, 
-                                  True, "define", ["",""], "", "", False, "", "", "", "", time_created]
-            else:
-                statement_tuple = [policy.name, policy.id, policy.compartment_id, f"{comp_string}", statement,
-                                   True, "other", ["",""], "", "", False, "", "", "", "", time_created]
-            return statement_list      
-
-    # Recursive Compartments / Policies
-    def get_compartment_path(self, compartment: Compartment, level, comp_string) -> str:
-        """Create the hierarchical path back to tenancy root"""
+        return self.statement_parser.statement_list(statement=statement, hierarchy=comp_string, policy=policy)
 
-        # Top level forces fall back through
-        self.logger.debug(f"Compartment Name: {compartment.name} ID: {compartment.id} Parent: {compartment.compartment_id}") 
-        if not compartment.compartment_id:
-            self.logger.debug(f"Top of tree. Path is {comp_string}")
-            return comp_string
-        parent_compartment = self.identity_client.get_compartment(compartment_id=compartment.compartment_id).data    
+    # Compartment path from the tree index
+    def get_compartment_path(self, compartment: "Compartment") -> str:
+        """Return the hierarchical path back to tenancy root (no API calls)"""
 
-        # Recurse until we get to top
-        self.logger.debug(f"Recurse. Path is {comp_string}")
-        return self.get_compartment_path(parent_compartment, level+1, compartment.name + "/" + comp_string)
+        path = self.compartment_tree.path(compartment.id)
+        self.logger.debug(f"Compartment Name: {compartment.name} ID: {compartment.id} Path: {path}")
+        return path
 
     # Post-process - determine if DGs are invalid
     def check_for_invalid_dynamic_groups(self, dynamic_groups: list) -> list:
         """Loop through DG policies and ensure DGs exist. Return a list of (policy_ocid, statement) for deletion.  
         Deletion is *hard* because the underlying policy needs to have a statement removed"""
 
-        invalid_list = []
+        # One pass over the statements and one over the DGs - reused until either is reloaded
+        index = shared_index(self.regular_statements, dynamic_groups)
 
         statements_analyzed = 0
-        for st in self.regular_statements:
-            if st[6] == "dynamic-group":
-                self.logger.debug(f"Validating statement for group {st[7]}")
-                valid = False
-                for dg in dynamic_groups:
-                    # Both the domain and the Name must match
-                    if st[7][0].casefold() == dg[0].casefold() and st[7][1].casefold() == dg[1].casefold():
-                        self.logger.debug(f"We have a match: {dg[1]}")
-                        valid = True
+        changes = []
+        invalid = []
+        for key, statements in index.statement_subjects():
+            # Both the domain and the Name must match
+            valid = key in index.groups
+            self.logger.debug(f"Validated {len(statements)} statements for group {key}: {valid}")
+            for row, st in statements:
                 st[5] = valid
-                statements_analyzed += 1
-                # Prepare return
-                if not st[5]:
-                    self.logger.info(f"Invalid DG: {st[7]}. Statement to remove: {st[4]}")
-                    inv_tuple = (st[1], st[4])
-                    invalid_list.append(inv_tuple)
+                changes.append((row, valid))
+                if not valid:
+                    invalid.append((row, st))
+            statements_analyzed += len(statements)
+
+        # Prepare return - in statement order
+        invalid_list = []
+        for _, st in sorted(invalid, key=lambda entry: entry[0]):
+            self.logger.info(f"Invalid DG: {st[7]}. Statement to remove: {st[4]}")
+            invalid_list.append((st[1], st[4]))
         self.logger.info(f"Completed validation for {statements_analyzed} Dynamic Group statments")
+        # Records read from the database are copies - store the result there
+        if isinstance(self.regular_statements, DatabaseStore):
+            self.regular_statements.set_valid(changes)
+        # Validity changed
+        self.query_cache.bump()
         return invalid_list
     
     # Threadable policy loader - per compartment
-    def load_policies(self, compartment: Compartment):
+    def load_policies(self, compartment: "Compartment"):
         '''Runs as a thread - load all policies in a compartment and parse them into internal list representation'''
 
         self.logger.debug(f"Compartment: {compartment.id}")
@@ -235,13 +237,38 @@ class PolicyAnalysis:
         if len(list_policies_response) == 0:
             self.logger.debug("No policies. return")
             return
-        
+
+        # While compartment pages are still arriving the tree can't resolve paths - park until it is complete
+        with self.deferred_lock:
+            if not self.compartment_tree.ready.is_set():
+                self.logger.debug(f"Deferring {len(list_policies_response)} policies until compartments are listed")
+                self.deferred_policies.append((compartment, list_policies_response))
+                return
+
+        self.parse_policies(compartment=compartment, policies=list_policies_response)
+
+    def parse_ahead(self, policy_lists):
+        '''Parse the statements of many policies on a process pool - parse_policies then finds them in the parser cache'''
+
+        if self.parse_workers > 1:
+            self.statement_parser.parse_bulk([statement for policies in policy_lists for policy in policies for statement in policy.statements],
+                                             workers=self.parse_workers)
+
+    def parse_policies(self, compartment: "Compartment", policies: list):
+        '''Parse the policies of one compartment into internal list representation'''
+
         # Load recursive structure of path (only if there are policies)
-        path = self.get_compartment_path(compartment, 0, "")
+        path = self.get_compartment_path(compartment)
         self.logger.debug(f"Compartment Path: {path}")
 
-        for policy in list_policies_response:
+        for policy in policies:
             self.logger.debug(f"() Policy: {policy.name} ID: {policy.id}")
+            if self.refresh:
+                stored = self.refresh.reuse(policy=policy, hierarchy=path)
+                if stored is not None:
+                    self.logger.debug(f"-- Unchanged, reusing {len(stored)} statements")
+                    self.regular_statements.extend(stored)
+                    continue
             for index, statement in enumerate(policy.statements, start=1):
                 self.logger.debug(f"-- Statement {index}: {statement}")
 
@@ -267,19 +294,45 @@ class PolicyAnalysis:
         # Start fresh
         # self.dynamic_group_statements = []
         # self.service_statements = []
-        self.regular_statements = []
+        self.close_snapshot()
+        self.regular_statements = StatementStore()
+        self.statement_index = None
+        self.query_cache.bump()
+        self.deferred_policies = []
+        self.refresh = None
+        self.refresh_summary = None
+        self.compartment_tree = None
+        self.permissions = None
 
         # If cached, load that and be done
         if self.use_cache:
             self.logger.info(f"---Starting Policy Load for tenant: {self.tenancy_ocid} from cached files---")
-            if os.path.isfile(f'.policy-statement-cache-{self.tenancy_ocid}.dat'):
-                with open(f'./.policy-statement-cache-{self.tenancy_ocid}.dat', 'r') as filehandle:
-                    self.regular_statements = json.load(filehandle)
-                self.data_as_of = time.ctime(os.path.getmtime(f'.policy-statement-cache-{self.tenancy_ocid}.dat'))
+            cached = self.read_cache()
+            if cached:
+                self.regular_statements, self.data_as_of, source = cached
+                if source == "snapshot":
+                    self.index_statements()
+                    if self.database:
+                        # First run with the database - import the snapshot
+                        self.save_cache()
+                elif source == "json":
+                    # JSON cache from an older version - import it and keep a snapshot from now on
+                    self.index_statements(save=False)
+                    self.save_cache()
         else:
             # If set from main() it is ok, otherwise take from function call
             self.logger.info(f"---Starting Policy Load for tenant: {self.tenancy_ocid} with recursion {self.use_recursion} and {THREADS} threads---")
 
+            # Compare against the last load - unchanged policies keep their statements
+            if self.incremental:
+                cached = self.read_cache()
+                if cached:
+                    self.logger.info(f"Incremental refresh against the {cached[2]} cache loaded {cached[1]}")
+                    self.refresh = PolicyRefresh(cached[0])
+                    if isinstance(cached[0], SnapshotStore):
+                        # The refresh has read what it needs - unmap the file so save_cache can replace it
+                        cached[0].close(keep=False)
+
             # Load the policies
             # Start with list of compartments
             comp_list = []
@@ -291,37 +344,62 @@ class PolicyAnalysis:
             root_comp = self.identity_client.get_compartment(compartment_id=self.tenancy_ocid).data 
             comp_list.append(root_comp)
 
-            if self.use_recursion:
-                # Get all compartments (we don't know the depth of any), tenancy level
-                # Using the paging API
-                paginated_response = pagination.list_call_get_all_results(
-                    self.identity_client.list_compartments,
-                    self.tenancy_ocid,
-                    access_level="ACCESSIBLE",
-                    sort_order="ASC",
-                    compartment_id_in_subtree=True,
-                    lifecycle_state="ACTIVE",
-                    limit=1000)
-                comp_list.extend(paginated_response.data)
-
-                self.logger.info(f'Loaded {len(comp_list)} Compartments.  {"Using recursion" if self.use_recursion else "No Recursion, only root-level policies"}')
-
-                # We know the compartment count now - set up progress, if warranted
+            # Index the hierarchy once - paths come from here rather than a get_compartment per ancestor
+            self.compartment_tree = CompartmentTree(fetch_compartment=lambda ocid: self.identity_client.get_compartment(compartment_id=ocid).data)
+            self.compartment_tree.add(root_comp)
+
+            # Discovery via Resource Search (None falls back to every compartment)
+            search_ids = policy_compartment_ids(self.search_client, self.tenancy_ocid) if self.use_search else None
+
+            if self.use_async:
+                # One event loop does the listing and every list_policies - then parse as the threads would
+                if self.progress:
+                    self.progress.set_to_load(0)
+                crawler = AsyncIdentityCrawler(self.identity_client, concurrency=CONCURRENCY)
+                comp_list, policies_by_compartment = crawler.run(tenancy_ocid=self.tenancy_ocid, recursion=self.use_recursion,
+                                                                 only=search_ids, progress=self.progress)
+                self.compartment_tree = CompartmentTree(comp_list, fetch_compartment=lambda ocid: self.identity_client.get_compartment(compartment_id=ocid).data)
+                self.parse_ahead(policies_by_compartment.values())
+                for c in comp_list:
+                    if policies_by_compartment.get(c.id):
+                        self.parse_policies(compartment=c, policies=policies_by_compartment[c.id])
+                if self.progress:
+                    self.progress.progressbar_val = 0.0
+                toc = time.perf_counter()
+                self.logger.info(f"Loaded {len(self.regular_statements)} regular policy statements from {len(comp_list)} compartments with {CONCURRENCY} concurrent requests in {toc-tic:.2f}s")
+
+            elif self.use_recursion:
+                # Running total - grows as compartment pages arrive
                 if self.progress:
-                    self.progress.set_to_load(len(comp_list))
-                    self.logger.debug(f"Progress Bar set total: {len(comp_list)}")
+                    self.progress.set_to_load(0)
+
+                # Stream compartment pages straight into the workers, so listing and loading overlap
+                def compartments_to_load():
+                    if search_ids is None or root_comp.id in search_ids:
+                        yield root_comp
+                    for c in stream_compartments(self.identity_client, self.tenancy_ocid):
+                        comp_list.append(c)
+                        self.compartment_tree.add(c)
+                        if search_ids is None or c.id in search_ids:
+                            yield c
 
-                # Use multiple threads at once
                 with ThreadPoolExecutor(max_workers = THREADS, thread_name_prefix="thread") as executor:
-                    # results = executor.map(self.load_policies, comp_list)
-                    results = [executor.submit(self.load_policies, c) for c in comp_list]
                     self.logger.info(f"Kicked off {THREADS} threads for parallel execution - adjust as necessary")
-
-                    # Add callbacks to report
-                    for future in results:
-                        # future.add_done_callback(print)
-                        if self.progress:
-                            future.add_done_callback(self.progress.progress_indicator)
+                    results = submit_pipelined(executor, self.load_policies, compartments_to_load(),
+                                               max_pending=MAX_PENDING,
+                                               on_submit=(lambda c: self.progress.add_to_load(1)) if self.progress else None,
+                                               on_done=self.progress.progress_indicator if self.progress else None)
+                    self.logger.info(f'Loaded {len(comp_list)} Compartments, {len(results)} to load.  {"Using recursion" if self.use_recursion else "No Recursion, only root-level policies"}')
+
+                    # Listing is done - resolve the tree and parse whatever was parked meanwhile
+                    with self.deferred_lock:
+                        self.compartment_tree.complete()
+                        deferred = self.deferred_policies
+                        self.deferred_policies = []
+                    self.logger.debug(f"Parsing {len(deferred)} deferred compartments")
+                    self.parse_ahead(policies for _, policies in deferred)
+                    for c, policies in deferred:
+                        self.parse_policies(compartment=c, policies=policies)
 
                 # Process Threaded Results
                 for future in results:
@@ -340,123 +418,128 @@ class PolicyAnalysis:
                 self.logger.info(f"Loaded {len(self.regular_statements)} regular policy statements on {THREADS} threads in {toc-tic:.2f}s")
 
             else:
+                self.compartment_tree.complete()
                 self.logger.info(f"Loading policies on main thread")
                 for c in comp_list:
+                    if search_ids is not None and c.id not in search_ids:
+                        continue
                     self.load_policies(compartment=c)
                 toc = time.perf_counter()
                 self.logger.info(f"Loaded /{len(self.regular_statements)} regular policy statements on main thread in {toc-tic:.2f}s")
 
             self.logger.info(f"---Finished Policy Load from client---")
+            self.logger.info(f"Statement parse cache: {self.statement_parser.cache_info()}")
+            if self.refresh:
+                self.refresh_summary = self.refresh.summary()
+                self.refresh = None
+                self.logger.info(self.refresh_summary.describe())
             self.data_as_of = str(datetime.datetime.now())
             # Dump in local cache for later
-            with open(f'.policy-statement-cache-{self.tenancy_ocid}.dat', 'w') as filehandle:
-                json.dump(self.regular_statements, filehandle)
+            self.index_statements(save=False)
+            self.save_cache()
         
         # Return true to incidate success
         # Poor man's event
+        self.query_cache.bump()
         self.finished = True
         return True
 
+    def read_cache(self):
+        """(statements, loaded as of, source) of the cached load - from the database, the snapshot or the JSON cache
+        (source is "database", "snapshot" or "json") - or None if there isn't one"""
+
+        stored = self.database.latest_snapshot(self.tenancy_ocid) if self.database else None
+        if stored:
+            # Statements stay in the database - read as filters and the grid need them
+            return DatabaseStore(self.database, stored[0]), stored[2], "database"
+        snapshot = open_snapshot(f'.policy-ui-snapshot-{self.tenancy_ocid}.dat', self.tenancy_ocid)
+        statements = load_table(snapshot, "statement", PolicyStatement)
+        if statements is not None:
+            # Statements are decoded as filters and the grid touch them
+            return statements, snapshot.loaded, "snapshot"
+        if os.path.isfile(f'.policy-statement-cache-{self.tenancy_ocid}.dat'):
+            return (StatementStore(rows=load_json(f'./.policy-statement-cache-{self.tenancy_ocid}.dat')),
+                    time.ctime(os.path.getmtime(f'.policy-statement-cache-{self.tenancy_ocid}.dat')), "json")
+        return None
+
+    def set_statements(self, statements: list):
+        """Replace the statements (eg from a saved file) - rows are 16-field lists"""
+
+        self.close_snapshot()
+        self.regular_statements = StatementStore(rows=statements)
+        self.statement_index = None
+        self.permissions = None
+        self.query_cache.bump()
+        if self.use_index:
+            self.statement_index = TrigramIndex.build(self.regular_statements, FILTER_COLUMNS.values())
+
+    def index_statements(self, save: bool = True):
+        """Use the trigram index in the snapshot, else load or build it (saved to its own file if save) - if indexing is on.
+        Not used with the database, which filters in SQL"""
+
+        if not self.use_index or self.database:
+            return
+        if isinstance(self.regular_statements, SnapshotStore):
+            self.statement_index = self.regular_statements.index()
+        if self.statement_index is None:
+            self.statement_index = TrigramIndex.load_or_build(f'.policy-statement-index-{self.tenancy_ocid}.dat',
+                                                              self.regular_statements, FILTER_COLUMNS.values(), save=save)
+
+    def save_cache(self):
+        """Write the statements (with folded filter columns and index) to the snapshot, and the JSON cache if asked.
+        With a database they are stored there as a new snapshot instead, and read back from it from now on"""
+
+        if self.write_json:
+            dump_json(f'.policy-statement-cache-{self.tenancy_ocid}.dat', self.regular_statements)
+        if self.database:
+            snapshot_id = self.database.add_snapshot(self.tenancy_ocid, self.regular_statements, loaded=self.data_as_of)
+            self.close_snapshot()
+            self.regular_statements = DatabaseStore(self.database, snapshot_id)
+            return
+        if isinstance(self.regular_statements, SnapshotStore):
+            # Writing over the file the statements are mapped from - decode them, and drop its index
+            self.regular_statements.close()
+            self.statement_index = None
+            self.index_statements(save=False)
+        write_snapshot(f'.policy-ui-snapshot-{self.tenancy_ocid}.dat', self.tenancy_ocid,
+                       {"statement": (self.regular_statements, FILTER_COLUMNS.values(), self.statement_index)},
+                       loaded=self.data_as_of)
+
+    def close_snapshot(self):
+        """Unmap the snapshot the current statements were read from, if they were - they are being replaced"""
+
+        if isinstance(self.regular_statements, SnapshotStore):
+            self.regular_statements.close(keep=False)
+            self.statement_index = None
+
+    def permission_engine(self) -> PermissionEngine:
+        """Effective permissions of the loaded statements (see oci_policy_permissions.py) - built on first use after a load"""
+
+        if self.permissions is None:
+            self.permissions = PermissionEngine.build(self.regular_statements, tree=self.compartment_tree)
+        return self.permissions
+
     # Filter Output
     def filter_policy_statements(self, subj_filter: str, verb_filter: str, resource_filter: str, location_filter: str, 
                                  hierarchy_filter: str, condition_filter: str, text_filter: str, policy_filter: str) -> list:
         '''Returns a list of filtered regular statements'''
-        regular_statements = self.regular_statements  
-        regular_statements_filtered = []
-
-        # Split
-        split_subj_filter = subj_filter.split(sep='|')
-        self.logger.debug(f"Subject filter length: {len(split_subj_filter)}")
-        split_verb_filter = verb_filter.split(sep='|')
-        self.logger.debug(f"Verb filter length: {len(split_verb_filter)}")
-        split_res_filter = resource_filter.split(sep='|')
-        self.logger.debug(f"Resource filter length: {len(split_res_filter)}")
-        split_loc_filter = location_filter.split(sep='|')
-        self.logger.debug(f"Location filter length: {len(split_loc_filter)}")
-        split_hierarchy_filter = hierarchy_filter.split(sep='|')
-        self.logger.debug(f"Hierarchy filter length: {len(split_loc_filter)}")
-        split_condition_filter = condition_filter.split(sep='|')
-        self.logger.debug(f"Condition filter length: {len(split_condition_filter)}")
-        split_text_filter = text_filter.split(sep='|')
-        self.logger.debug(f"Text filter length: {len(split_condition_filter)}")
-        split_policy_filter = policy_filter.split(sep='|')
-        self.logger.debug(f"Policy Name filter length: {len(split_policy_filter)}")
-
-        self.logger.debug(f"Filtering subject(B): {split_subj_filter}. Before: {len(regular_statements)} Reg statements")
-        for filt in split_subj_filter:
-            regular_statements_filtered.extend(list(filter(lambda statement: filt.casefold() in statement[7][1].casefold(), regular_statements)))
-        self.logger.debug(f"Filtering subject(A): {len(regular_statements_filtered)} Reg statements")
-
-        # Reset filter
-        regular_statements_filtered_prev = regular_statements_filtered
-        regular_statements_filtered = []
-
-        self.logger.debug(f"Filtering Verb(B): {split_verb_filter}. Before: {len(regular_statements_filtered_prev)} Reg statements")
-        for filt in split_verb_filter:
-            regular_statements_filtered.extend(list(filter(lambda statement: filt.casefold() in statement[8].casefold(), regular_statements_filtered_prev)))
-        self.logger.debug(f"Filtering Verb(A): {len(regular_statements_filtered)} Reg statements")
-        
-        # Reset filter
-        regular_statements_filtered_prev = regular_statements_filtered
-        regular_statements_filtered = []
-
-        self.logger.debug(f"Filtering Resource(B): {split_res_filter}. {len(regular_statements_filtered_prev)} DG/SVC/Reg statements")
-        for filt in split_res_filter:
-            regular_statements_filtered.extend(list(filter(lambda statement: filt.casefold() in statement[9].casefold(), regular_statements_filtered_prev)))
-        self.logger.debug(f"Filtering Resource(A): {len(regular_statements_filtered)} DG/SVC/Reg statements")
-
-        # Reset filter
-        regular_statements_filtered_prev = regular_statements_filtered
-        regular_statements_filtered = []
-
-        self.logger.debug(f"Filtering Location(B): {len(regular_statements_filtered_prev)} DG/SVC/Reg statements")
-        for filt in split_loc_filter:
-            if "tenancy" == filt:
-                self.logger.info("tenancy filter")
-                regular_statements_filtered.extend(list(filter(lambda statement: filt.casefold() in statement[11].casefold(), regular_statements_filtered_prev)))
-            else:    
-                regular_statements_filtered.extend(list(filter(lambda statement: filt.casefold() in statement[12].casefold(), regular_statements_filtered_prev)))
-        self.logger.debug(f"Filtering Location(A): {len(regular_statements_filtered)} Reg statements")
-
-        # Reset filter
-        regular_statements_filtered_prev = regular_statements_filtered
-        regular_statements_filtered = []
-
-        # Hierarchy
-        self.logger.debug(f"Filtering hierarchy(B): {split_hierarchy_filter}. Before: {len(regular_statements_filtered_prev)} Reg statements")
-        for filt in split_hierarchy_filter:
-            regular_statements_filtered.extend(list(filter(lambda statement: filt.casefold() in statement[3].casefold(), regular_statements_filtered_prev)))
-        self.logger.debug(f"Filtering hierarchy(A): {len(regular_statements_filtered)} Reg statements")
-
-        # Reset filter
-        regular_statements_filtered_prev = regular_statements_filtered
-        regular_statements_filtered = []
-
-        # Condition
-        self.logger.debug(f"Filtering Conditions(B): {split_condition_filter}. Before: {len(regular_statements_filtered_prev)} Reg statements")
-        for filt in split_condition_filter:
-            regular_statements_filtered.extend(list(filter(lambda statement: filt.casefold() in statement[13].casefold(), regular_statements_filtered_prev)))
-        self.logger.debug(f"Filtering Conditions(A): {len(regular_statements_filtered)} Reg statements")
-
-        # Reset filter
-        regular_statements_filtered_prev = regular_statements_filtered
-        regular_statements_filtered = []
-
-        # Policy Text
-        self.logger.debug(f"Filtering Conditions(B): {split_text_filter}. Before: {len(regular_statements_filtered_prev)} Reg statements")
-        for filt in split_text_filter:
-            regular_statements_filtered.extend(list(filter(lambda statement: filt.casefold() in statement[4].casefold(), regular_statements_filtered_prev)))
-        self.logger.debug(f"Filtering Conditions(A): {len(regular_statements_filtered)} Reg statements")
-
-        # Reset filter
-        regular_statements_filtered_prev = regular_statements_filtered
-        regular_statements_filtered = []
-
-        # Policy Name
-        self.logger.debug(f"Filtering Conditions(B): {split_policy_filter}. Before: {len(regular_statements_filtered_prev)} Reg statements")
-        for filt in split_policy_filter:
-            regular_statements_filtered.extend(list(filter(lambda statement: filt.casefold() in statement[0].casefold(), regular_statements_filtered_prev)))
-        self.logger.debug(f"Filtering Conditions(A): {len(regular_statements_filtered)} Reg statements")
+
+        # All filters run as one query over the casefolded columns, each narrowing the rows left by the last
+        # (or resolved through the trigram index when there is one)
+        query = StatementQuery(subject=subj_filter, verb=verb_filter, resource=resource_filter, location=location_filter,
+                               hierarchy=hierarchy_filter, condition=condition_filter, text=text_filter, policy=policy_filter)
+        # Repeated (or reordered) queries come from the cache until the statements change
+        self.logger.debug(f"Filtering {len(self.regular_statements)} Reg statements with {query}")
+        if isinstance(self.regular_statements, DatabaseStore):
+            # Run as SQL on the snapshot - only matching statements are read
+            regular_statements_filtered = self.query_cache.lookup(
+                ("database", self.regular_statements.snapshot_id, self.regular_statements.generation, query.key),
+                lambda: self.regular_statements.filter(query))
+        else:
+            regular_statements_filtered = self.query_cache.lookup(
+                (self.regular_statements.generation, query.key),
+                lambda: query.run(self.regular_statements, self.statement_index))
+        self.logger.debug(f"Query cache: {self.query_cache}")
 
         # Return
         self.logger.info(f"After filters applied: {len(regular_statements_filtered)} Reg statements")
@@ -20,6 +20,12 @@ class Progress():
         self.loaded = 0
         self.to_load = to_load
 
+    def add_to_load(self, count: int):
+        """Grow the running total while work is still being discovered (eg compartment pages)"""
+        with self.lock:
+            self.to_load += count
+            self.logger.debug(f"To load now: {self.to_load}")
+
     def progress_indicator(self, future):
         # global lock, loaded, to_load
 
@@ -29,7 +35,7 @@ class Progress():
             self.loaded += 1
 
             # Figure completion
-            comp_step = int(self.loaded / self.to_load * 100)
+            comp_step = int(self.loaded / max(self.to_load, self.loaded) * 100)
             self.logger.debug(f"Completed {self.loaded} of {self.to_load} for a step of {comp_step}")
             if (comp_step % 20 == 0 and self.loaded % 10 == 0):
                 self.logger.info(f"Completed {self.loaded} of {self.to_load} for a step of {comp_step}")